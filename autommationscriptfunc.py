@@ -6,7 +6,7 @@ Transform messy/chinese/raw exam text into a polished LaTeX file using a styled
 Usage:
     python exam_transformer.py INPUT_FILE -o OUTPUT_FILE
 
-Only uses Python stdlib.
+Only uses Python stdlib (and the repo's questionTypeHandler.optionExtractor).
 """
 
 import re
@@ -15,6 +15,8 @@ from pathlib import Path
 import html
 import sys
 
+from questionTypeHandler.optionExtractor import extract_options, options_by_letter
+
 # ---------- TEMPLATE (header + footer) ----------
 def templateHeader(title, subject):
     
@@ -195,62 +197,13 @@ def extract_options_from_block(content: str):
     Try to extract options (A/B/C/D) from a question content.
     Return (stem, options_dict) where options_dict is {'A':..., 'B':..., ...} or None if no 4-option set found.
     """
-    # Normalize option separators: accept "A. B. C. D.", "A、", "A．", "A："
-    # make a pattern that matches A. text B. text C. text D. text
-    opt_label = r'([A-D])[\.\uFF0E\u3002\u3001:：]\s*'
-    pattern = re.compile(
-        r'^(?P<stem>.*?)'  # question stem (non-greedy)
-        + r'(?:' + opt_label + r')'  # A.
-        + r'(?P<A>.*?)'
-        + r'(?:' + opt_label + r')'  # B.
-        + r'(?P<B>.*?)'
-        + r'(?:' + opt_label + r')'  # C.
-        + r'(?P<C>.*?)'
-        + r'(?:' + opt_label + r')'  # D.
-        + r'(?P<D>.*)$',
-        flags=re.S
-    )
-    m = pattern.match(content)
-    if m:
-        stem = m.group('stem').strip()
-        opts = {
-            'A': m.group('A').strip(),
-            'B': m.group('B').strip(),
-            'C': m.group('C').strip(),
-            'D': m.group('D').strip(),
-        }
-        return stem, opts
-    # No 4-option. Try to detect multiple options across lines like:
-    # A.xxx
-    # B.xxx
-    # C.xxx
-    # D.xxx
-    lines = content.splitlines()
-    # find lines starting with A. etc
-    opt_lines = {}
-    for i, ln in enumerate(lines):
-        m = re.match(r'^\s*([A-D])[\.\uFF0E\u3002\u3001:：]\s*(.*)', ln)
-        if m:
-            lbl = m.group(1)
-            opt_lines[lbl] = (i, m.group(2))
-    if opt_lines and all(k in opt_lines for k in ['A', 'B', 'C', 'D']):
-        # build option text by taking from each label line until next label line
-        stem_lines = []
-        # lines before first option label are stem
-        first_idx = min(opt_lines[k][0] for k in opt_lines)
-        stem_lines = lines[:first_idx]
-        stem = '\n'.join(stem_lines).strip()
-        opts = {}
-        ordered = sorted((k, opt_lines[k][0]) for k in opt_lines)
-        for idx, (lbl, start) in enumerate(ordered):
-            end = ordered[idx + 1][1] if idx + 1 < len(ordered) else len(lines)
-            # join lines from start line (we already captured remainder in that line)
-            part = [lines[i] for i in range(start, end)]
-            # remove the leading "A." from first line
-            part[0] = re.sub(r'^\s*[A-D][\.\uFF0E\u3002\u3001:：]\s*', '', part[0])
-            opts[lbl] = '\n'.join(part).strip()
-        return (stem, opts)
-    return (content, None)
+    # Accepts "A. B. C. D.", "A、", "A．", "A。", "A：" markers, inline or one per line;
+    # the scan is linear and skips markers inside $...$ (see questionTypeHandler/optionExtractor.py)
+    extracted = extract_options(content, punctuation=".\uFF0E\u3002\u3001:：", stripNumber=False, recoverLast=False)
+    stem, opts = options_by_letter(extracted)
+    if opts is None:
+        return (content, None)
+    return stem, opts
 
 def render_block_to_latex(number, stem, opts):
     """
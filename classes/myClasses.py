@@ -1,7 +1,19 @@
-import re
-from typing import List, Optional
+import sys
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
 from enum import Enum
 
+from questionTypeHandler.examTokenizer import (
+    QuestionSpan,
+    SourceMap,
+    Token,
+    accepts_dotted_number,
+    accepts_plain_number,
+    lstrip_pieces,
+    split_question_spans,
+    strip_span,
+    tokenize,
+)
+
 
 class SectionType(Enum):
     MCQ = "选择题"
@@ -9,7 +21,29 @@ class SectionType(Enum):
     ESSAY = "解答题"
 
 
+class SectionOrigin(NamedTuple):
+    """Where a section's Source was read from, when it isn't the whole exam."""
+    start: int   # byte offsets of the raw section in the file (before the html pre-pass)
+    end: int
+    line: int    # line the section starts on, counted like shifted
+    exact: bool  # Source is those bytes as they are, so offsets into it are file offsets too
+    shifted: int # where Source starts once every section before it went through the pre-pass
+
+
+# options and short math fragments ("$\frac{1}{2}$", "2") repeat all over a question bank;
+# strings up to this length are interned so every copy shares one object
+INTERN_LIMIT = 64
+
+
+def intern_fragment(text: str) -> str:
+    if len(text) <= INTERN_LIMIT:
+        return sys.intern(text)
+    return text
+
+
 class Exam:
+    __slots__ = ("File", "Sections", "TotalPoints", "TotalQuestions", "Title")
+
     def __init__(self, file: str, title: str = ""):
         self.File = file
         self.Sections: List["Section"] = []
@@ -22,97 +56,195 @@ class Exam:
 
 
 class Section:
-    def __init__(self, file: str, text: str, body: str, header: str, number: int, type: SectionType):
+    """
+    A section as offsets into the text of its exam. Text, Body and Header are only cut
+    out of Source when asked for, and the typed wrappers share the source and spans.
+    When the exam is split a section at a time (examPartitioning.iterSections), Source is
+    just this section's text and Origin says where that came from in the file.
+    """
+    __slots__ = ("ExamFile", "Source", "Span", "HeaderSpan", "BodySpan", "Number", "Type", "Points", "Tokens",
+                 "Origin")
+
+    def __init__(self, file: str, source: str, number: int, type: SectionType,
+                 span: Optional[Tuple[int, int]] = None, headerSpan: Tuple[int, int] = (0, 0),
+                 bodySpan: Optional[Tuple[int, int]] = None, tokens: Optional[List[Token]] = None,
+                 origin: Optional["SectionOrigin"] = None):
         self.ExamFile = file
-        self.Text = text
-        self.Body = body
-        self.Header = header
+        self.Source = source
+        self.Span = span or (0, len(source))
+        self.HeaderSpan = headerSpan
+        self.BodySpan = bodySpan or strip_span(source, *self.Span)
         self.Number = number
         self.Type = type
         self.Points = 0
+        # token stream of the exam cut to this section's body; offsets point into Source
+        self.Tokens = tokens
+        # None when Source is the whole exam
+        self.Origin = origin
+
+    @property
+    def Text(self) -> str:
+        return self.Source[self.Span[0]:self.Span[1]]
 
-    def questionsSeperator(self, text: str) -> List[str]:
-        pattern = r'(?ms)^\s*(\d+\.?.*?)(?=^\s*\d+\.?|\Z)'
-        return [q.strip() for q in re.findall(pattern, text)]
+    @property
+    def Body(self) -> str:
+        return self.Source[self.BodySpan[0]:self.BodySpan[1]]
+
+    @property
+    def Header(self) -> str:
+        return self.Source[self.HeaderSpan[0]:self.HeaderSpan[1]]
+
+    @property
+    def BodyOffset(self) -> int:
+        return self.BodySpan[0]
+
+    def _spansIn(self, source: str, tokens: List[Token], start: int, end: int, offset: int = 0) -> List[QuestionSpan]:
+        return split_question_spans(source, tokens, accepts_plain_number, start, end, offset)
+
+    def questionSpans(self) -> List[QuestionSpan]:
+        """Where each question of the body is in Source; nothing is copied."""
+        start, end = self.BodySpan
+        if self.Tokens is not None:
+            return self._spansIn(self.Source, self.Tokens, start, end)
+        # no exam-wide scan: scan the body alone and shift its tokens onto Source
+        return self._spansIn(self.Source, tokenize(self.Body), start, end, offset=-start)
+
+    def questionsSeperator(self, text: Optional[str] = None) -> List[str]:
+        # our own body comes from the spans, any other text is scanned on its own
+        if text is None:
+            return [span.text(self.Source) for span in self.questionSpans()]
+        return [span.text(text) for span in self._spansIn(text, tokenize(text), 0, len(text))]
+
+    def locate(self, offset: int) -> str:
+        """"exam.md:12:1" for an offset into Source (see SourceMap)."""
+        firstLine = self.Origin.line if self.Origin is not None else 1
+        return SourceMap(self.Source, self.ExamFile, firstLine).describe(offset)
 
 
 # -------------------------
 # Typed Section Wrappers
 # -------------------------
 class MultipleChoiceSection(Section):
+    __slots__ = ("questionsList",)
+
     def __init__(self, baseSection: Section):
         super().__init__(
             file=baseSection.ExamFile,
-            text=baseSection.Text,
-            body=baseSection.Body,
-            header=baseSection.Header,
+            source=baseSection.Source,
             number=baseSection.Number,
-            type=SectionType.MCQ
+            type=SectionType.MCQ,
+            span=baseSection.Span,
+            headerSpan=baseSection.HeaderSpan,
+            bodySpan=baseSection.BodySpan,
+            tokens=baseSection.Tokens,
+            origin=baseSection.Origin
         )
         self.questionsList: List[MultipleChoiceQuestion] = []
 
-    def questionsSeperator(self, text: str) -> List[str]:
-        pattern = r'(?ms)^\s*(\d+\.?.*?)(?=^\s*\d+\.?|\Z)'
-        return [q.strip() for q in re.findall(pattern, text)]
-
 
 class FillInBlankSection(Section):
+    __slots__ = ("questionsList",)
+
     def __init__(self, baseSection: Section):
         super().__init__(
             file=baseSection.ExamFile,
-            text=baseSection.Text,
-            body=baseSection.Body,
-            header=baseSection.Header,
+            source=baseSection.Source,
             number=baseSection.Number,
-            type=SectionType.FIB
+            type=SectionType.FIB,
+            span=baseSection.Span,
+            headerSpan=baseSection.HeaderSpan,
+            bodySpan=baseSection.BodySpan,
+            tokens=baseSection.Tokens,
+            origin=baseSection.Origin
         )
         self.questionsList: List[Question] = []
 
+    def _spansIn(self, source, tokens, start, end, offset=0):
+        # blanks are handed to the handler without their "13." prefix
+        return split_question_spans(source, tokens, accepts_plain_number, start, end, offset, keepNumber=False)
+
 
 class EssaySection(Section):
+    __slots__ = ("questionsList",)
+
     def __init__(self, baseSection: Section):
         super().__init__(
             file=baseSection.ExamFile,
-            text=baseSection.Text,
-            body=baseSection.Body,
-            header=baseSection.Header,
+            source=baseSection.Source,
             number=baseSection.Number,
-            type=SectionType.ESSAY
+            type=SectionType.ESSAY,
+            span=baseSection.Span,
+            headerSpan=baseSection.HeaderSpan,
+            bodySpan=baseSection.BodySpan,
+            tokens=baseSection.Tokens,
+            origin=baseSection.Origin
         )
         self.questionsList: List[EssayQuestion] = []
 
-    def questionsSeperator(self, text: str) -> List[str]:
-        pattern = r'(?ms)^\s*(?:#+\s*)?((?:\d+|2V)\..*?)(?=^\s*(?:#+\s*)?(?:\d+|2V)\.|\Z)'
-        return [q.strip() for q in re.findall(pattern, text)]
+    def _spansIn(self, source, tokens, start, end, offset=0):
+        spans = split_question_spans(source, tokens, accepts_dotted_number, start, end, offset)
+        # "### 18. (12分)" -> "18. (12分)", the handlers expect the number first
+        return [QuestionSpan(span.start, span.end, tuple(lstrip_pieces(source, lstrip_pieces(source, list(span.pieces), '#'))))
+                for span in spans]
+
+
+class QuestionError(Exception):
+    """A question that failed to convert, reported with where it starts in the exam."""
+
+    def __init__(self, section: Section, span: QuestionSpan, error: Exception):
+        self.Location = section.locate(span.start)
+        super().__init__(f"{self.Location}: {type(error).__name__}: {error}")
 
 
 # -------------------------
 # Question Hierarchy
 # -------------------------
+# The questions are slotted and pickle as (class, constructor arguments): that is what the
+# cache stores and what the process executor sends back, and unpickling re-interns the options.
 class Question:
+    __slots__ = ("Description", "Points")
+
     def __init__(self, Description: str, points=0):
         self.Description = Description
         self.Points = points
 
+    def __reduce__(self):
+        return Question, (self.Description, self.Points)
+
 
 class MultipleChoiceQuestion(Question):
+    __slots__ = ("MainQuestion", "Options")
+
     def __init__(self, Description: str, mainQuestion: str, options: List[str], points: int = 0):
         super().__init__(Description, points)  # HERE DESCRIPTION TAKES THE WHOLE QUESTION 
         self.MainQuestion = mainQuestion
-        self.Options = options
+        self.Options = [intern_fragment(option) for option in options]
+
+    def __reduce__(self):
+        return MultipleChoiceQuestion, (self.Description, self.MainQuestion, self.Options, self.Points)
 
 
 class FillInBlankQuestion(Question):
+    __slots__ = ("Blanks",)
+
     def __init__(self, Description: str, blanks: Optional[List[str]] = None, points: int = 0):
         super().__init__(Description, points)
-        self.Blanks = blanks or []
+        self.Blanks = [intern_fragment(blank) for blank in blanks] if blanks else []
+
+    def __reduce__(self):
+        return FillInBlankQuestion, (self.Description, self.Blanks, self.Points)
 
 
 class EssayQuestion(Question):
+    __slots__ = ("SubQuestions",)
+
     def __init__(self, Description: str, subQuestions: Optional[List["EssayQuestion"]] = None, points: int = 0):
         super().__init__(Description, points) # HERE THE DESCRIPTION IS THE 
         self.SubQuestions = subQuestions
 
+    def __reduce__(self):
+        return EssayQuestion, (self.Description, self.SubQuestions, self.Points)
+
 
 # -------------------------
 # Other Elements
@@ -128,24 +260,95 @@ class Image:
         """Convert the image to LaTeX format."""
         return rf'\includegraphics[width=0.6\textwidth]{{{self.src}}}'
 
+    def iter_latex(self) -> Iterator[str]:
+        yield self.to_latex()
+
 
 class Table:
-    """Represents a table element found in HTML."""
+    """
+    Represents a table element found in HTML.
+
+    cells holds the cells each row actually has, in order; spans maps (row, index in
+    that row) to (rowspan, colspan) for the cells that span more than one, and
+    num_cols is the width of the grid they fill.
+    """
     
-    def __init__(self, num_rows: int, num_cols: int, cells: List[List[str]], div_text: str):
+    def __init__(self, num_rows: int, num_cols: int, cells: List[List[str]], div_text: str,
+                 spans: Optional[Dict[Tuple[int, int], Tuple[int, int]]] = None):
         self.num_rows = num_rows
         self.num_cols = num_cols
         self.cells = cells
         self.div_text = div_text
+        self.spans = spans or {}
     
     def to_latex(self) -> str:
         """Convert the table to LaTeX format."""
+        return "".join(self.iter_latex())
+
+    def iter_latex(self) -> Iterator[str]:
+        """The tabular a row at a time; spanning cells become \\multirow / \\multicolumn."""
         column_spec = " | ".join(["c"] * self.num_cols)
-        latex_table = rf"\begin{{tabular}}{{{column_spec}}}" + "\n\\hline\n"
-        
-        for row in self.cells:
-            latex_row = " & ".join(row) + r" \\ " + "\n\\hline\n"
-            latex_table += latex_row
-        
-        latex_table += r"\end{tabular}"
-        return latex_table
\ No newline at end of file
+        yield rf"\begin{{tabular}}{{{column_spec}}}" + "\n\\hline\n"
+
+        if not self.spans:
+            for row in self.cells:
+                yield " & ".join(row) + r" \\ " + "\n\\hline\n"
+        else:
+            # rows still covered by a \multirow from above, per column, and that cell's width
+            remaining = [0] * self.num_cols
+            width_at = [1] * self.num_cols
+            for r, row in enumerate(self.cells):
+                slots = []
+                col = 0
+                k = 0
+                while col < self.num_cols:
+                    if remaining[col]:
+                        width = width_at[col]
+                        slots.append(self._multicolumn(col, width, ""))
+                        for c in range(col, col + width):
+                            remaining[c] -= 1
+                        col += width
+                        continue
+                    if k >= len(row):
+                        # a short row
+                        slots.append("")
+                        col += 1
+                        continue
+                    rowspan, colspan = self.spans.get((r, k), (1, 1))
+                    rowspan = min(rowspan, self.num_rows - r)
+                    colspan = min(colspan, self.num_cols - col)
+                    text = row[k]
+                    k += 1
+                    if rowspan > 1:
+                        text = rf"\multirow{{{rowspan}}}{{*}}{{{text}}}"
+                        for c in range(col, col + colspan):
+                            remaining[c] = rowspan - 1
+                        width_at[col] = colspan
+                    slots.append(self._multicolumn(col, colspan, text))
+                    col += colspan
+                yield " & ".join(slots) + r" \\ " + "\n" + self._rule(remaining) + "\n"
+
+        yield r"\end{tabular}"
+
+    def _multicolumn(self, col: int, width: int, text: str) -> str:
+        if width == 1:
+            return text
+        spec = "c|" if col + width < self.num_cols else "c"
+        return rf"\multicolumn{{{width}}}{{{spec}}}{{{text}}}"
+
+    @staticmethod
+    def _rule(remaining: List[int]) -> str:
+        # \hline under a row, except through the cells that a \multirow carries on into the next one
+        if not any(remaining):
+            return r"\hline"
+        rules = []
+        col = 0
+        while col < len(remaining):
+            if remaining[col]:
+                col += 1
+                continue
+            first = col
+            while col < len(remaining) and not remaining[col]:
+                col += 1
+            rules.append(rf"\cline{{{first + 1}-{col}}}")
+        return "".join(rules)
@@ -0,0 +1,189 @@
+"""
+Content-addressed cache of converted questions.
+
+A question is keyed by a hash of its normalised text, its section type and
+CONVERTER_VERSION, and maps to what the converter produced for it: the
+question object and its LaTeX fragment. Entries live in a small SQLite file
+(shared safely by batch workers) with an in-memory LRU in front; the file is
+kept under a byte budget by dropping the least recently used entries.
+
+Workers never hold the write lock for long: the connection is in autocommit
+mode, so each put() is its own short transaction, and a hit only notes the
+access time in memory; the access times are written in one transaction every
+TOUCH_BATCH hits and on flush().
+"""
+import hashlib
+import os
+import pickle
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# bump whenever a handler or wrapper change alters the LaTeX for the same input
+CONVERTER_VERSION = "3"
+
+# access times written at once by a cache hit
+TOUCH_BATCH = 256
+
+
+def normalize_question(text: str) -> str:
+    """The form of a question that is both hashed and handed to the handlers."""
+    return text.replace("\r\n", "\n").replace("\r", "\n").strip()
+
+
+def question_key(text: str, sectionType: str, version: str = CONVERTER_VERSION) -> str:
+    payload = "\0".join((version, sectionType, normalize_question(text)))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class QuestionCache:
+    """
+    On-disk question cache with an optional in-memory LRU in front.
+
+    Args:
+        path: SQLite file for the persistent layer; None keeps everything in memory
+        memoryItems: Size of the in-memory LRU (0 disables it)
+        maxBytes: Budget for the on-disk entries; older entries are evicted past it
+    """
+
+    def __init__(self, path: Optional[str] = None, memoryItems: int = 4096, maxBytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.memoryItems = memoryItems
+        self.maxBytes = maxBytes
+        self._memory: "OrderedDict[str, Tuple[Any, str]]" = OrderedDict()
+        self.hits = 0
+        self.memoryHits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._touched: Dict[str, float] = {}
+
+        self._db = None
+        if path:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, timeout=30, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS questions ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS questions_accessed ON questions(accessed)")
+            self._diskBytes = self._disk_bytes()
+
+    # -------------------------
+    # lookups
+    # -------------------------
+    def get(self, key: str) -> Optional[Tuple[Any, str]]:
+        """Return (question, latex) for a key, or None."""
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            self.memoryHits += 1
+            return entry
+
+        if self._db is not None:
+            row = self._db.execute("SELECT value FROM questions WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                # no write on the read path: other workers must not wait on a hit
+                self._touched[key] = time.time()
+                if len(self._touched) >= TOUCH_BATCH:
+                    self.flush()
+                entry = pickle.loads(row[0])
+                self._remember(key, entry)
+                self.hits += 1
+                return entry
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, question: Any, latex: str) -> None:
+        entry = (question, latex)
+        self._remember(key, entry)
+        if self._db is None:
+            return
+        value = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+        # autocommit: the row is written and the lock released right away
+        self._db.execute(
+            "INSERT OR REPLACE INTO questions (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+            (key, value, len(value), time.time()),
+        )
+        self._touched.pop(key, None)
+        # an estimate: other processes write to the same file; _evict() recounts
+        self._diskBytes += len(value)
+        if self._diskBytes > self.maxBytes:
+            self._evict()
+
+    def _disk_bytes(self) -> int:
+        return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM questions").fetchone()[0]
+
+    def _remember(self, key: str, entry: Tuple[Any, str]) -> None:
+        if self.memoryItems <= 0:
+            return
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memoryItems:
+            self._memory.popitem(last=False)
+
+    def _evict(self) -> None:
+        # drop least recently used rows until we're back under 90% of the budget; the
+        # size is recounted first, since every process sharing the file adds to it
+        target = int(self.maxBytes * 0.9)
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._diskBytes = self._disk_bytes()
+            if self._diskBytes > self.maxBytes:
+                doomed = []
+                for key, size in self._db.execute("SELECT key, size FROM questions ORDER BY accessed").fetchall():
+                    if self._diskBytes <= target:
+                        break
+                    doomed.append((key,))
+                    self._diskBytes -= size
+                self._db.executemany("DELETE FROM questions WHERE key = ?", doomed)
+                self.evictions += len(doomed)
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+
+    # -------------------------
+    # housekeeping
+    # -------------------------
+    def flush(self) -> None:
+        """Write the access times noted by cache hits, in one short transaction."""
+        if self._db is not None and self._touched:
+            touched = [(accessed, key) for key, accessed in self._touched.items()]
+            self._touched.clear()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany("UPDATE questions SET accessed = ? WHERE key = ?", touched)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def close(self) -> None:
+        if self._db is not None:
+            self.flush()
+            self._db.close()
+            self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memoryHits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "memory_entries": len(self._memory),
+            "disk_bytes": self._disk_bytes() if self._db is not None else 0,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
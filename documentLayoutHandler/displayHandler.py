@@ -1,30 +1,242 @@
 import re
+from html.parser import HTMLParser
 from classes.myClasses import Table, Image
-from typing import List, Dict, Union
+from typing import IO, Iterator, List, Dict, Optional, Tuple, Union
+
+# where a div may start; from there the div is handed to DivParser
+DIV_OPEN_PATTERN = re.compile(r'<div\b', re.IGNORECASE)
+# DivParser is fed up to one of these at a time
+DIV_CLOSE_PATTERN = re.compile(r'</div\s*>', re.IGNORECASE)
+# a < that starts none of the tags DivParser looks at: "$a<b$" or "$0<x<1$" in a cell, which
+# html.parser would otherwise read as a <b...> or <x...> tag running over the </td>
+STRAY_LT_PATTERN = re.compile(r'<(?![!?]|/?(?:div|table|thead|tbody|tfoot|tr|td|th|img)\b)', re.IGNORECASE)
+
+
+def _span(attrs: List[Tuple[str, Optional[str]]], name: str) -> int:
+    for key, value in attrs:
+        if key == name:
+            try:
+                return max(1, int(value))
+            except (TypeError, ValueError):
+                return 1
+    return 1
+
+
+def grid_width(cells: List[List[str]], spans: Dict[Tuple[int, int], Tuple[int, int]]) -> int:
+    """How many columns the rows of a table fill, counting colspans and the cells rowspans carry down."""
+    width = 0
+    remaining: Dict[int, int] = {}  # column -> rows a rowspan from above still covers
+    for r, row in enumerate(cells):
+        col = 0
+        for k in range(len(row)):
+            while remaining.get(col):
+                col += 1
+            rowspan, colspan = spans.get((r, k), (1, 1))
+            for c in range(col, col + colspan):
+                remaining[c] = rowspan
+            col += colspan
+        width = max(width, col, max((c + 1 for c, n in remaining.items() if n), default=0))
+        remaining = {c: n - 1 for c, n in remaining.items() if n > 1}
+    return width
+
+
+class DivParser(HTMLParser):
+    """
+    Incremental html.parser over one <div> of a larger text, nested divs included.
+
+    It is fed up to the next </div> at a time and stops at the one that closes the
+    div, so nothing after the div is parsed. Images are collected by src and table
+    cells (td or th, with their rowspan/colspan) as the raw html between their tags.
+    When the div never closes, `unclosed` holds the start of every div it saw that
+    didn't close either (its own included), and there is no </div> past `scanned`.
+    """
+
+    def __init__(self, content: str, start: int):
+        super().__init__(convert_charrefs=False)
+        self.content = content
+        self.start = start
+        self.end: Optional[int] = None
+        self.has_image = False
+        self.images: List[str] = []
+        self.has_table = False
+        self.rows: List[List[str]] = []
+        self.spans: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        self._fed = start
+        self._line_starts = [start]  # offsets in content of the lines getpos() counts
+        self._divs = 0
+        self.unclosed: List[int] = []  # starts of the divs open at this point
+        self._tables = 0
+        self._cell: Optional[Tuple[int, Tuple[int, int]]] = None  # content start and span of the open cell
+
+    def run(self) -> Optional[int]:
+        """Parse the div; the offset just past its closing tag, or None if it never closes."""
+        while self.end is None:
+            close = DIV_CLOSE_PATTERN.search(self.content, self._fed)
+            if close is None:
+                return None
+            chunk = self.content[self._fed:close.end()]
+            newline = chunk.find('\n')
+            while newline >= 0:
+                self._line_starts.append(self._fed + newline + 1)
+                newline = chunk.find('\n', newline + 1)
+            self._fed = close.end()
+            # blanked rather than escaped: the same length keeps getpos() on the content's offsets,
+            # and cells are cut from the content, so what the parser sees in their place doesn't matter
+            self.feed(STRAY_LT_PATTERN.sub(' ', chunk))
+        return self.end
+
+    @property
+    def scanned(self) -> int:
+        """How far into content the parser has been fed."""
+        return self._fed
+
+    def element(self) -> Union[Image, Table, None]:
+        """The Image or Table the div holds, or None if it holds neither."""
+        if self.end is None:
+            return None
+        div_text = self.content[self.start:self.end]
+        if self.has_image:
+            return Image(src=self.images[0], div_text=div_text) if self.images else None
+        if self.has_table and self.rows:
+            num_cols = grid_width(self.rows, self.spans)
+            if num_cols:
+                return Table(num_rows=len(self.rows), num_cols=num_cols, cells=self.rows,
+                             div_text=div_text, spans=self.spans)
+        return None
+
+    def _offset(self) -> int:
+        line, column = self.getpos()
+        return self._line_starts[line - 1] + column
+
+    def _close_cell(self) -> None:
+        if self._cell is None:
+            return
+        start, span = self._cell
+        row = self.rows[-1]
+        if span != (1, 1):
+            self.spans[(len(self.rows) - 1, len(row))] = span
+        row.append(self.content[start:self._offset()])
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.end is not None:
+            return
+        if tag == 'div':
+            self._divs += 1
+            self.unclosed.append(self._offset())
+        elif tag == 'img':
+            self.has_image = True
+            src = dict(attrs).get('src')
+            if src is not None:
+                self.images.append(src)
+        elif tag == 'table':
+            self.has_table = True
+            self._tables += 1
+        elif self._tables == 1 and tag == 'tr':
+            self._close_cell()
+            self.rows.append([])
+        elif self._tables == 1 and tag in ('td', 'th'):
+            self._close_cell()
+            if not self.rows:
+                self.rows.append([])
+            self._cell = (self._offset() + len(self.get_starttag_text()),
+                          (_span(attrs, 'rowspan'), _span(attrs, 'colspan')))
+
+    def handle_endtag(self, tag):
+        if self.end is not None:
+            return
+        if tag == 'div':
+            self._divs -= 1
+            if self.unclosed:
+                self.unclosed.pop()
+            if self._divs <= 0:
+                self.end = self.content.index('>', self._offset()) + 1
+        elif tag == 'table':
+            if self._tables == 1:
+                self._close_cell()
+            self._tables = max(0, self._tables - 1)
+        elif self._tables == 1 and tag in ('tr', 'td', 'th'):
+            self._close_cell()
+
 
 class HtmlTweaker:
     """
     Processes HTML files to identify div elements containing images or tables,
     and converts them to LaTeX format.
+
+    Works either on a file (process) or fully in memory (convert_text), in both
+    cases with a single forward scan over the content: each div is parsed by a
+    DivParser once, up to its own closing tag.
     """
     
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: Optional[str] = None):
         self.file_path = file_path
-        self.elements: Dict[str, Union[Image, Table]] = {}
+        # keyed by the (start, end) offsets of the div in the scanned content
+        self.elements: Dict[Tuple[int, int], Union[Image, Table]] = {}
+        self._content: Optional[str] = None
     
-    def identify_elements(self) -> None:
+    def identify_elements(self, content: Optional[str] = None) -> None:
         """
-        Parse the HTML file and identify div elements containing images or tables.
-        Stores the identified elements in self.elements.
+        Parse the HTML content (the file when not given) and identify div elements
+        containing images or tables. Stores them in self.elements by offset.
         """
-        content = self._read_file()
-        div_elements = re.findall(r'<div[^>]*>.*?</div>', content, re.DOTALL)
-        
-        for div_element in div_elements:
-            element = self._parse_div_element(div_element)
+        if content is None:
+            content = self._read_file()
+        self._content = content
+        self.elements = {(start, end): element for start, end, element in self.iter_elements(content)}
+
+    def iter_elements(self, content: str) -> Iterator[Tuple[int, int, Union[Image, Table]]]:
+        """(start, end, element) for every outermost div holding an image or a table, in order."""
+        pos = 0
+        unclosed = set()  # divs a parser already followed to the end of the content
+        lastClose = len(content)  # no </div> ends past this offset
+        while True:
+            match = DIV_OPEN_PATTERN.search(content, pos)
+            if match is None or match.start() >= lastClose:
+                return
+            if match.start() in unclosed:
+                pos = match.end()
+                continue
+            parser = DivParser(content, match.start())
+            end = parser.run()
+            if end is None:
+                # never closed: leave it as text, and the divs inside it that didn't close
+                # either, without feeding the rest of the content again for each of them;
+                # past the last </div>, no div can close at all
+                unclosed.update(parser.unclosed)
+                lastClose = parser.scanned
+                pos = match.end()
+                continue
+            element = parser.element()
             if element:
-                self.elements[div_element] = element
+                yield match.start(), end, element
+            pos = end
+
+    def convert_text(self, content: Union[str, IO[str]]) -> str:
+        """
+        Return content with every image/table div replaced by its LaTeX, in one
+        forward pass. Accepts a string or a readable text buffer; nothing is
+        written anywhere.
+        """
+        if not isinstance(content, str):
+            content = content.read()
+        self._content = content
+        self.elements = {}
+
+        pieces = []
+        last = 0
+        for start, end, element in self.iter_elements(content):
+            self.elements[(start, end)] = element
+            pieces.append(content[last:start])
+            pieces.extend(element.iter_latex())
+            last = end
+        pieces.append(content[last:])
+        return "".join(pieces)
     
+    def image_sources(self) -> List[str]:
+        """The src of every image found by the last scan, in order."""
+        return [element.src for _, element in sorted(self.elements.items()) if isinstance(element, Image)]
+
     def _parse_div_element(self, div_text: str) -> Union[Image, Table, None]:
         """
         Parse a single div element and return the appropriate object.
@@ -35,48 +247,27 @@ class HtmlTweaker:
         Returns:
             Image, Table, or None if the div doesn't contain a supported element
         """
-        if re.search(r'<img[^>]*>', div_text):
-            return self._extract_image(div_text)
-        elif re.search(r'<table[^>]*>', div_text):
-            return self._extract_table(div_text)
-        return None
-    
-    def _extract_image(self, div_text: str) -> Union[Image, None]:
-        """Extract image information from a div element."""
-        match = re.search(r'<img[^>]*src="([^"]*)"', div_text)
-        if match:
-            return Image(src=match.group(1), div_text=div_text)
-        return None
-    
-    def _extract_table(self, div_text: str) -> Union[Table, None]:
-        """Extract table information from a div element."""
-        rows = re.findall(r'<tr>(.*?)</tr>', div_text, re.DOTALL)
-        table_cells = [re.findall(r'<td>(.*?)</td>', row, re.DOTALL) for row in rows]
-        
-        num_rows = len(table_cells)
-        num_cols = len(table_cells[0]) if num_rows > 0 else 0
-        
-        if num_rows > 0 and num_cols > 0:
-            return Table(
-                num_rows=num_rows,
-                num_cols=num_cols,
-                cells=table_cells,
-                div_text=div_text
-            )
-        return None
+        parser = DivParser(div_text, 0)
+        parser.run()
+        return parser.element()
     
     def convert_to_latex(self) -> None:
         """
         Replace all identified HTML elements with their LaTeX equivalents
         and write the result back to the file.
         """
-        content = self._read_file()
+        content = self._content if self._content is not None else self._read_file()
         
-        for element in self.elements.values():
-            latex_code = element.to_latex()
-            content = content.replace(element.div_text, latex_code)
+        # splice by offset: one walk over the content however many elements there are
+        pieces = []
+        last = 0
+        for (start, end), element in sorted(self.elements.items()):
+            pieces.append(content[last:start])
+            pieces.extend(element.iter_latex())
+            last = end
+        pieces.append(content[last:])
         
-        self._write_file(content)
+        self._write_file("".join(pieces))
     
     def _read_file(self) -> str:
         """Read the HTML file content."""
@@ -90,7 +281,7 @@ class HtmlTweaker:
     
     def process(self) -> None:
         """
-        Main processing method. Identifies elements and converts them to LaTeX.
+        Main processing method. Identifies elements and converts them to LaTeX,
+        reading and rewriting the file once.
         """
-        self.identify_elements()
-        self.convert_to_latex()
\ No newline at end of file
+        self._write_file(self.convert_text(self._read_file()))
\ No newline at end of file
@@ -0,0 +1,39 @@
+import sys
+from typing import IO, Iterable, Optional, Union
+
+
+def write_latex(
+    fragments: Iterable[str],
+    destination: Optional[Union[str, IO[str]]] = None,
+    bufferSize: int = 1 << 16,
+    flushEach: bool = False,
+) -> int:
+    """
+    Write LaTeX fragments as they are produced, without assembling the document.
+
+    Args:
+        fragments: Any iterable of strings, e.g. iter_exam_latex(path)
+        destination: A file path, an open text stream, or None for stdout
+        bufferSize: Buffer size used when opening a file path
+        flushEach: Flush after every fragment (useful when piping to a viewer)
+
+    Returns:
+        The number of characters written
+    """
+    if destination is None or not isinstance(destination, str):
+        stream = destination if destination is not None else sys.stdout
+        return _write_to(stream, fragments, flushEach)
+
+    with open(destination, "w", encoding="utf-8", buffering=bufferSize) as stream:
+        return _write_to(stream, fragments, flushEach)
+
+
+def _write_to(stream: IO[str], fragments: Iterable[str], flushEach: bool) -> int:
+    written = 0
+    for fragment in fragments:
+        stream.write(fragment)
+        written += len(fragment)
+        if flushEach:
+            stream.flush()
+    stream.flush()
+    return written
@@ -0,0 +1,76 @@
+"""
+Structured events emitted while converting an exam.
+
+Handlers call emit() instead of printing. With no listener subscribed, emit()
+returns after a single truthiness check, so instrumentation costs next to
+nothing in batch runs. Attach LoggingListener (or any callable taking
+(event, data)) to see what the handlers decided.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List
+
+# event names
+HANDLER_SELECTED = "handler.selected"      # handler, reason, fingerprint (mc only)
+OPTIONS_FOUND = "options.found"            # handler, question, options
+SUBQUESTIONS_FOUND = "subquestions.found"  # handler, question, subQuestions
+SECTIONS_NOT_FOUND = "sections.not_found"  # file
+SECTIONS_FAILED = "sections.failed"        # file, error
+BUDGET_EXCEEDED = "budget.exceeded"        # file, seconds (the rest of the paper went out verbatim)
+ASSET_MISSING = "asset.missing"            # file, src (left pointing where the OCR put it)
+STAGE_START = "stage.start"                # stage, ...
+STAGE_END = "stage.end"                    # stage, seconds, ...
+
+Listener = Callable[[str, Dict[str, Any]], None]
+
+_listeners: List[Listener] = []
+
+
+def subscribe(listener: Listener) -> Listener:
+    _listeners.append(listener)
+    return listener
+
+
+def unsubscribe(listener: Listener) -> None:
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def has_listeners() -> bool:
+    """Guard for call sites that would have to build an expensive payload."""
+    return bool(_listeners)
+
+
+def emit(event: str, **data: Any) -> None:
+    if not _listeners:
+        return
+    for listener in tuple(_listeners):
+        listener(event, data)
+
+
+@contextmanager
+def stage(name: str, **data: Any):
+    """Emit stage.start / stage.end (with the duration in seconds) around a block."""
+    if not _listeners:
+        yield
+        return
+    emit(STAGE_START, stage=name, **data)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        emit(STAGE_END, stage=name, seconds=time.perf_counter() - start, **data)
+
+
+class LoggingListener:
+    """Forwards every event to a logger at a fixed level."""
+
+    def __init__(self, level: int = logging.DEBUG, logger: logging.Logger = None):
+        self.level = level
+        self.logger = logger or logging.getLogger("latexconverter")
+
+    def __call__(self, event: str, data: Dict[str, Any]) -> None:
+        if self.logger.isEnabledFor(self.level):
+            details = " ".join(f"{key}={value!r}" for key, value in data.items())
+            self.logger.log(self.level, "%s %s", event, details)
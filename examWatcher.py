@@ -0,0 +1,212 @@
+"""
+Keep a .tex in step with an exam that is being corrected by hand.
+
+    python main.py exam.md --watch [-o DIR] [--title ...] [--subject ...] [--cache PATH]
+
+The options are the batch CLI's (main.parse_args); the ones a watch doesn't
+use (--jobs, --index, --assets, --fix-math...) are refused rather than ignored.
+
+The watcher keeps the last parse in memory. When the file changes, the paper
+is cut at its section headers with one regex scan; sections whose text is
+unchanged are reused as they are, and only changed sections are tokenized
+again. Inside those, only questions whose text changed go back through the
+handlers. The output file is then patched from the first changed byte onwards
+instead of being rewritten. It is patched in binary, with the line ends of
+write_latex's text-mode file (\r\n on Windows), so it holds the same bytes as a
+batch conversion of the same text on every platform.
+"""
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import main as converter
+from classes.myClasses import Exam, EssaySection
+from conversionCache import normalize_question
+from documentLayoutHandler.packagesHandler import templateFooter, templateHeader
+from eventHooks import stage
+from questionTypeHandler.examTokenizer import split_section_chunks
+from questionTypeHandler.sectionsHandler import examPartitioning
+
+# the output is patched in binary, so it ends its lines the way a text-mode write does
+NEWLINE_TRANSLATED = os.linesep != "\n"
+
+class RenderedSection:
+    """A section as last rendered: its objects and its finished LaTeX fragments."""
+
+    def __init__(self, section, sectionObject, fragments, questionKeys):
+        self.section = section
+        self.sectionObject = sectionObject
+        self.fragments = fragments
+        self.questionKeys = questionKeys
+
+
+class ExamWatcher:
+    """
+    Re-renders an exam incrementally every time its file changes.
+
+    Args:
+        inputPath: The exam markdown being edited
+        outputPath: The .tex kept up to date
+        cache: Optional QuestionCache consulted for questions not seen in this session
+    """
+
+    def __init__(self, inputPath, outputPath, title="Mathematics Exam", subject="Mathematics",
+                 convertHtml=True, cache=None):
+        self.inputPath = inputPath
+        self.outputPath = outputPath
+        self.subject = subject
+        self.convertHtml = convertHtml
+        self.cache = cache
+        self.exam = Exam(inputPath)
+        self.exam.Title = title
+
+        self._sections: Dict[str, RenderedSection] = {}  # keyed by the section's source text
+        self._questions: Dict[Tuple[str, str], Tuple[object, str]] = {}
+        self._fragments: List[str] = []
+        self._offsets: List[int] = [0]  # byte offset of each fragment in the output, plus the end
+        self._signature = None
+        self.lastStats = {}
+
+    # -------------------------
+    # rendering
+    # -------------------------
+    def _render_section(self, section, questions):
+        # the batch converter's tables, so a section type added there is watched the same way
+        sectionObject = converter.SECTION_CLASSES.get(section.Type, EssaySection)(section)
+        convert = converter.QUESTION_CONVERTERS.get(section.Type, converter.convert_eq_question)
+        fragments = [converter.finish_fragment(converter.section_opening(section))]
+        keys = []
+        for q in sectionObject.questionsSeperator():
+            key = (section.Type, normalize_question(q))
+            entry = self._questions.get(key)
+            if entry is None:
+                question, latex = converter.render_question(section.Type, q, convert, self.cache)
+                entry = (question, converter.finish_fragment(latex))
+                self.lastStats["questions_rendered"] += 1
+            questions[key] = entry
+            keys.append(key)
+            sectionObject.questionsList.append(entry[0])
+            fragments.append(entry[1])
+        fragments.append(converter.finish_fragment(converter.SECTION_CLOSING))
+        return RenderedSection(section, sectionObject, fragments, keys)
+
+    def render(self) -> List[str]:
+        """Parse the file again and return the finished fragments, reusing what didn't change."""
+        self.lastStats = {"sections": 0, "sections_rendered": 0, "questions_rendered": 0}
+        with stage("load", file=self.inputPath):
+            content = converter.load_exam_text(self.inputPath, self.convertHtml)
+        with stage("partition", file=self.inputPath):
+            chunks = [content[start:end] for start, end in split_section_chunks(content)]
+
+        sections = {}
+        questions = {}
+        fragments = [templateHeader(self.exam.Title, self.subject)]
+        self.exam.Sections = []
+        for key in chunks:
+            rendered = self._sections.get(key)
+            if rendered is None:
+                # a chunk holds one section, unless the partitioner doesn't take its header line
+                # for one after all (or fails on it): then it is kept as text until it is edited
+                found = examPartitioning(self.inputPath, text=key).handleSections()
+                if found:
+                    rendered = self._render_section(found[0], questions)
+                else:
+                    rendered = RenderedSection(None, None, [converter.verbatim_document(key)], [])
+                self.lastStats["sections_rendered"] += 1
+            else:
+                # untouched section: keep its questions alive for the next round too
+                for questionKey in rendered.questionKeys:
+                    questions[questionKey] = self._questions[questionKey]
+            sections[key] = rendered
+            if rendered.section is not None:
+                self.exam.Sections.append(rendered.section)
+            fragments.extend(rendered.fragments)
+        fragments.append(templateFooter())
+        self.lastStats["sections"] = len(chunks)
+
+        self._sections = sections
+        self._questions = questions
+        return fragments
+
+    # -------------------------
+    # output
+    # -------------------------
+    def write(self, fragments: List[str]) -> int:
+        """Patch the output from the first fragment that differs; returns the bytes written."""
+        first = 0
+        if os.path.exists(self.outputPath) and os.path.getsize(self.outputPath) == self._offsets[-1]:
+            limit = min(len(fragments), len(self._fragments))
+            while first < limit and fragments[first] == self._fragments[first]:
+                first += 1
+        if first == len(fragments) == len(self._fragments):
+            return 0
+
+        offsets = self._offsets[:first + 1]
+        encoded = []
+        for fragment in fragments[first:]:
+            if NEWLINE_TRANSLATED:
+                fragment = fragment.replace("\n", os.linesep)
+            data = fragment.encode("utf-8")
+            encoded.append(data)
+            offsets.append(offsets[-1] + len(data))
+
+        mode = "r+b" if first and os.path.exists(self.outputPath) else "wb"
+        with open(self.outputPath, mode) as f:
+            f.seek(offsets[first])
+            f.write(b"".join(encoded))
+            f.truncate()
+
+        self._fragments = fragments
+        self._offsets = offsets
+        return offsets[-1] - offsets[first]
+
+    def update(self) -> dict:
+        """Render and patch once; returns what was redone and how long it took."""
+        start = time.perf_counter()
+        fragments = self.render()
+        written = self.write(fragments)
+        self.lastStats["bytes_written"] = written
+        self.lastStats["ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return self.lastStats
+
+    # -------------------------
+    # polling
+    # -------------------------
+    def _current_signature(self):
+        try:
+            st = os.stat(self.inputPath)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def changed(self) -> bool:
+        signature = self._current_signature()
+        if signature is None or signature == self._signature:
+            return False
+        self._signature = signature
+        return True
+
+    def watch(self, interval: float = 0.2, maxUpdates: Optional[int] = None) -> None:
+        """Poll the input and update the output on every change until interrupted."""
+        updates = 0
+        try:
+            while maxUpdates is None or updates < maxUpdates:
+                if self.changed():
+                    try:
+                        stats = self.update()
+                    except Exception as e:  # half-saved file; try again on the next change
+                        print(f"Update failed: {type(e).__name__}: {e}")
+                    else:
+                        print(f"Updated {self.outputPath}: {stats['questions_rendered']} question(s), "
+                              f"{stats['sections_rendered']}/{stats['sections']} section(s) re-rendered "
+                              f"in {stats['ms']} ms")
+                    updates += 1
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+
+
+def watch_exam(inputPath, outputPath, title="Mathematics Exam", subject="Mathematics",
+               interval=0.2, cache=None):
+    print(f"Watching {inputPath} -> {outputPath} (Ctrl+C to stop)")
+    ExamWatcher(inputPath, outputPath, title, subject, cache=cache).watch(interval)
@@ -0,0 +1,130 @@
+"""
+LatexMathFixer run one fragment at a time, optionally memoised.
+
+Instead of fixing the assembled document, the converter hands each question
+(and each section opening/closing) to FragmentFixer.fix before it is joined.
+By default a fragment is simply run through FIX_ENGINE. With memoise=True it is
+first looked up by a hash of its text, so a question repeated across a bank is
+fixed once per process; inside a fragment, the rules that rewrite one formula
+at a time (braces, \\left/\\right pairing, words in math) look each $...$ up by
+its text, so the same \\frac{1}{2} or \\overline{B} is only worked on the first
+time it is seen. That only pays when fragments repeat: on papers whose
+questions are all different, hashing and the formula lookups cost more than
+they save (testers/fixBenchmark.py measures both).
+
+A fragment is fixed exactly as FIX_ENGINE would fix it on its own. That is not
+always what fixing the whole document gave: "Line N" reports count from the
+start of the fragment, and a $ left open in one question is no longer paired
+with a $ in the next.
+"""
+import hashlib
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from testers.fixEngine import FIX_ENGINE, MATH, WORDY_MATH, FixEngine, Fixes, RuleProfiler, Stage
+
+# the stages that are one pattern.sub over formulas, where what a formula becomes
+# depends on its own text only; they can be run on each formula alone and memoised
+FORMULA_STAGES = {
+    "fix_incomplete_braces": MATH,
+    "fix_leftright_pairing": MATH,
+    "fix_text_in_math_mode": WORDY_MATH,
+}
+
+
+def fragment_key(fragment: str) -> bytes:
+    return hashlib.blake2b(fragment.encode("utf-8"), digest_size=16).digest()
+
+
+class _LRU(OrderedDict):
+    def __init__(self, maxItems: int):
+        super().__init__()
+        self.maxItems = maxItems
+
+    def lookup(self, key):
+        value = self.get(key)
+        if value is not None:
+            self.move_to_end(key)
+        return value
+
+    def store(self, key, value):
+        if self.maxItems <= 0:
+            return
+        self[key] = value
+        if len(self) > self.maxItems:
+            self.popitem(last=False)
+
+
+class FragmentFixer:
+    """
+    Per-fragment LaTeX fixing.
+
+    Args:
+        engine: The FixEngine whose stages are run (FIX_ENGINE, the fix_all rules)
+        memoise: Remember fixed fragments and formulas (off: every fragment is run through engine)
+        memoryItems: Fragments remembered (least recently used dropped first)
+        formulaItems: Formulas remembered, per formula stage
+        profiler: A RuleProfiler timing each stage; fragments served from memory aren't run, so
+            aren't counted (set the attribute to profile a batch, or None to stop)
+    """
+
+    def __init__(self, engine: FixEngine = FIX_ENGINE, memoise: bool = False, memoryItems: int = 16384,
+                 formulaItems: int = 65536, profiler: Optional[RuleProfiler] = None):
+        self.engine = engine
+        self.memoise = memoise
+        self.memoryItems = memoryItems
+        self.formulaItems = formulaItems
+        self.profiler = profiler
+        self._fragments = _LRU(memoryItems)
+        self._formulas = {}
+        self._engine = FixEngine([(name, self._formula_stage(name, stage) if name in FORMULA_STAGES else stage)
+                                  for name, stage in engine.stages])
+        self.hits = 0
+        self.misses = 0
+        self.formulaHits = 0
+        self.formulaMisses = 0
+
+    def _formula_stage(self, name: str, stage: Stage) -> Stage:
+        pattern = FORMULA_STAGES[name]
+        memo = self._formulas[name] = _LRU(self.formulaItems)
+
+        def run(text: str, fixes: Fixes) -> Tuple[str, int, int]:
+            matches = changed = 0
+
+            def replace(m):
+                nonlocal matches, changed
+                formula = m.group(0)
+                entry = memo.lookup(formula)
+                if entry is None:
+                    self.formulaMisses += 1
+                    found = []
+                    entry = (*stage(formula, found), tuple(found))
+                    memo.store(formula, entry)
+                else:
+                    self.formulaHits += 1
+                matches += entry[1]
+                changed += entry[2]
+                fixes.extend(entry[3])
+                return entry[0]
+
+            return pattern.sub(replace, text), matches, changed
+
+        return run
+
+    def fix(self, fragment: str, fixes: Optional[Fixes] = None) -> str:
+        """The fixed fragment; what was fixed is appended to fixes when given."""
+        if not self.memoise:
+            self.misses += 1
+            return self.engine.run(fragment, [] if fixes is None else fixes, self.profiler)
+        key = fragment_key(fragment)
+        entry: Optional[Tuple[str, Tuple[str, ...]]] = self._fragments.lookup(key)
+        if entry is None:
+            self.misses += 1
+            found: List[str] = []
+            entry = (self._engine.run(fragment, found, self.profiler), tuple(found))
+            self._fragments.store(key, entry)
+        else:
+            self.hits += 1
+        if fixes is not None:
+            fixes.extend(entry[1])
+        return entry[0]
@@ -0,0 +1,334 @@
+"""
+Content-addressed store for the images an exam references.
+
+The OCR output points at images relative to each exam (imgs/....jpg), and
+every exam ships its own copy of the same logos and figures. With an
+AssetStore, the images found by the html pre-pass are resolved against the
+exam's directory, hashed on a thread pool and copied (or linked) once into
+the store as <sha256><ext>; the \\includegraphics paths in the LaTeX are
+then rewritten to point there, relative to the .tex.
+
+The rewrite happens when a fragment is finished, not in the pre-pass, so
+source offsets (the question index) and cached question LaTeX don't depend
+on where the assets live. A file already in the store is never copied
+again, by this process or any other, and manifest.json in the store says
+which source files each asset came from.
+
+Figures are sized from their pixel dimensions, which probe_dimensions reads
+from the first bytes of a PNG, GIF or JPEG without decoding it: SizePolicy
+picks width= or height= so a tall diagram doesn't run off the page. The
+dimensions are kept per content hash, in memory and in the manifest.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import struct
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from eventHooks import ASSET_MISSING, emit
+
+MANIFEST_NAME = "manifest.json"
+LINK_MODES = ("copy", "hardlink", "symlink")
+
+# the same format under two names shouldn't make two assets
+_EXTENSIONS = {".jpeg": ".jpg", ".jpe": ".jpg", ".tif": ".tiff"}
+
+# what Image.to_latex writes
+INCLUDEGRAPHICS_PATTERN = re.compile(r'\\includegraphics(\[[^\]]*\])?\{([^}]*)\}')
+
+
+class Asset(NamedTuple):
+    name: str     # <sha256><ext>, its path inside the store
+    source: str   # the file it was made from, absolute
+    size: int
+    copied: bool  # False when the store already had it
+    dimensions: Optional[Tuple[int, int]] = None  # (width, height) in pixels, if the header said
+
+
+# -------------------------
+# dimensions
+# -------------------------
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# start-of-frame markers; C4 (huffman tables), C8 (reserved) and CC (arithmetic coding) are not frames
+_JPEG_FRAMES = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# markers without a length
+_JPEG_STANDALONE = {0x01, *range(0xD0, 0xD9)}
+
+
+def probe_dimensions(path: str) -> Optional[Tuple[int, int]]:
+    """(width, height) of a PNG, GIF or JPEG from its header bytes alone; None for anything else."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(26)
+            if head.startswith(_PNG_SIGNATURE) and head[12:16] == b"IHDR":
+                return struct.unpack(">II", head[16:24])
+            if head[:6] in (b"GIF87a", b"GIF89a"):
+                return struct.unpack("<HH", head[6:10])
+            if head[:2] == b"\xff\xd8":
+                f.seek(2)
+                return _jpeg_dimensions(f)
+    except (OSError, struct.error):
+        pass
+    return None
+
+
+def _jpeg_dimensions(f) -> Optional[Tuple[int, int]]:
+    # walk the segment headers, seeking over their bodies, up to the first frame
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b"\xff":
+            continue
+        marker = f.read(1)
+        while marker == b"\xff":  # fill bytes
+            marker = f.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        if code in _JPEG_STANDALONE or code == 0x00:
+            continue
+        if code == 0xD9:  # end of image before any frame
+            return None
+        length = struct.unpack(">H", f.read(2))[0]
+        if code in _JPEG_FRAMES:
+            height, width = struct.unpack(">xHH", f.read(5))
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+class SizePolicy(NamedTuple):
+    """
+    How big a figure is drawn: `width` of the text width, unless that would make it
+    taller than `maxHeight` of the text height, in which case it gets that height.
+    pageAspect is textheight / textwidth of the template (a4, 1in margins).
+    """
+    width: float = 0.6
+    maxHeight: float = 0.4
+    pageAspect: float = 1.55
+
+    def options(self, dimensions: Optional[Tuple[int, int]]) -> str:
+        if dimensions and dimensions[0] > 0:
+            pixelWidth, pixelHeight = dimensions
+            if self.width * pixelHeight / pixelWidth > self.maxHeight * self.pageAspect:
+                return rf"height={self.maxHeight:g}\textheight"
+        return rf"width={self.width:g}\textwidth"
+
+
+def asset_name(path: str, digest: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    return digest + _EXTENSIONS.get(extension, extension)
+
+
+def is_local(src: str) -> bool:
+    return "://" not in src and not src.startswith("data:")
+
+
+class AssetStore:
+    """
+    A directory of images named by the hash of their content.
+
+    Args:
+        directory: Where the assets (and manifest.json) live; shared by every exam of a batch
+        workers: Threads hashing and copying the images of an exam
+        mode: "copy", or "hardlink" / "symlink" to link to the source instead (falls back to copying)
+        sizePolicy: How the figures are sized once their dimensions are known
+    """
+
+    def __init__(self, directory: str, workers: int = 8, mode: str = "copy",
+                 sizePolicy: SizePolicy = SizePolicy()):
+        if mode not in LINK_MODES:
+            raise ValueError(f"unknown asset mode {mode!r}; expected one of {LINK_MODES}")
+        self.directory = os.path.abspath(directory)
+        self.workers = workers
+        self.mode = mode
+        self.sizePolicy = sizePolicy
+        os.makedirs(self.directory, exist_ok=True)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        # (path, size, mtime) -> Asset, so a file used by many exams of a worker is hashed once
+        self._known: Dict[Tuple[str, int, int], Asset] = {}
+        # content hash -> (width, height); what earlier batches probed comes from the manifest
+        self._dimensions: Dict[str, Optional[Tuple[int, int]]] = self._manifest_dimensions()
+        self.copied = 0
+        self.reused = 0
+
+    def exam(self, filePath: str, outputPath: str) -> "ExamAssets":
+        """The assets of one conversion: srcs resolved against filePath, paths rewritten for outputPath."""
+        return ExamAssets(self, filePath, outputPath)
+
+    def add(self, path: str) -> Asset:
+        """Put a file in the store, unless it is already there; raises OSError if it can't be read."""
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        asset = self._known.get(key)
+        if asset is not None:
+            return asset._replace(copied=False)
+        with open(path, "rb") as f:
+            digest = hashlib.file_digest(f, "sha256").hexdigest()
+        name = asset_name(path, digest)
+        target = os.path.join(self.directory, name)
+        copied = not os.path.exists(target)
+        if copied:
+            self._place(path, target)
+        if digest not in self._dimensions:
+            self._dimensions[digest] = probe_dimensions(path)
+        asset = self._known[key] = Asset(name, path, stat.st_size, copied, self._dimensions[digest])
+        return asset
+
+    def _place(self, path: str, target: str) -> None:
+        # into a temporary name first, so another worker never sees half a file under the hash
+        if self.mode == "symlink":
+            temporary = target + f".{os.getpid()}.tmp"
+            try:
+                os.symlink(path, temporary)
+                os.replace(temporary, target)
+                return
+            except OSError:
+                pass
+        if self.mode == "hardlink":
+            temporary = target + f".{os.getpid()}.tmp"
+            try:
+                os.link(path, temporary)
+                os.replace(temporary, target)
+                return
+            except OSError:
+                pass
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as out, open(path, "rb") as f:
+                shutil.copyfileobj(f, out, 1 << 20)
+            os.replace(temporary, target)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+    def add_all(self, paths: List[str]) -> List[Optional[Asset]]:
+        """add() for each path on the thread pool, in order; None for a file that can't be read."""
+        if len(paths) <= 1 or self.workers <= 1:
+            return [self._try_add(path) for path in paths]
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="assets")
+        return list(self._pool.map(self._try_add, paths))
+
+    def _try_add(self, path: str) -> Optional[Asset]:
+        try:
+            return self.add(path)
+        except OSError:
+            return None
+
+    # -------------------------
+    # manifest
+    # -------------------------
+    @property
+    def manifestPath(self) -> str:
+        return os.path.join(self.directory, MANIFEST_NAME)
+
+    def _read_manifest(self) -> Dict:
+        if not os.path.exists(self.manifestPath):
+            return {}
+        with open(self.manifestPath, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _manifest_dimensions(self) -> Dict[str, Optional[Tuple[int, int]]]:
+        dimensions = {}
+        for name, entry in self._read_manifest().get("assets", {}).items():
+            if "width" in entry:
+                dimensions[os.path.splitext(name)[0]] = (entry["width"], entry["height"]) if entry["width"] else None
+        return dimensions
+
+    def write_manifest(self, assets: Iterable[Dict]) -> str:
+        """
+        Merge asset records ({"name", "source", "size", "width", "height"}, as in a
+        batch result) into manifest.json and return its path. Run by one process:
+        the batch parent.
+        """
+        manifest = self._read_manifest()
+        entries = manifest.setdefault("assets", {})
+        for record in assets:
+            entry = entries.setdefault(record["name"], {"size": record["size"], "sources": []})
+            # 0 x 0 when the header couldn't be read, so it isn't probed again
+            entry["width"], entry["height"] = record["width"], record["height"]
+            if record["source"] not in entry["sources"]:
+                entry["sources"].append(record["source"])
+        for entry in entries.values():
+            entry["sources"].sort()
+        manifest["assets"] = dict(sorted(entries.items()))
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(handle, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(temporary, self.manifestPath)
+        return self.manifestPath
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+class ExamAssets:
+    """
+    The images of one exam: resolve() them after the pre-pass, then rewrite()
+    every fragment on its way out.
+    """
+
+    def __init__(self, store: AssetStore, filePath: str, outputPath: str):
+        self.store = store
+        self.filePath = filePath
+        self.examDir = os.path.dirname(os.path.abspath(filePath))
+        self.outputDir = os.path.dirname(os.path.abspath(outputPath))
+        self.paths: Dict[str, str] = {}    # src as written -> path for the .tex
+        self.assets: Dict[str, Asset] = {}  # src as written -> its asset
+        self.missing: List[str] = []
+
+    def resolve(self, srcs: Iterable[str]) -> None:
+        """Store every image not seen yet in this exam (the new ones all at once, on the pool)."""
+        pending = []
+        for src in srcs:
+            if src in self.paths or src in pending or src in self.missing or not is_local(src):
+                continue
+            pending.append(src)
+        if not pending:
+            return
+        sources = [os.path.normpath(os.path.join(self.examDir, src)) for src in pending]
+        for src, asset in zip(pending, self.store.add_all(sources)):
+            if asset is None:
+                self.missing.append(src)
+                emit(ASSET_MISSING, file=self.filePath, src=src)
+                continue
+            if asset.copied:
+                self.store.copied += 1
+            else:
+                self.store.reused += 1
+            self.assets[src] = asset
+            target = os.path.join(self.store.directory, asset.name)
+            self.paths[src] = os.path.relpath(target, self.outputDir).replace(os.sep, "/")
+
+    def rewrite(self, fragment: str) -> str:
+        """
+        fragment with every \\includegraphics of a stored image pointing at the store,
+        and sized by the store's SizePolicy.
+        """
+        if not self.paths or "\\includegraphics" not in fragment:
+            return fragment
+
+        def replace(match):
+            src = match.group(2)
+            path = self.paths.get(src)
+            if path is None:
+                return match.group(0)
+            options = self.store.sizePolicy.options(self.assets[src].dimensions)
+            return rf"\includegraphics[{options}]{{{path}}}"
+
+        return INCLUDEGRAPHICS_PATTERN.sub(replace, fragment)
+
+    def records(self) -> List[Dict]:
+        """What write_manifest takes, for this exam's images."""
+        return [{"name": asset.name, "source": asset.source, "size": asset.size,
+                 "width": asset.dimensions[0] if asset.dimensions else 0,
+                 "height": asset.dimensions[1] if asset.dimensions else 0}
+                for asset in self.assets.values()]
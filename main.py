@@ -7,112 +7,798 @@ from questionTypeHandler.sectionsHandler import *
 
 from documentLayoutHandler.displayHandler import *
 from documentLayoutHandler.packagesHandler import *
+from documentLayoutHandler.latexSink import write_latex
 
 from testers.fixes import replace_simple
 
+from eventHooks import BUDGET_EXCEEDED, LoggingListener, emit, stage, subscribe
+from conversionCache import QuestionCache, normalize_question, question_key
+from questionIndex import QuestionIndex, index_path_for
+from imageAssets import AssetStore, SizePolicy
+from fragmentFixer import FragmentFixer
+from testers.fixEngine import RuleProfiler
+from timeBudget import BudgetExceeded, TimeBudget
 
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError, as_completed
 
 
-def handle_mc_section(section):
-    latex = r'\section*{' + section.Header + r'}' + r'\n\\begin{enumerate}\n'
-    mcSection = MultipleChoiceSection(section)
-    questions = mcSection.questionsSeperator(section.Body)
 
-    for q in questions:
-        handler = multipleChoiceQuestionHandler(q)
-        mchandler = handler.identify_handler()
-        mcQuestion = mchandler()  # call the function, not tempHandler.mchandler
-        mcSection.questionsList.append(mcQuestion)
 
-    for q in mcSection.questionsList:
-        handler = multipleChoiceQuestionHandler(q)
-        mainQ, Options = handler.mcWrapper(q)
-        latex += rf"\item {mainQ}\n{Options}\n"
+def section_opening(section):
+    return r'\section*{' + section.Header + r'}' + r'\n\\begin{enumerate}\n'
 
-    latex += r"\\end{enumerate}\n"
-    return latex
 
-
-def handle_fib_section(section):
-    latex = r'\section*{' + section.Header + r'}' + r'\n\\begin{enumerate}\n'
-    fibSection = FillInBlankSection(section)
-    # fib is different from them since it's not complicated at all
-    handler = fillInBlankQuestionHandler(section.Body)
-    questions = handler.fibHandler()
-    fibSection.questionsList = questions
-    
-    for q in fibSection.questionsList:
-        handler = fillInBlankQuestionHandler(q)
-        latex += handler.fibWrapper(q)
+SECTION_CLOSING = r"\\end{enumerate}\n"
 
 
-    latex += r"\\end{enumerate}\n"
-    return latex
+class Verbatim(str):
+    """A fragment that is final as it is; finish_fragment leaves it alone."""
 
 
-def handle_eq_section(section):
-    latex = r'\section*{' + section.Header + r'}' + r'\n\\begin{enumerate}\n'
-    eqSection = EssaySection(section)
-    questions = eqSection.questionsSeperator(section.Body)
+def verbatim_question(text):
+    # what render_block_to_latex does with a block it can't parse
+    return Verbatim("\\item\n\\begin{verbatim}\n" + text + "\n\\end{verbatim}\n")
 
-    for q in questions:
-        handler = EssayQuestionHandler(q)
-        eqhandler = handler.identify_handler()
-        eqQ = eqhandler()
-        eqSection.questionsList.append(eqQ)
 
-    for q in eqSection.questionsList:
-        handler = EssayQuestionHandler(q)
-        mainDesc, subqs = handler.eqWrapper(q)
-        latex += rf"\item {mainDesc}\n{subqs}\n"
+def verbatim_document(content):
+    return Verbatim("\\begin{verbatim}\n" + content + "\n\\end{verbatim}\n")
 
-    latex += r"\\end{enumerate}\n"
 
-    return latex
+# one converter per section type: question text -> (question object, LaTeX fragment)
+def convert_mc_question(text):
+    handler = multipleChoiceQuestionHandler(text)
+    mchandler = handler.identify_handler()
+    mcQuestion = mchandler()  # call the function, not tempHandler.mchandler
+    mainQ, Options = handler.mcWrapper(mcQuestion)
+    return mcQuestion, rf"\item {mainQ}\n{Options}\n"
 
 
-def main():
-    filePath = r"C:\Users\user\Desktop\CEE\tex file testing\MATH\MATH1\originaltex.md"
+def convert_fib_question(text):
+    # fib is different from them since it's not complicated at all
+    handler = fillInBlankQuestionHandler(text)
+    fibQuestion = handler.fibHandler([text])[0]
+    return fibQuestion, handler.fibWrapper(fibQuestion)
+
+
+def convert_eq_question(text):
+    handler = EssayQuestionHandler(text)
+    eqhandler = handler.identify_handler()
+    eqQ = eqhandler()
+    mainDesc, subqs = handler.eqWrapper(eqQ)
+    return eqQ, rf"\item {mainDesc}\n{subqs}\n"
+
+
+def render_question(sectionType, text, converter, cache=None):
+    """Convert one question, going through the cache when there is one."""
+    text = normalize_question(text)
+    if cache is None:
+        return converter(text)
+    key = question_key(text, sectionType)
+    entry = cache.get(key)
+    if entry is None:
+        entry = converter(text)
+        cache.put(key, *entry)
+    return entry
+
+
+def iter_questions_latex(section, sectionObject, converter, cache=None, budget=None, indexer=None):
+    # once the budget is spent every guard raises straight away, so the rest goes out verbatim
+    budget = budget if budget is not None else TimeBudget()
+    yield section_opening(section)
+    source = sectionObject.Source
+    for span in sectionObject.questionSpans():
+        text = span.text(source)
+        try:
+            with budget.guard():
+                question, latex = render_question(section.Type, text, converter, cache)
+        except BudgetExceeded:
+            if indexer is not None:
+                indexer.question(sectionObject, span, verbatim=True)
+            yield verbatim_question(text)
+            continue
+        except Exception as e:
+            raise QuestionError(sectionObject, span, e) from e
+        sectionObject.questionsList.append(question)
+        if indexer is not None:
+            indexer.question(sectionObject, span, question)
+        yield latex
+    yield SECTION_CLOSING
+
+
+def iter_mc_section(section, cache=None, budget=None, indexer=None):
+    return iter_questions_latex(section, MultipleChoiceSection(section), convert_mc_question, cache, budget, indexer)
+
+
+def iter_fib_section(section, cache=None, budget=None, indexer=None):
+    return iter_questions_latex(section, FillInBlankSection(section), convert_fib_question, cache, budget, indexer)
+
+
+def iter_eq_section(section, cache=None, budget=None, indexer=None):
+    return iter_questions_latex(section, EssaySection(section), convert_eq_question, cache, budget, indexer)
+
+
+def iter_section_latex(section, cache=None, budget=None, indexer=None):
+    if section.Type == "选择题":  # access .value of Enum
+        return iter_mc_section(section, cache, budget, indexer)
+    elif section.Type == "填空题":
+        return iter_fib_section(section, cache, budget, indexer)
+    else:
+        return iter_eq_section(section, cache, budget, indexer)
+
+
+# -------------------------
+# Parallel question conversion
+# -------------------------
+SECTION_CLASSES = {"选择题": MultipleChoiceSection, "填空题": FillInBlankSection}
+QUESTION_CONVERTERS = {"选择题": convert_mc_question, "填空题": convert_fib_question}
+
+
+def _render_task(task):
+    # top level so process pools can pickle it; anything that isn't mc/fib is an essay, as above
+    sectionType, text = task
+    return QUESTION_CONVERTERS.get(sectionType, convert_eq_question)(text)
+
+
+def iter_sections_parallel(sections, executor, chunksize=16, cache=None, budget=None, indexer=None):
+    """
+    The fragments iter_section_latex would give for every section, in the same
+    order, with the questions converted on `executor` (thread or process pool).
+
+    Questions are cut serially, cache hits are served here, and only the misses
+    are mapped over the pool; chunksize batches them per process round trip.
+    With a budget, results not back by its deadline are rendered verbatim (the
+    pending ones are cancelled; a worker already stuck on one runs on).
+    """
+    budget = budget if budget is not None else TimeBudget()
+    plan = []
+    entries = []
+    tasks = []
+    for section in sections:
+        sectionObject = SECTION_CLASSES.get(section.Type, EssaySection)(section)
+        spans = sectionObject.questionSpans()
+        texts = [normalize_question(span.text(section.Source)) for span in spans]
+        plan.append((section, sectionObject, spans, texts))
+        for text in texts:
+            entry = cache.get(question_key(text, section.Type)) if cache is not None else None
+            entries.append(entry)
+            if entry is None:
+                tasks.append((section.Type, text))
+
+    # map keeps submission order, so the output is the same as the serial path
+    results = executor.map(_render_task, tasks, chunksize=chunksize, timeout=budget.remaining())
+    timedOut = False
+    i = 0
+    for section, sectionObject, spans, texts in plan:
+        yield section_opening(section)
+        for span, text in zip(spans, texts):
+            entry = entries[i]
+            i += 1
+            if entry is None and not timedOut:
+                try:
+                    entry = next(results)
+                except TimeoutError:
+                    budget.exceeded = timedOut = True
+                    results.close()
+                except Exception as e:
+                    raise QuestionError(sectionObject, span, e) from e
+                else:
+                    if cache is not None:
+                        cache.put(question_key(text, section.Type), *entry)
+            if entry is None:
+                if indexer is not None:
+                    indexer.question(sectionObject, span, verbatim=True)
+                yield verbatim_question(text)
+                continue
+            sectionObject.questionsList.append(entry[0])
+            if indexer is not None:
+                indexer.question(sectionObject, span, entry[0])
+            yield entry[1]
+        yield SECTION_CLOSING
+
+
+# the string-returning versions, kept for callers that want a whole section at once
+def handle_mc_section(section, cache=None):
+    return "".join(iter_mc_section(section, cache))
+
+
+def handle_fib_section(section, cache=None):
+    return "".join(iter_fib_section(section, cache))
+
+
+def handle_eq_section(section, cache=None):
+    return "".join(iter_eq_section(section, cache))
+
+
+def finish_fragment(fragment, assets=None, fixer=None, budget=None):
+    # every fragment ends on a literal \n, so cleaning them one at a time gives the same
+    # result as cleaning the assembled document; a FragmentFixer then fixes the math of
+    # this fragment alone (before the image paths, which differ from one exam to the next),
+    # inside the budget: a fragment the fixer doesn't finish in time is kept unfixed
+    if isinstance(fragment, Verbatim):
+        return str(fragment)
+    fragment = fragment.replace(r"\n", "\n")
+    fragment = replace_simple(fragment)
+    if fixer is not None:
+        if budget is None:
+            fragment = fixer.fix(fragment)
+        else:
+            try:
+                with budget.guard():
+                    fragment = fixer.fix(fragment)
+            except BudgetExceeded:
+                pass
+    if assets is not None:
+        fragment = assets.rewrite(fragment)
+    return fragment
+
+
+def load_exam_text(filePath, convertHtml=True, assets=None):
+    """
+    Read an exam and turn its html images/tables into LaTeX in memory; the file is never modified.
+    With an ExamAssets, the images found are put in its store (the paths are rewritten by finish_fragment).
+    """
+    with open(filePath, "r", encoding="utf-8") as f:
+        content = f.read()
+    if convertHtml:
+        tweaker = HtmlTweaker()
+        content = tweaker.convert_text(content)
+        if assets is not None:
+            assets.resolve(tweaker.image_sources())
+    return content
+
+
+def iter_exam_latex(filePath, title="Mathematics Exam", subject="Mathematics", exam=None, convertHtml=True,
+                    cache=None, executor=None, chunksize=16, budget=None, indexer=None, stream=False,
+                    assets=None, fixer=None):
+    """
+    Yield the LaTeX for an exam piece by piece: the template header, then each
+    section opening, question and closing as soon as it is converted, then the footer.
+    With a QuestionCache, questions converted before are served from it; with an
+    executor, the questions of the whole paper are converted on it. With a
+    TimeBudget, whatever is left when it runs out is rendered verbatim. An
+    ExamIndexer is told about each question before its fragment is yielded
+    (run the fragments through indexer.track() to index them). With stream,
+    the file is never read whole: sections are cut from a memory map and
+    converted one at a time (see iter_stream_sections). With an ExamAssets
+    (AssetStore.exam), the images go to its store and the LaTeX points there.
+    With a FragmentFixer, the LatexMathFixer rules are run on each question as
+    it is finished rather than on the assembled document, within the budget.
+    """
+    mathExam = exam if exam is not None else Exam(filePath)
+    mathExam.Title = title
+
+    yield templateHeader(mathExam.Title, subject)
+
+    budget = (budget if budget is not None else TimeBudget()).start()
+    try:
+        if stream:
+            mathExam.Sections = []
+            for fragment in iter_stream_sections(filePath, convertHtml, cache, executor, chunksize, budget, indexer,
+                                                 assets):
+                yield finish_fragment(fragment, assets, fixer, budget)
+        else:
+            with stage("load", file=filePath):
+                try:
+                    with budget.guard():
+                        content = load_exam_text(filePath, convertHtml, assets)
+                except BudgetExceeded:
+                    content = load_exam_text(filePath, convertHtml=False)
+            with stage("partition", file=filePath):
+                try:
+                    with budget.guard():
+                        Sections = examPartitioning(filePath, text=content).handleSections() or []
+                except BudgetExceeded:
+                    Sections = None
+
+            if Sections is None:
+                # not even the sections were found in time
+                mathExam.Sections = []
+                yield verbatim_document(content)
+            elif executor is not None:
+                mathExam.Sections = Sections
+                with stage("questions", file=filePath, sections=len(Sections)):
+                    for fragment in iter_sections_parallel(Sections, executor, chunksize, cache, budget, indexer):
+                        yield finish_fragment(fragment, assets, fixer, budget)
+            else:
+                mathExam.Sections = Sections
+                for section in Sections:
+                    # note: the duration includes the time the consumer spends on the yielded fragments
+                    with stage("section", file=filePath, section=section.Header):
+                        for fragment in iter_section_latex(section, cache, budget, indexer):
+                            yield finish_fragment(fragment, assets, fixer, budget)
+    finally:
+        budget.stop()
+
+    if budget.exceeded:
+        emit(BUDGET_EXCEEDED, file=filePath, seconds=budget.seconds)
+    yield templateFooter()
+
+
+def iter_stream_sections(filePath, convertHtml=True, cache=None, executor=None, chunksize=16, budget=None,
+                         indexer=None, assets=None):
+    """
+    Convert a bank file section by section without ever holding all of it: each
+    section is partitioned when the previous one is done and dropped after, so
+    memory is bounded by the largest section rather than the file. The sections
+    are not kept on the Exam. The budget covers the questions only; cutting a
+    section is a linear scan.
+    """
+    for section in examPartitioning(filePath).iterSections(convertHtml, assets):
+        with stage("section", file=filePath, section=section.Header):
+            if executor is not None:
+                yield from iter_sections_parallel([section], executor, chunksize, cache, budget, indexer)
+            else:
+                yield from iter_section_latex(section, cache, budget, indexer)
+
+
+def convert_exam(filePath, outputPath, title="Mathematics Exam", subject="Mathematics", cache=None,
+                 executor=None, chunksize=16, budget=None, index=None, stream=False, assets=None,
+                 fixer=None):
+    """
+    Write the .tex for an exam; with a QuestionIndex, also index its questions once it is written.
+    assets is an ExamAssets made for this exam and outputPath (AssetStore.exam).
+    """
     mathExam = Exam(filePath)
-    mathExam.Title = "Mathematics Exam"
-
-    latexOutput=""
-
-    examSplitter = examPartitioning(filePath)
-    Sections = examSplitter.handleSections()
-    mathExam.Sections = Sections
-   
-
-    for section in Sections:
-        if section.Type == "选择题":  # access .value of Enum
-            latexOutput += handle_mc_section(section)
-        elif section.Type == "填空题":
-            latexOutput += handle_fib_section(section)
+    indexer = index.exam(filePath, outputPath) if index is not None else None
+    fragments = iter_exam_latex(filePath, title, subject, exam=mathExam, cache=cache, executor=executor,
+                                chunksize=chunksize, budget=budget, indexer=indexer, stream=stream, assets=assets,
+                                fixer=fixer)
+    write_latex(indexer.track(fragments) if indexer is not None else fragments, outputPath)
+    return mathExam
+
+
+# -------------------------
+# Batch conversion
+# -------------------------
+def expand_inputs(patterns, extension=".md"):
+    """Expand files, globs and directories into a de-duplicated list of exam files."""
+    files = []
+    seen = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, "**", "*" + extension), recursive=True)
         else:
-            latexOutput += handle_eq_section(section)
-
-    
-    latexOutput = latexOutput.replace(r"\n", "\n")
-    latexOutput = replace_simple(latexOutput)
-    latexOutput =  templateHeader(mathExam.Title, "Mathematics") + latexOutput
-    latexOutput += templateFooter()
+            matches = glob.glob(pattern, recursive=True) or [pattern]
+        for path in sorted(matches):
+            key = os.path.abspath(path)
+            if key not in seen:
+                seen.add(key)
+                files.append(path)
+    return files
 
-    with open("myfile.txt", "w", encoding="utf-8") as f:
-        f.write(latexOutput)
 
-    htmlEditor = HtmlTweaker(filePath)
-    htmlEditor.process()
-    
-    with open("myfile.txt", "r", encoding="utf-8") as f:
-        content = f.read()
+class OutputCollision(ValueError):
+    """Two inputs of a batch that would be written to the same .tex."""
 
-    print(content)
 
-if __name__ == "__main__":
-    main()
+def input_root(inputs):
+    """The deepest directory holding every input (None when they are on different drives)."""
+    directories = [os.path.dirname(os.path.abspath(p)) for p in inputs]
+    try:
+        return os.path.commonpath(directories) if directories else None
+    except ValueError:
+        return None
 
 
+def output_path_for(inputPath, outputDir=None, inputRoot=None):
+    """
+    The .tex written for an input: next to it, or inside outputDir when given. With
+    inputRoot (input_root of the batch), the input's folders below it are kept under
+    outputDir, so MATH1/originaltex.md and MATH2/originaltex.md don't share a .tex.
+    """
+    stem = os.path.splitext(os.path.basename(inputPath))[0]
+    if not outputDir:
+        directory = os.path.dirname(inputPath)
+    elif inputRoot:
+        directory = os.path.normpath(os.path.join(
+            outputDir, os.path.relpath(os.path.dirname(os.path.abspath(inputPath)), inputRoot)))
+    else:
+        directory = outputDir
+    return os.path.join(directory, stem + ".tex")
 
 
+# one cache per process and path, so a worker's in-memory LRU survives from one exam to the next
+_caches = {}
+
+
+def open_cache(cachePath, maxBytes=256 * 1024 * 1024):
+    cache = _caches.get(cachePath)
+    if cache is None:
+        cache = _caches[cachePath] = QuestionCache(cachePath, maxBytes=maxBytes)
+    return cache
+
+
+# and for question indexes: a shared bank is opened once per worker, while one index per
+# exam is closed when the next exam opens its own, so a long batch doesn't pile up connections
+_indexes = {}
+
+
+def open_index(indexPath):
+    index = _indexes.get(indexPath)
+    if index is None:
+        close_indexes()
+        index = _indexes[indexPath] = QuestionIndex(indexPath)
+    return index
+
+
+def close_indexes():
+    for index in _indexes.values():
+        index.close()
+    _indexes.clear()
+
+
+# and for asset stores, so a worker hashes each image file once however many of its exams use it
+_assetStores = {}
+
+
+def open_asset_store(directory, workers=8, mode="copy", sizePolicy=SizePolicy()):
+    key = (directory, workers, mode, sizePolicy)
+    store = _assetStores.get(key)
+    if store is None:
+        store = _assetStores[key] = AssetStore(*key)
+    return store
+
+
+def close_asset_stores():
+    for store in _assetStores.values():
+        store.close()
+    _assetStores.clear()
+
+
+# and for the fragment fixer, so a formula or question fixed for one exam is remembered for the next
+_fixers = {}
+
+
+def open_fragment_fixer(memoise=False, memoryItems=16384):
+    fixer = _fixers.get((memoise, memoryItems))
+    if fixer is None:
+        fixer = _fixers[(memoise, memoryItems)] = FragmentFixer(memoise=memoise, memoryItems=memoryItems)
+    return fixer
+
+
+# same idea for the executors that convert the questions of one exam
+_questionExecutors = {}
+
+
+def open_question_executor(kind, workers):
+    """A shared thread or process pool for iter_exam_latex(executor=...)."""
+    executor = _questionExecutors.get((kind, workers))
+    if executor is None:
+        poolClass = ProcessPoolExecutor if kind == "process" else ThreadPoolExecutor
+        executor = _questionExecutors[(kind, workers)] = poolClass(max_workers=workers)
+    return executor
+
+
+def close_question_executors():
+    for executor in _questionExecutors.values():
+        executor.shutdown()
+    _questionExecutors.clear()
+
+
+def _convert_job(job):
+    # runs inside a worker process; never raises so one bad paper can't take the pool down
+    (inputPath, outputPath, title, subject, cachePath, cacheBytes, questionPool, budgetSeconds, indexPath, stream,
+     assetStore, fixMath, fixMemo, profileFix) = job
+    cache = open_cache(cachePath, cacheBytes) if cachePath else None
+    index = open_index(indexPath) if indexPath else None
+    store = open_asset_store(*assetStore) if assetStore else None
+    assets = store.exam(inputPath, outputPath) if store else None
+    fixer = open_fragment_fixer(fixMemo) if fixMath or fixMemo or profileFix else None
+    if fixer:
+        fixer.profiler = RuleProfiler() if profileFix else None
+    budget = TimeBudget(budgetSeconds)
+    executor, chunksize = None, 16
+    if questionPool:
+        kind, workers, chunksize = questionPool
+        executor = open_question_executor(kind, workers)
+    hits, misses = (cache.hits, cache.misses) if cache else (0, 0)
+    copied, reused = (store.copied, store.reused) if store else (0, 0)
+    fixHits, fixMisses = (fixer.hits, fixer.misses) if fixer else (0, 0)
+    start = time.perf_counter()
+    try:
+        with stage("exam", file=inputPath):
+            convert_exam(inputPath, outputPath, title, subject, cache=cache,
+                         executor=executor, chunksize=chunksize, budget=budget, index=index, stream=stream,
+                         assets=assets, fixer=fixer)
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        if cache:
+            cache.flush()
+    result = {
+        "input": inputPath,
+        "output": outputPath,
+        "ok": error is None,
+        "error": error,
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+    if budgetSeconds is not None:
+        result["budget_exceeded"] = budget.exceeded
+    if index:
+        result["index"] = indexPath
+    if cache:
+        result["cache_hits"] = cache.hits - hits
+        result["cache_misses"] = cache.misses - misses
+    if assets:
+        result["assets"] = assets.records()
+        result["assets_copied"] = store.copied - copied
+        result["assets_reused"] = store.reused - reused
+        result["assets_missing"] = assets.missing
+    if fixer:
+        result["fix_hits"] = fixer.hits - fixHits
+        result["fix_misses"] = fixer.misses - fixMisses
+        if fixer.profiler:
+            result["fix_profile"] = fixer.profiler.as_dict()
+    return result
+
+
+def enable_event_logging(level):
+    """Log every conversion event at `level`; also used as the worker initializer."""
+    logging.basicConfig(level=level, format="%(asctime)s %(process)d %(levelname)s %(message)s")
+    subscribe(LoggingListener(level))
+
+
+def run_batch(inputs, outputDir=None, jobs=None, maxTasksPerChild=None,
+              title="Mathematics Exam", subject="Mathematics", logLevel=None,
+              cachePath=None, cacheBytes=256 * 1024 * 1024, questionPool=None, budgetSeconds=None,
+              indexPath=None, stream=False, assetStore=None, fixMath=False, fixMemo=False, fixProfile=False):
+    """
+    Convert every input exam, largest first, fanned out over a process pool.
+    questionPool = (kind, workers, chunksize) converts the questions of each exam
+    on a "thread" or "process" pool instead; only used with jobs=1, since
+    several exam workers already keep the cores busy. budgetSeconds caps the time
+    spent converting any one exam; what is left past it is rendered verbatim.
+    indexPath writes a question index: one shared bank at that path, or with ""
+    one next to each .tex (index_path_for). stream converts each exam a section
+    at a time from a memory map, for bank files too big to read whole.
+    assetStore = (directory, workers, mode, sizePolicy) puts every image in one
+    content-addressed AssetStore, points the LaTeX at it, sizes each figure from
+    its header and writes the store's manifest.json at the end. fixMath runs the
+    LatexMathFixer rules on each question (FragmentFixer); fixMemo does too and
+    remembers, per worker, the questions and formulas already fixed, which only
+    pays off when they repeat across the batch. fixProfile runs the rules too
+    and adds up, per rule, the time, the matches, those that changed something
+    and the bytes changed by the questions actually fixed (summary
+    "fix_profile", see RuleProfiler).
+
+    With outputDir, each .tex goes in the same subfolder of outputDir as its input is
+    of the folder holding all the inputs (output_path_for); inputs that would still
+    share an output path raise OutputCollision before anything is converted.
+
+    Returns the summary dict (successes, failures and per-file timings).
+    """
+    if jobs != 1:
+        questionPool = None
+
+    # biggest papers first so a long one doesn't start last and leave the other workers idle
+    inputs = sorted(inputs, key=lambda p: os.path.getsize(p) if os.path.exists(p) else 0, reverse=True)
+    root = input_root(inputs)
+    outputPaths = [output_path_for(p, outputDir, root) for p in inputs]
+    # two workers writing one file would both report success and lose an exam, so refuse before any starts
+    claimed = {}
+    for p, outputPath in zip(inputs, outputPaths):
+        key = os.path.normcase(os.path.abspath(outputPath))
+        if key in claimed:
+            raise OutputCollision(f"{claimed[key]} and {p} would both be written to {outputPath}")
+        claimed[key] = p
+    jobsList = []
+    for p, outputPath in zip(inputs, outputPaths):
+        if outputDir:
+            os.makedirs(os.path.dirname(outputPath), exist_ok=True)
+        examIndex = None if indexPath is None else (indexPath or index_path_for(outputPath))
+        jobsList.append((p, outputPath, title, subject, cachePath, cacheBytes, questionPool, budgetSeconds, examIndex, stream,
+                         assetStore, fixMath, fixMemo, fixProfile))
+
+    start = time.perf_counter()
+    results = []
+    if jobs == 1:
+        if logLevel is not None:
+            enable_event_logging(logLevel)
+        try:
+            results = [_convert_job(job) for job in jobsList]
+        finally:
+            close_question_executors()
+            close_indexes()
+            close_asset_stores()
+    else:
+        initializer, initargs = (enable_event_logging, (logLevel,)) if logLevel is not None else (None, ())
+        with ProcessPoolExecutor(max_workers=jobs, max_tasks_per_child=maxTasksPerChild,
+                                 initializer=initializer, initargs=initargs) as pool:
+            futures = {pool.submit(_convert_job, job): job for job in jobsList}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    results.append(future.result())
+                except Exception as e:  # worker died (e.g. BrokenProcessPool)
+                    results.append({
+                        "input": job[0],
+                        "output": job[1],
+                        "ok": False,
+                        "error": f"{type(e).__name__}: {e}",
+                        "seconds": None,
+                    })
+
+    results.sort(key=lambda r: r["input"])
+    succeeded = [r for r in results if r["ok"]]
+    summary = {
+        "total": len(results),
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "wall_seconds": round(time.perf_counter() - start, 4),
+        "cpu_seconds": round(sum(r["seconds"] or 0 for r in results), 4),
+    }
+    if budgetSeconds is not None:
+        summary["budget_exceeded"] = [r["input"] for r in results if r.get("budget_exceeded")]
+    if cachePath:
+        summary["cache_hits"] = sum(r.get("cache_hits", 0) for r in results)
+        summary["cache_misses"] = sum(r.get("cache_misses", 0) for r in results)
+    if assetStore:
+        summary["assets_manifest"] = AssetStore(*assetStore).write_manifest(
+            record for r in results for record in r.get("assets", []))
+        summary["assets_copied"] = sum(r.get("assets_copied", 0) for r in results)
+        summary["assets_reused"] = sum(r.get("assets_reused", 0) for r in results)
+        summary["assets_missing"] = sum(len(r.get("assets_missing", [])) for r in results)
+    if fixMath or fixMemo or fixProfile:
+        summary["fix_hits"] = sum(r.get("fix_hits", 0) for r in results)
+        summary["fix_misses"] = sum(r.get("fix_misses", 0) for r in results)
+    if fixProfile:
+        profiler = RuleProfiler()
+        for r in results:
+            profiler.merge(r.get("fix_profile", {}))
+        summary["fix_profile"] = profiler.as_dict()
+    summary["results"] = results
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Convert OCR'd exam markdown files to LaTeX.")
+    parser.add_argument("inputs", nargs="+", help="Input .md files, glob patterns or exam directories")
+    parser.add_argument("-o", "--output-dir", default=None,
+                        help="Directory for the .tex files (default: next to each input)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of worker processes (1 = convert in this process)")
+    parser.add_argument("--max-tasks-per-child", type=int, default=50,
+                        help="Recycle each worker process after this many exams")
+    parser.add_argument("--summary", default=None,
+                        help="Where to write the JSON summary (default: conversion_summary.json in the output dir)")
+    parser.add_argument("--title", default="Mathematics Exam")
+    parser.add_argument("--subject", default="Mathematics")
+    parser.add_argument("--log-level", default=None, choices=["DEBUG", "INFO", "WARNING"],
+                        help="Log handler decisions and stage timings at this level (default: off)")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep converting a single exam whenever it changes, re-rendering only edited questions")
+    parser.add_argument("--watch-interval", type=float, default=0.2,
+                        help="Seconds between checks of the watched file")
+    parser.add_argument("--cache", default=None, metavar="PATH",
+                        help="SQLite file caching converted questions between runs (default: no cache)")
+    parser.add_argument("--cache-size-mb", type=int, default=256,
+                        help="Evict the least recently used cached questions beyond this size")
+    parser.add_argument("--question-workers", type=int, default=0,
+                        help="Also convert the questions inside each exam on this many workers (default: serial)")
+    parser.add_argument("--question-executor", default="process", choices=["thread", "process"],
+                        help="Pool used by --question-workers")
+    parser.add_argument("--chunksize", type=int, default=16,
+                        help="Questions sent to a question worker at a time (process pools only)")
+    parser.add_argument("--budget", type=float, default=None, metavar="SECONDS",
+                        help="Time allowed per exam; what is left past it is rendered verbatim (default: no limit)")
+    parser.add_argument("--index", nargs="?", const="", default=None, metavar="PATH",
+                        help="Index every question (number, points, source and output offsets) in this SQLite "
+                             "bank; without PATH, an .index.db is written next to each .tex (default: off)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Convert each exam a section at a time from a memory map instead of reading it "
+                             "whole; for bank files that don't fit in memory")
+    parser.add_argument("--assets", default=None, metavar="DIR",
+                        help="Copy every referenced image once into this content-addressed directory, point the "
+                             "LaTeX at it and write DIR/manifest.json (default: keep the OCR paths)")
+    parser.add_argument("--asset-workers", type=int, default=8,
+                        help="Threads hashing and copying the images of an exam")
+    parser.add_argument("--asset-mode", default="copy", choices=["copy", "hardlink", "symlink"],
+                        help="How an image gets into --assets")
+    parser.add_argument("--image-width", type=float, default=SizePolicy().width, metavar="FRACTION",
+                        help="Width of a figure in --assets, as a fraction of the text width")
+    parser.add_argument("--image-max-height", type=float, default=SizePolicy().maxHeight, metavar="FRACTION",
+                        help="Figures that would be taller than this fraction of the text height are "
+                             "sized by height instead")
+    parser.add_argument("--fix-math", action="store_true",
+                        help="Run the LatexMathFixer rules on each question before it is written (default: off)")
+    parser.add_argument("--fix-memo", action="store_true",
+                        help="With --fix-math (implied), remember the questions and formulas already fixed by "
+                             "each worker; faster only when a batch repeats them (default: off)")
+    parser.add_argument("--fix-profile", default=None, metavar="PATH",
+                        help="With --fix-math (implied), time every fixer rule across the batch, print a table "
+                             "sorted by time and write the totals to PATH as JSON")
+    return parser.parse_args(argv)
+
+
+# what --watch uses of the options; any other one set is refused rather than silently ignored
+WATCH_OPTIONS = {"inputs", "output_dir", "title", "subject", "watch", "watch_interval", "cache", "cache_size_mb"}
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    inputs = expand_inputs(args.inputs)
+    if not inputs:
+        print("No input files found.")
+        return 2
+
+    if args.watch:
+        if len(inputs) != 1:
+            print("--watch takes exactly one exam file.")
+            return 2
+        defaults = vars(parse_args(args.inputs[:1]))
+        unused = ["--" + name.replace("_", "-") for name, value in vars(args).items()
+                  if name not in WATCH_OPTIONS and value != defaults[name]]
+        if unused:
+            print(f"--watch doesn't use {', '.join(unused)}.")
+            return 2
+        from examWatcher import watch_exam  # imports this module, so only when needed
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+        cache = open_cache(args.cache, args.cache_size_mb * 1024 * 1024) if args.cache else None
+        watch_exam(inputs[0], output_path_for(inputs[0], args.output_dir), args.title, args.subject,
+                   interval=args.watch_interval, cache=cache)
+        if cache:
+            cache.close()
+        return 0
+
+    try:
+        summary = run_batch(
+            inputs,
+            outputDir=args.output_dir,
+            jobs=args.jobs,
+            maxTasksPerChild=args.max_tasks_per_child,
+            title=args.title,
+            subject=args.subject,
+            logLevel=getattr(logging, args.log_level) if args.log_level else None,
+            cachePath=args.cache,
+            cacheBytes=args.cache_size_mb * 1024 * 1024,
+            questionPool=(args.question_executor, args.question_workers, args.chunksize) if args.question_workers else None,
+            budgetSeconds=args.budget,
+            indexPath=args.index,
+            stream=args.stream,
+            assetStore=(args.assets, args.asset_workers, args.asset_mode,
+                        SizePolicy(args.image_width, args.image_max_height)) if args.assets else None,
+            fixMath=args.fix_math,
+            fixMemo=args.fix_memo,
+            fixProfile=bool(args.fix_profile),
+        )
+    except OutputCollision as e:
+        print(e)
+        return 2
+
+    summaryPath = args.summary or os.path.join(args.output_dir or ".", "conversion_summary.json")
+    with open(summaryPath, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    for r in summary["results"]:
+        if not r["ok"]:
+            print(f"FAILED {r['input']}: {r['error']}")
+    for path in summary.get("budget_exceeded", []):
+        print(f"OVER BUDGET {path}: rendered partly verbatim")
+    print(f"Converted {summary['succeeded']}/{summary['total']} exams "
+          f"in {summary['wall_seconds']}s (summary: {summaryPath})")
+    if args.cache:
+        print(f"Question cache: {summary['cache_hits']} hits, {summary['cache_misses']} misses")
+    if args.assets:
+        print(f"Images: {summary['assets_copied']} stored, {summary['assets_reused']} already there, "
+              f"{summary['assets_missing']} missing (manifest: {summary['assets_manifest']})")
+    if args.fix_profile:
+        profiler = RuleProfiler().merge(summary["fix_profile"])
+        print(profiler.table())
+        print(f"Fixer profile: {profiler.write_json(args.fix_profile)}")
+    if args.fix_memo:
+        print(f"Math fixer: {summary['fix_hits']} fragments remembered, {summary['fix_misses']} fixed")
+    elif args.fix_math or args.fix_profile:
+        print(f"Math fixer: {summary['fix_misses']} fragments fixed")
+    return 0 if summary["failed"] == 0 else 1
 
- 
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+"""
+Question-bank index written alongside a conversion.
+
+One row per question: the exam and section it is in, its printed number and
+points, where it sits in the source (byte offsets, and the line) and where its
+LaTeX sits in the .tex (byte offsets). A tool can then pull "question 18 of
+exam X" or "every 选择题 worth 5 points" straight out of the files, through the
+indexes on (exam, number) and (section type, points), without running
+examPartitioning over the paper again.
+
+    python questionIndex.py bank.db --exam exam.md --number 18
+    python questionIndex.py bank.db --type 选择题 --points 5
+
+The converter doesn't keep its Exam/Section objects, so the index is filled
+while the LaTeX streams out: the section iterators register each question
+just before yielding its fragment, and ExamIndexer.track(), wrapped around the
+fragment stream, counts the bytes written and gives the question its output
+offsets. Source offsets point into the text that was partitioned; when the
+html pre-pass changed nothing that is the file itself (sourceIsFile), and
+read_source() can seek straight to the question. A --stream conversion
+partitions the file a section at a time, each with its own pre-pass; its
+offsets are into the file with every section replaced by its pre-passed text,
+which is again the file itself when no section changed.
+"""
+import argparse
+import os
+import sqlite3
+import time
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+from conversionCache import CONVERTER_VERSION
+from questionTypeHandler.examTokenizer import SourceMap
+from questionTypeHandler.patternRegistry import PATTERNS
+
+# write_latex opens its file in text mode, so every \n goes out as os.linesep
+_NEWLINE_EXTRA = len(os.linesep) - 1
+
+# exams.sourceIsFile: what the source offsets point into
+SOURCE_PREPASSED, SOURCE_FILE, SOURCE_STREAMED = 0, 1, 2
+
+
+class QuestionRecord(NamedTuple):
+    exam: str            # the exam file, absolute
+    output: str          # the .tex it was converted to
+    position: int        # 1-based order of the question in the exam
+    section: str         # section numeral as written (一, 二, ...)
+    sectionType: str     # 选择题 / 填空题 / 解答题
+    number: Optional[int]  # printed question number, when it has one
+    points: int          # the question's own (12分), else the section's 每小题5分, else 0
+    sourceStart: int     # byte offsets into the source text
+    sourceEnd: int
+    line: int            # 1-based line of sourceStart
+    outputStart: int     # byte offsets into the .tex
+    outputEnd: int
+    verbatim: bool       # ran out of time budget and went out verbatim
+
+
+def index_path_for(outputPath: str) -> str:
+    """The index written next to a .tex when no shared bank is given."""
+    return os.path.splitext(outputPath)[0] + ".index.db"
+
+
+def encoded_size(fragment: str) -> int:
+    return len(fragment.encode("utf-8")) + fragment.count("\n") * _NEWLINE_EXTRA
+
+
+def section_points(section) -> int:
+    """Points per question from a header like "本题共8小题，每小题5分"; 0 when it doesn't say."""
+    match = PATTERNS["section.pointsEach"].search(section.Source, *section.HeaderSpan)
+    return int(match.group(1)) if match else 0
+
+
+class ExamIndexer:
+    """Collects the questions of one conversion; the index gets them once the last fragment is out."""
+
+    def __init__(self, index: "QuestionIndex", filePath: str, outputPath: str):
+        self.index = index
+        self.filePath = filePath
+        self.outputPath = outputPath
+        self.source: Optional[str] = None
+        self.rows: List[list] = []
+        self._pending: Optional[list] = None
+        self._sectionPoints = {}
+        # running char -> byte conversion; questions come in source order
+        self._char = 0
+        self._byte = 0
+        self._map: Optional[SourceMap] = None
+        # streamed sections each bring their own Source (see _next_source)
+        self.streamed = False
+        self.exact = True
+
+    def _bytes_at(self, offset: int) -> int:
+        self._byte += len(self.source[self._char:offset].encode("utf-8"))
+        self._char = offset
+        return self._byte
+
+    def _next_source(self, section) -> None:
+        origin = section.Origin
+        if origin is None:
+            self.source = section.Source
+            self._map = SourceMap(self.source)
+            return
+        # a streamed section: its text stands in for bytes origin.start:origin.end of the file
+        self.streamed = True
+        # (a section with no questions never gets here, but the shift shows if it changed)
+        self.exact = self.exact and origin.exact and origin.shifted == origin.start
+        self.source = section.Source
+        self._char, self._byte = 0, origin.shifted
+        self._map = SourceMap(self.source, firstLine=origin.line)
+
+    def question(self, section, span, question=None, verbatim: bool = False) -> None:
+        """Register the question whose fragment is yielded next."""
+        if section.Source is not self.source:
+            self._next_source(section)
+        points = question.Points if question is not None else 0
+        if not points:
+            points = self._sectionPoints.get(section.Span)
+            if points is None:
+                points = self._sectionPoints[section.Span] = section_points(section)
+        # from the first piece to the last: the blanks around are left out, a page footer
+        # the question runs over is not (the text handed to the handler skips it)
+        first, last = (span.pieces[0][0], span.pieces[-1][1]) if span.pieces else (span.start, span.end)
+        # the number is read where the span starts: that is its QUESTION_NUMBER token even
+        # when the pieces leave it out (a 填空题 is handed over without its "13.")
+        number = PATTERNS["index.questionNumber"].match(self.source, span.start, span.end)
+        start = self._bytes_at(first)
+        # the typed sections carry a SectionType, the plain ones the header's string
+        sectionType = getattr(section.Type, "value", section.Type)
+        self._pending = [
+            len(self.rows) + 1, section.Number, sectionType, int(number.group(1)) if number else None,
+            points, start, self._bytes_at(last), self._map.locate(first)[0], 0, 0, int(verbatim),
+        ]
+
+    def track(self, fragments: Iterable[str]) -> Iterator[str]:
+        """Pass the fragments through, noting where each registered question lands in the output."""
+        position = 0
+        for fragment in fragments:
+            size = encoded_size(fragment)
+            if self._pending is not None:
+                self._pending[8:10] = [position, position + size]
+                self.rows.append(self._pending)
+                self._pending = None
+            position += size
+            yield fragment
+        self.index.store(self)
+
+
+def load_prepassed(filePath: str) -> bytes:
+    from main import load_exam_text
+    return load_exam_text(filePath).encode("utf-8")
+
+
+def stream_prepassed(filePath: str) -> bytes:
+    """The file with each section swapped for its own pre-pass, the way --stream saw it."""
+    from questionTypeHandler.sectionsHandler import examPartitioning
+    parts, done = [], 0
+    with open(filePath, "rb") as f:
+        raw = f.read()
+    for section in examPartitioning(filePath).iterSections():
+        origin = section.Origin
+        if origin.start >= done:
+            parts += [raw[done:origin.start], section.Source.encode("utf-8")]
+            done = origin.end
+    parts.append(raw[done:])
+    return b"".join(parts)
+
+
+class QuestionIndex:
+    """
+    SQLite question index; one file can hold a single exam or a whole bank.
+
+    Args:
+        path: The index file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._prepassed = (None, b"")
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS exams ("
+            " id INTEGER PRIMARY KEY, file TEXT UNIQUE NOT NULL, output TEXT NOT NULL, version TEXT NOT NULL,"
+            " size INTEGER, mtime INTEGER, sourceIsFile INTEGER NOT NULL, indexed REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS questions ("
+            " exam INTEGER NOT NULL, position INTEGER NOT NULL, section TEXT, sectionType TEXT,"
+            " number INTEGER, points INTEGER NOT NULL, sourceStart INTEGER NOT NULL, sourceEnd INTEGER NOT NULL,"
+            " line INTEGER NOT NULL, outputStart INTEGER NOT NULL, outputEnd INTEGER NOT NULL,"
+            " verbatim INTEGER NOT NULL, PRIMARY KEY (exam, position))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS questions_number ON questions(exam, number)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS questions_type_points ON questions(sectionType, points)")
+        self._db.commit()
+
+    def exam(self, filePath: str, outputPath: str) -> ExamIndexer:
+        return ExamIndexer(self, filePath, outputPath)
+
+    # -------------------------
+    # writing
+    # -------------------------
+    def store(self, indexer: ExamIndexer) -> None:
+        """Replace whatever was indexed for the exam with this conversion."""
+        filePath = os.path.abspath(indexer.filePath)
+        stat = os.stat(filePath)
+        if indexer.streamed:
+            sourceIsFile = SOURCE_FILE if indexer.exact else SOURCE_STREAMED
+        elif indexer.source is None:
+            sourceIsFile = SOURCE_FILE
+        else:
+            with open(filePath, "rb") as f:
+                sourceIsFile = SOURCE_FILE if indexer.source.encode("utf-8") == f.read() else SOURCE_PREPASSED
+        with self._db:
+            self._db.execute(
+                "INSERT INTO exams (file, output, version, size, mtime, sourceIsFile, indexed)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(file) DO UPDATE SET output = excluded.output,"
+                " version = excluded.version, size = excluded.size, mtime = excluded.mtime,"
+                " sourceIsFile = excluded.sourceIsFile, indexed = excluded.indexed",
+                (filePath, os.path.abspath(indexer.outputPath), CONVERTER_VERSION, stat.st_size,
+                 stat.st_mtime_ns, sourceIsFile, time.time()),
+            )
+            examId = self._db.execute("SELECT id FROM exams WHERE file = ?", (filePath,)).fetchone()[0]
+            self._db.execute("DELETE FROM questions WHERE exam = ?", (examId,))
+            self._db.executemany(
+                "INSERT INTO questions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ([examId] + row for row in indexer.rows),
+            )
+
+    # -------------------------
+    # lookups
+    # -------------------------
+    _SELECT = (
+        "SELECT e.file, e.output, q.position, q.section, q.sectionType, q.number, q.points,"
+        " q.sourceStart, q.sourceEnd, q.line, q.outputStart, q.outputEnd, q.verbatim"
+        " FROM questions q JOIN exams e ON e.id = q.exam"
+    )
+
+    def _records(self, where: str, args: tuple) -> List[QuestionRecord]:
+        rows = self._db.execute(f"{self._SELECT} WHERE {where} ORDER BY e.file, q.position", args)
+        return [QuestionRecord(*row[:-1], bool(row[-1])) for row in rows]
+
+    def question(self, filePath: str, number: int) -> Optional[QuestionRecord]:
+        """The question printed as `number` in an exam (the first, if a paper repeats a number)."""
+        records = self._records("e.file = ? AND q.number = ?", (os.path.abspath(filePath), number))
+        return records[0] if records else None
+
+    def find(self, sectionType: Optional[str] = None, points: Optional[int] = None,
+             filePath: Optional[str] = None) -> List[QuestionRecord]:
+        """Every indexed question matching all the given filters."""
+        clauses, args = ["1"], []
+        for clause, value in (("q.sectionType = ?", sectionType), ("q.points = ?", points),
+                              ("e.file = ?", os.path.abspath(filePath) if filePath else None)):
+            if value is not None:
+                clauses.append(clause)
+                args.append(value)
+        return self._records(" AND ".join(clauses), tuple(args))
+
+    def read_output(self, record: QuestionRecord) -> str:
+        """The question's LaTeX, read from the .tex."""
+        with open(record.output, "rb") as f:
+            f.seek(record.outputStart)
+            return f.read(record.outputEnd - record.outputStart).decode("utf-8")
+
+    def read_source(self, record: QuestionRecord) -> str:
+        """The question's source text; errors if the exam changed since it was indexed."""
+        size, mtime, sourceIsFile = self._db.execute(
+            "SELECT size, mtime, sourceIsFile FROM exams WHERE file = ?", (record.exam,)).fetchone()
+        stat = os.stat(record.exam)
+        if (stat.st_size, stat.st_mtime_ns) != (size, mtime):
+            raise ValueError(f"{record.exam} changed since it was indexed; convert it again")
+        if sourceIsFile == SOURCE_FILE:
+            with open(record.exam, "rb") as f:
+                f.seek(record.sourceStart)
+                return f.read(record.sourceEnd - record.sourceStart).decode("utf-8")
+        # the offsets are into the text after the html pre-pass; redo that (not the partitioning),
+        # once per exam for a run of lookups
+        if self._prepassed[0] != (record.exam, mtime):
+            prepassed = stream_prepassed(record.exam) if sourceIsFile == SOURCE_STREAMED else load_prepassed(record.exam)
+            self._prepassed = ((record.exam, mtime), prepassed)
+        return self._prepassed[1][record.sourceStart:record.sourceEnd].decode("utf-8")
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Look questions up in a question index.")
+    parser.add_argument("index", help="Index file written by main.py --index")
+    parser.add_argument("--exam", default=None, help="Exam file the question comes from")
+    parser.add_argument("--number", type=int, default=None, help="Printed question number (needs --exam)")
+    parser.add_argument("--type", default=None, help="Section type, e.g. 选择题")
+    parser.add_argument("--points", type=int, default=None)
+    parser.add_argument("--source", action="store_true", help="Print the source text instead of the LaTeX")
+    args = parser.parse_args(argv)
+
+    index = QuestionIndex(args.index)
+    if args.number is not None:
+        if not args.exam:
+            parser.error("--number needs --exam")
+        record = index.question(args.exam, args.number)
+        records = [record] if record else []
+    else:
+        records = index.find(args.type, args.points, args.exam)
+    for record in records:
+        print(f"% {record.exam} #{record.position} ({record.sectionType}, {record.number}, {record.points}分)")
+        print(index.read_source(record) if args.source else index.read_output(record))
+    index.close()
+    return 0 if records else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,5 +1,6 @@
-import re
-from classes.myClasses import Question, EssayQuestion
+from classes.myClasses import EssayQuestion
+from questionTypeHandler.essayParser import parse_essay
+from eventHooks import HANDLER_SELECTED, SUBQUESTIONS_FOUND, emit, has_listeners
 
 example1 = r"""
 ### 18. (12分)
@@ -32,121 +33,63 @@ $$K^{2}=\frac{n(ad-bc)^{2}}{(a+b)(c+d)(a+c)(b+d)},\quad\frac{P(K^{2}\geq k)\quad
 
 """
 
+def with_points(question):
+    # the points were taken out of the text while parsing, put them back in front
+    return f"({question.Points}分) {question.Description}" if question.Points else question.Description
+
+
 class EssayQuestionHandler:
     def __init__(self, text):
         self.text = text
 
-    def eqHandler1(self):
-        """Handles subquestions like (1), (2) ..."""
-        pointsPattern = r'^(?:#+\s*\d+\.\s*)?\((\d+分)\)'
-        subQuestionPattern = r'(?:\(|（)(\d+)(?:\)|）)\s*(.*?)(?=(?:\(|（)\d+(?:\)|）)|$)'
-
-        subQuestions = re.findall(subQuestionPattern, self.text, flags=re.DOTALL)
-
-        # Extract clean subquestions
-        subQuestionsList = [sq[1].strip() for sq in subQuestions]
-
-        # Build Question objects with Description
-        subQuestionObjects = [Question(Description=sq) for sq in subQuestionsList]
-
-        # Remove subquestions from main description
-        questionDescription = re.sub(pointsPattern, '', self.text, flags=re.MULTILINE).strip()
-        questionDescription = re.sub(subQuestionPattern, '', questionDescription, flags=re.DOTALL).strip()
-
-        print("Main question found:", questionDescription.strip().replace('\n', ' '))
-        print("SubQuestions found:", subQuestionsList)
-
-        return EssayQuestion(
-            Description=questionDescription,
-            subQuestions=subQuestionObjects
-        )
-
-    def eqHandler2(self):
-        """Handles subquestions with nested (i), (ii) ..."""
-        # Pattern to match main subquestions like (1), (2), （1）, （2）
-        subQuestionPattern = r'(?:^\((\d+)\)|^（(\d+）))(.*?)(?=^\(\d+\)|^（\d+）|$)'
-        
-        # Find all main subquestions
-        subQuestions = re.findall(subQuestionPattern, self.text, flags=re.MULTILINE | re.DOTALL)
-
-        # Extract main description (text before first subquestion)
-        first_subq_match = re.search(r'^\((\d+)\)|^（(\d+）)', self.text, flags=re.MULTILINE)
-        if first_subq_match:
-            mainDescription = self.text[:first_subq_match.start()].strip()
-        else:
-            mainDescription = self.text.strip()
-
-        # Pattern for sub-subquestions (i), (ii), (iii) or （i）, （ii）, （iii）
-        subsubPattern = r'^\s*[\(（]([ivxIVX]+)[\)）]\s*(.*?)(?=^\s*[\(（][ivxIVX]+[\)）]|$)'
-
-        listOfSubquestions = []
-        for subq_match in subQuestions:
-            # Get the text part (it's in the third capture group)
-            subq_text = subq_match[2].strip()
-            
-            # Check if this subquestion has sub-subquestions
-            subsubs = re.findall(subsubPattern, subq_text, flags=re.MULTILINE | re.DOTALL)
-            
-            if subsubs:
-                # Remove sub-subquestions from main subquestion text
-                subq_desc = re.sub(subsubPattern, '', subq_text, flags=re.MULTILINE | re.DOTALL).strip()
-                
-                # Create EssayQuestion with nested questions
-                subq_obj = EssayQuestion(Description=subq_desc)
-                subq_obj.SubQuestions = [Question(Description=s[1].strip()) for s in subsubs]
-                listOfSubquestions.append(subq_obj)
-            else:
-                # No nested questions, just create a simple Question object
-                listOfSubquestions.append(Question(Description=subq_text))
-
-        print("Main question found:", mainDescription)
-        print(f"Found {len(listOfSubquestions)} subquestions")
-        for idx, sq in enumerate(listOfSubquestions, 1):
-            print(f"  ({idx}) {sq.Description[:50]}...")
-            if isinstance(sq, EssayQuestion) and sq.SubQuestions:
-                print(f"      -> Has {len(sq.SubQuestions)} nested sub-questions")
-
-        return EssayQuestion(
-            Description=mainDescription,
-            subQuestions=listOfSubquestions
-        )
+    def eqHandler(self):
+        """Handles (1), (i), ① sub-questions, nested to any depth, in one scan"""
+        question = parse_essay(self.text)
+
+        if has_listeners():
+            subQuestions = question.SubQuestions or []
+            emit(
+                SUBQUESTIONS_FOUND,
+                handler="eqHandler",
+                question=question.Description,
+                subQuestions=[sq.Description for sq in subQuestions],
+                nested=[len(sq.SubQuestions or ()) for sq in subQuestions],
+            )
+
+        return question
 
     def identify_handler(self):
-        """Auto-detect which handler to use"""
-        subSubQuestionIndexPattern = r'^\s*[\(（][ivxIVX]+[\)）]'
-        if re.search(subSubQuestionIndexPattern, self.text, flags=re.MULTILINE):
-            return self.eqHandler2
-        else:
-            return self.eqHandler1
+        """One parser covers every layout; kept so the callers look the same as for mc"""
+        emit(HANDLER_SELECTED, handler="eqHandler", reason="recursive descent")
+        return self.eqHandler
 
     def eqWrapper(self, question: EssayQuestion):
         """
         Wrap an EssayQuestion into [description, LaTeX enumerate string]
         """
-        latexLines = ["\\begin{enumerate}"]
-
-        for subq in question.SubQuestions:
-            # Add main subquestion
-            questionDesc = subq.Description
-            latexLines.append(f"    \\item {questionDesc}")
-
-            # Add nested subsubquestions if they exist
-            if isinstance(subq, EssayQuestion) and subq.SubQuestions:
-                latexLines.append("    \\begin{enumerate}")
-                for ss in subq.SubQuestions:
-                    latexLines.append(f"        \\item {ss.Description}")
-                latexLines.append("    \\end{enumerate}")
-
-        latexLines.append("\\end{enumerate}")
-
-        latexStr = "\n".join(latexLines)
-        return [question.Description, latexStr]
+        return [with_points(question), self.enumerateLatex(question.SubQuestions)]
+
+    @classmethod
+    def enumerateLatex(cls, questions, indent=""):
+        """Nested enumerate for a list of sub-questions; empty when there are none"""
+        if not questions:
+            return ""
+        latexLines = [f"{indent}\\begin{{enumerate}}"]
+        for subq in questions:
+            latexLines.append(f"{indent}    \\item {with_points(subq)}")
+            if subq.SubQuestions:
+                latexLines.append(cls.enumerateLatex(subq.SubQuestions, indent + "    "))
+        latexLines.append(f"{indent}\\end{{enumerate}}")
+        return "\n".join(latexLines)
 
     @staticmethod
     def tester():
         """Test the handler identification and execution"""
         examples = [example1, example2]
-        expected = ['eqHandler1', 'eqHandler2']
+        expected = [1, 2]  # levels of sub-questions
+
+        def depth(question):
+            return 1 + max((depth(q) for q in question.SubQuestions), default=0) if question.SubQuestions else 0
 
         for i, example in enumerate(examples, 1):
             print(f"\n{'='*60}")
@@ -168,16 +111,16 @@ class EssayQuestionHandler:
                     wrapped = testHandlerObject.eqWrapper(result_obj)
                     print(f"\nMain Description:\n{wrapped[0]}")
                     print(f"\nLaTeX Output:\n{wrapped[1]}")
+
+                    if depth(result_obj) == expected[i - 1]:
+                        print(f"\n✓ {expected[i - 1]} level(s) of sub-questions")
+                    else:
+                        print(f"\n✗ Expected {expected[i - 1]} level(s), got {depth(result_obj)}")
                     
                 except Exception as e:
                     print(f"\n✗ Handler execution failed: {e}")
                     import traceback
                     traceback.print_exc()
-            
-            if handler_name == expected[i - 1]:
-                print(f"\n✓ Correct handler identified")
-            else:
-                print(f"\n✗ Expected {expected[i - 1]}, got {handler_name}")
 
 
 testExample= r"""
@@ -0,0 +1,192 @@
+import re
+from typing import Iterator, List, Optional, Tuple
+
+from classes.myClasses import EssayQuestion
+
+# One regex pass finds every marker, with the "(12分)" right after it. Each match is the text up to
+# the next marker, then the marker: findall's (skipped text, marker, ...) strings tile the text, so
+# they give every position back without a match object. The text is a run of plain text, then any
+# number of turns of one of the alternatives below and the plain text after it, all possessive, so
+# the regex takes one turn per formula or bracket and never rescans.
+
+# anything but a $, a bracket or a circled number
+_PLAIN = r'[^$(（①-⑳]*+'
+# inline math, closed on its own line: the (1) of a $f(1)$ is never a marker
+_INLINE_MATH = r'\$[^$\n]++\$'
+# display math, which may span lines but not a blank line
+_DISPLAY_MATH = r'\$\$(?:[^$\n]|\n(?![^\S\n]*\n))*\$\$'
+# a $ that closes nothing is text
+_STRAY_DOLLAR = r'\$'
+# a bracket glued to a latin letter or a digit is a call or a product (P(1), x(i)), not a marker
+_GLUED_BRACKET = r'(?<=[A-Za-z0-9_])[\(（]'
+# a bracket that opens no marker; a "(12分)" anywhere but right after a marker is text too
+_OTHER_BRACKET = r'[\(（](?!(?:\d+|[ivxIVX]+)[\)）])'
+# the marker: (1)/（1）, (i)/（i） or ①
+_MARKER = r'[\(（](?:(?P<arabic>\d+)|(?P<roman>[ivxIVX]+))[\)）]|(?P<circled>[①-⑳])'
+# the item's points, right after its marker
+_ITEM_POINTS = r'\s*[\(（](?P<points>\d+)分[\)）]'
+
+# any of them, when it is not a marker
+_NOT_A_MARKER = '(?:' + '|'.join((_INLINE_MATH, _DISPLAY_MATH, _STRAY_DOLLAR, _GLUED_BRACKET, _OTHER_BRACKET)) + ')'
+
+_TOKENS = re.compile(
+    f'({_PLAIN}(?:{_NOT_A_MARKER}{_PLAIN})*+)'
+    # then the marker and its points, or the end of the text
+    f'((?:{_MARKER})(?:{_ITEM_POINTS})?|\\Z)'
+)
+
+_QUESTION_NUMBER = re.compile(r'\s*(?:#+\s*)?(?:\d+|2V)\s*[\.、．](?!\d)')
+# the "(12分)" of the question itself, right after its number
+_QUESTION_POINTS = re.compile(r'\s*[\(（](\d+)分[\)）]')
+
+# the marker kinds, numbered by how deep they sit: (1) holds (i), (i) holds ①
+ARABIC, ROMAN, CIRCLED = 0, 1, 2
+
+_ROMAN = {numeral: value for value, numeral in enumerate(
+    ["i", "ii", "iii", "iv", "v", "vi", "vii", "viii", "ix", "x",
+     "xi", "xii", "xiii", "xiv", "xv", "xvi", "xvii", "xviii", "xix", "xx"], 1)}
+
+# (kind, value, start, end, at line start, points); plain tuples, one per marker. end is where
+# the item's text starts: past the marker, and past its "(5分)" when it has one
+Token = Tuple[int, int, int, int, bool, int]
+
+
+def _at_line_start(text: str, previous: int, start: int) -> bool:
+    """Whether the marker at start is first on its line; previous is where its match began."""
+    # the match starts right after the previous marker, so a marker is first on its line only
+    # when there's a newline in between and nothing but blanks after it; the character before
+    # it settles all but the indented ones
+    before = text[start - 1] if start else '\n'
+    if before == '\n':
+        return True
+    if not before.isspace():
+        return False
+    newline = text.rfind('\n', previous, start)
+    if newline != -1:
+        return not text[newline + 1:start].strip()
+    return previous == 0 and not text[:start].strip()
+
+
+def _iter_tokens(text: str, matches: List[Tuple[str, ...]]) -> Iterator[Token]:
+    """The tokens of the markers in _TOKENS.findall(text)."""
+    end = 0
+    for skipped, marker, arabic, roman, circled, points in matches:
+        previous, start = end, end + len(skipped)
+        end = start + len(marker)
+        if arabic:
+            kind, value = ARABIC, int(arabic)
+        elif roman:
+            value = _ROMAN.get(roman.lower())
+            if value is None:
+                continue
+            kind = ROMAN
+        elif circled:
+            kind, value = CIRCLED, ord(circled) - 0x245F
+        else:
+            return
+        yield kind, value, start, end, _at_line_start(text, previous, start), int(points) if points else 0
+
+
+def scan_essay(text: str) -> List[Token]:
+    """Sub-question markers outside math, with their points, in source order."""
+    return list(_iter_tokens(text, _TOKENS.findall(text)))
+
+
+class EssayParser:
+    """
+    One walk over the markers of one essay question.
+
+    Each marker kind is a level: (1)/（1） holds (i), which holds ①. The outermost
+    kind that opens an item anywhere in the question is the top level, so the
+    "①...②..." conditions of a stem stay in the stem when (1), (2) follow; a deeper
+    kind opens a level under the current item, to whatever depth the paper goes.
+    A marker at the start of a line always opens an item; one inside a line only
+    does when it is the next number of an open level, or the (1) of a new one, so
+    "利用（i）的结果" stays text. A "(5分)" right after a marker (or after the
+    question number) becomes that item's Points.
+
+    The walk goes over the regex matches as they come, so a marker costs a few
+    comparisons: where its line starts is only looked up when its number doesn't
+    settle it, and the other markers are only looked at again when something
+    other than a (1)/（1） could open the top level.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def parse(self) -> EssayQuestion:
+        text = self.text
+        number = _QUESTION_NUMBER.match(text)
+        start = number.end() if number else 0
+        points = _QUESTION_POINTS.match(text, start)
+        if points is not None:
+            points, start = int(points[1]), points.end()
+        # the open levels, outermost first: [kind, last number, items so far, where the current
+        # item's text starts, its points, where its text stops when a level opened under it]
+        root = [-1, 0, None, start, points or 0, None]
+        levels = [root]
+        depth = [None, None, None]  # where in levels the level of each kind is, while open
+        top = None
+        end = 0
+        matches = _TOKENS.findall(text)
+        for skipped, marker, arabic, roman, circled, points in matches:
+            # _iter_tokens inlined, without the line start most markers don't need
+            previous, start = end, end + len(skipped)
+            end = start + len(marker)
+            if arabic:
+                kind, value = ARABIC, int(arabic)
+            elif roman:
+                value = _ROMAN.get(roman.lower())
+                if value is None:
+                    continue
+                kind = ROMAN
+            elif circled:
+                kind, value = CIRCLED, ord(circled) - 0x245F
+            else:
+                break
+            d = depth[kind]
+            if d is not None:
+                # the next item of an open level: it ends the items of that level and below
+                level = levels[d]
+                if value != level[1] + 1 and not _at_line_start(text, previous, start):
+                    continue
+                children = self._close(levels, d, start, depth) if len(levels) > d + 1 else None
+                level[2].append(EssayQuestion(text[level[3]:start if level[5] is None else level[5]].strip(), children, level[4]))
+                level[1], level[3], level[4], level[5] = value, end, int(points) if points else 0, None
+            elif kind > levels[-1][0] and (value == 1 or _at_line_start(text, previous, start)):
+                if len(levels) == 1 and kind != ARABIC:
+                    # the top level is the outermost kind that opens an item anywhere
+                    if top is None:
+                        top = self._top(matches)
+                    if kind != top:
+                        continue
+                # a new level under the current item, whose text stops here
+                levels[-1][5] = start
+                depth[kind] = len(levels)
+                levels.append([kind, value, [], end, int(points) if points else 0, None])
+        children = self._close(levels, 0, len(text), depth)
+        return EssayQuestion(text[root[3]:len(text) if root[5] is None else root[5]].strip(), children, root[4])
+
+    def _top(self, matches) -> int:
+        """The outermost kind that opens an item anywhere; asked when a deeper one opens one first."""
+        top = CIRCLED
+        for kind, value, _, _, atLineStart, _ in _iter_tokens(self.text, matches):
+            if kind < top and (atLineStart or value == 1):
+                top = kind
+                if top == ARABIC:
+                    break
+        return top
+
+    def _close(self, levels, d, position, depth) -> Optional[List[EssayQuestion]]:
+        """Closes the levels under levels[d] at `position`; the items of the one right under it."""
+        children = None
+        while len(levels) > d + 1:
+            kind, _, items, start, points, stop = levels.pop()
+            items.append(EssayQuestion(self.text[start:position if stop is None else stop].strip(), children, points))
+            depth[kind] = None
+            children = items
+        return children
+
+
+def parse_essay(text: str) -> EssayQuestion:
+    return EssayParser(text).parse()
@@ -0,0 +1,400 @@
+import re
+from bisect import bisect_right
+from enum import Enum
+from typing import Callable, Iterator, List, NamedTuple, Optional, Tuple
+
+
+class TokenType(Enum):
+    SECTION_HEADER = "section_header"
+    QUESTION_NUMBER = "question_number"
+    OPTION_MARKER = "option_marker"
+    SUB_QUESTION = "sub_question"          # (1) / （1）
+    SUB_SUB_QUESTION = "sub_sub_question"  # (i) / （ii）
+    MATH = "math"                          # $...$ and $$...$$
+    HTML_DIV = "html_div"                  # <div ...> ... </div>, nesting aware
+    LATEX_TABLE = "latex_table"            # \begin{tabular} ... \end{tabular} from the html pre-pass
+    PAGE_FOOTER = "page_footer"            # 数学试题第2页（共4页）, --- page breaks
+
+
+class Token(NamedTuple):
+    type: TokenType
+    start: int   # offsets into the tokenized text, end exclusive
+    end: int
+    value: str   # numeral / question number / option letter / sub-question index; "" otherwise
+
+
+# Everything that decides structure is looked at once per line start ...
+_LINE_START = re.compile(
+    r'[ \t　]*(?:'
+    r'(?P<section>#+[ \t]*(?P<numeral>[一二三四五六七八九十]+)[、。])'
+    r'|(?P<question>(?:#+[ \t]*)?(?P<number>2V(?=\.)|\d+)[\.、．]?)'
+    r')'
+)
+# the section branch of _LINE_START on its own, for finding sections without a full tokenize
+_SECTION_LINE = re.compile(r'^[ \t　]*#+[ \t]*[一二三四五六七八九十]+[、。][^\n]*', re.MULTILINE)
+_FOOTER = re.compile(
+    r'[ \t　]*(?:-{3,}|\S{0,12}第\s*\d+\s*页\s*[（(]?\s*共\s*\d+\s*页\s*[)）]?)[ \t　]*$'
+)
+_BLANK = re.compile(r'[ \t　\r]*$')
+# ... and everything else in a single left-to-right search over the rest of the line.
+# Inline math is consumed as one match so markers inside $...$ never surface.
+_INLINE = re.compile(
+    r'(?P<display>\$\$)'
+    r'|(?P<math>\$[^$\n]+\$)'
+    r'|(?P<divopen><div\b[^>\n]*>)'
+    r'|(?P<divclose></div\s*>)'
+    r'|(?P<tabopen>\\begin\{tabular\})'
+    r'|(?P<tabclose>\\end\{tabular\})'
+    r'|(?P<option>[A-D][\.、．])'
+    r'|[\(（](?:(?P<subnum>\d+)|(?P<roman>[ivxIVX]+))[\)）]'
+)
+_DISPLAY_CLOSE = '$$'
+
+_NORMAL, _IN_MATH, _IN_DIV, _IN_TABLE = 0, 1, 2, 3
+
+# block containers: opening group -> (state, closing group, token type)
+_BLOCKS = {
+    'divopen': (_IN_DIV, 'divclose', TokenType.HTML_DIV),
+    'tabopen': (_IN_TABLE, 'tabclose', TokenType.LATEX_TABLE),
+}
+_BLOCK_CLOSERS = {close: (state, tokenType) for state, close, tokenType in _BLOCKS.values()}
+
+
+def iter_tokens(text: str) -> Iterator[Token]:
+    """
+    Walk the markdown once and yield the structural tokens in source order.
+
+    Multi-line $$...$$ blocks, <div>s and tabulars are containers: markers inside them are
+    held back and dropped when the container closes. An unclosed container (a
+    blank line inside display math, a new section header, end of text) is
+    treated as plain text and the held-back tokens are released, so stray OCR
+    delimiters never swallow the rest of the paper.
+    """
+    n = len(text)
+    state = _NORMAL
+    openStart = 0
+    blockDepth = 0
+    pending: List[Token] = []
+
+    pos = 0
+    while pos < n:
+        nl = text.find('\n', pos)
+        lineEnd = nl if nl != -1 else n
+
+        head = _LINE_START.match(text, pos, lineEnd)
+        if head and head.group('section'):
+            if state != _NORMAL:
+                yield from pending
+                pending = []
+                state = _NORMAL
+            yield Token(TokenType.SECTION_HEADER, head.start('section'), lineEnd, head.group('numeral'))
+            pos = lineEnd + 1
+            continue
+
+        if state == _IN_MATH and _BLANK.match(text, pos, lineEnd):
+            # math mode can't cross a paragraph break; the $$ was OCR noise
+            yield from pending
+            pending = []
+            state = _NORMAL
+
+        out = pending if state != _NORMAL else None
+
+        footer = _FOOTER.match(text, pos, lineEnd)
+        if footer:
+            token = Token(TokenType.PAGE_FOOTER, pos, lineEnd, "")
+            if out is None:
+                yield token
+            else:
+                out.append(token)
+            pos = lineEnd + 1
+            continue
+
+        cursor = pos
+        if head and head.group('question'):
+            token = Token(TokenType.QUESTION_NUMBER, head.start('question'), head.end('question'), head.group('number'))
+            if out is None:
+                yield token
+            else:
+                out.append(token)
+            cursor = head.end()
+
+        displayClose = -1  # next $$ on this line while in display math; lineEnd once there is none
+        while cursor < lineEnd:
+            if state == _IN_MATH:
+                # if the block doesn't close on this line, the rest of it is still scanned
+                # into `pending` in case the block turns out to be unclosed
+                if displayClose < cursor:
+                    displayClose = text.find(_DISPLAY_CLOSE, cursor, lineEnd)
+                    if displayClose == -1:
+                        displayClose = lineEnd
+                if displayClose < lineEnd:
+                    pending = []
+                    state = _NORMAL
+                    out = None
+                    cursor = displayClose + 2
+                    yield Token(TokenType.MATH, openStart, cursor, "")
+                    continue
+
+            m = _INLINE.search(text, cursor, lineEnd)
+            if not m:
+                break
+            cursor = m.end()
+            kind = m.lastgroup
+
+            if kind == 'display':
+                if state == _NORMAL:
+                    displayClose = text.find(_DISPLAY_CLOSE, cursor, lineEnd)
+                    if displayClose != -1:
+                        cursor = displayClose + 2
+                        yield Token(TokenType.MATH, m.start(), cursor, "")
+                    else:
+                        state, openStart, out = _IN_MATH, m.start(), pending
+                continue
+            if kind in _BLOCKS:
+                blockState = _BLOCKS[kind][0]
+                if state == _NORMAL:
+                    state, openStart, blockDepth, out = blockState, m.start(), 1, pending
+                elif state == blockState:
+                    blockDepth += 1
+                continue
+            if kind in _BLOCK_CLOSERS:
+                blockState, tokenType = _BLOCK_CLOSERS[kind]
+                if state == blockState:
+                    blockDepth -= 1
+                    if blockDepth == 0:
+                        pending = []
+                        state = _NORMAL
+                        out = None
+                        yield Token(tokenType, openStart, cursor, "")
+                continue
+
+            if kind == 'math':
+                token = Token(TokenType.MATH, m.start(), cursor, "")
+            elif kind == 'option':
+                token = Token(TokenType.OPTION_MARKER, m.start(), cursor, text[m.start()])
+            elif m.group('subnum') is not None:
+                token = Token(TokenType.SUB_QUESTION, m.start(), cursor, m.group('subnum'))
+            else:
+                token = Token(TokenType.SUB_SUB_QUESTION, m.start(), cursor, m.group('roman').lower())
+
+            if out is None:
+                yield token
+            else:
+                out.append(token)
+
+        pos = lineEnd + 1
+
+    # whatever is still open at the end of the text was never really a container
+    yield from pending
+
+
+def tokenize(text: str) -> List[Token]:
+    return list(iter_tokens(text))
+
+
+# -------------------------
+# Splitting helpers built on the token stream
+# -------------------------
+def is_section_title(text: str, token: Token) -> bool:
+    """Only headers naming a question type (…题 / …：) open a section; other numeral headers just close one."""
+    header = text[token.start:token.end]
+    return '题' in header or '：' in header
+
+
+def split_sections(text: str, tokens: List[Token]) -> List[Tuple[Token, int, int]]:
+    """Return (header token, body start, body end) for every section, in order."""
+    sections = []
+    headers = [t for t in tokens if t.type is TokenType.SECTION_HEADER]
+    for i, header in enumerate(headers):
+        if not is_section_title(text, header):
+            continue
+        bodyEnd = headers[i + 1].start if i + 1 < len(headers) else len(text)
+        sections.append((header, header.end, bodyEnd))
+    return sections
+
+
+def split_section_chunks(text: str) -> List[Tuple[int, int]]:
+    """
+    (start, end) of every section, header line included, found with one regex scan.
+
+    Headers always close any open container, so each chunk tokenizes exactly as it
+    would inside the whole paper; used to re-parse only the sections that changed.
+    """
+    headers = list(_SECTION_LINE.finditer(text))
+    chunks = []
+    for i, header in enumerate(headers):
+        line = header.group()
+        if '题' in line or '：' in line:
+            chunks.append((header.start(), headers[i + 1].start() if i + 1 < len(headers) else len(text)))
+    return chunks
+
+
+def _utf8_any(chars: str) -> bytes:
+    # a character class of non-ascii characters, spelt as alternatives of their utf-8 bytes
+    return b'(?:' + b'|'.join(re.escape(c.encode('utf-8')) for c in chars) + b')'
+
+
+# _SECTION_LINE for utf-8 bytes, so a memory-mapped file can be scanned without decoding it
+_SECTION_LINE_BYTES = re.compile(
+    rb'^(?:[ \t]|' + re.escape('　'.encode('utf-8')) + rb')*#+[ \t]*'
+    + _utf8_any('一二三四五六七八九十') + rb'+' + _utf8_any('、。') + rb'[^\n]*',
+    re.MULTILINE,
+)
+_TITLE_MARKS = ('题'.encode('utf-8'), '：'.encode('utf-8'))
+
+
+def iter_section_byte_chunks(buffer) -> Iterator[Tuple[int, int]]:
+    """
+    split_section_chunks over utf-8 bytes (a bytes object or an mmap), lazily:
+    (start, end) byte offsets of every section, header line included.
+    """
+    chunkStart = None
+    for header in _SECTION_LINE_BYTES.finditer(buffer):
+        if chunkStart is not None:
+            yield chunkStart, header.start()
+            chunkStart = None
+        line = header.group()
+        if any(mark in line for mark in _TITLE_MARKS):
+            chunkStart = header.start()
+    if chunkStart is not None:
+        yield chunkStart, len(buffer)
+
+
+def accepts_plain_number(text: str, token: Token) -> bool:
+    """Multiple choice / fill in blank: any question number that isn't a markdown heading."""
+    return text[token.start] != '#'
+
+
+def accepts_dotted_number(text: str, token: Token) -> bool:
+    """Essay questions: '18.' or '### 18.' — the dot is required, the heading marks are not."""
+    return text[token.end - 1] in '.．'
+
+
+class QuestionSpan(NamedTuple):
+    """
+    A question as offsets into the text it was cut from. `start`/`end` cover the whole
+    question as written; `pieces` are the (start, end) runs left once page footers are
+    cut out and the ends are stripped, and joined they give the question text.
+    """
+    start: int
+    end: int
+    pieces: Tuple[Tuple[int, int], ...]
+
+    def text(self, source: str) -> str:
+        if len(self.pieces) == 1:
+            start, end = self.pieces[0]
+            return source[start:end]
+        return ''.join(source[start:end] for start, end in self.pieces)
+
+
+def lstrip_pieces(source: str, pieces: List[Tuple[int, int]], chars: Optional[str] = None) -> List[Tuple[int, int]]:
+    """str.lstrip(chars) on the joined pieces, done on the offsets."""
+    while pieces:
+        start, end = pieces[0]
+        while start < end and (source[start].isspace() if chars is None else source[start] in chars):
+            start += 1
+        if start < end:
+            pieces[0] = (start, end)
+            break
+        pieces.pop(0)
+    return pieces
+
+
+def _strip_pieces(source: str, pieces: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    lstrip_pieces(source, pieces)
+    while pieces:
+        start, end = pieces[-1]
+        while end > start and source[end - 1].isspace():
+            end -= 1
+        if end > start:
+            pieces[-1] = (start, end)
+            break
+        pieces.pop()
+    return pieces
+
+
+def strip_span(source: str, start: int, end: int) -> Tuple[int, int]:
+    """The span of source[start:end].strip()."""
+    pieces = _strip_pieces(source, [(start, end)])
+    return pieces[0] if pieces else (start, start)
+
+
+def split_question_spans(
+    text: str,
+    tokens: List[Token],
+    accept: Callable[[str, Token], bool] = accepts_plain_number,
+    start: int = 0,
+    end: Optional[int] = None,
+    offset: int = 0,
+    keepNumber: bool = True,
+) -> List[QuestionSpan]:
+    """
+    Cut text[start:end] into questions at accepted QUESTION_NUMBER tokens, as offsets into text.
+
+    Token offsets are shifted by `offset` when the tokens came from a larger
+    document than `text`. Page-footer lines are cut out of the questions.
+    Text before the first question number is dropped, as the regex splitters did.
+    """
+    end = len(text) if end is None else end
+    local = [
+        Token(t.type, t.start - offset, t.end - offset, t.value) if offset else t
+        for t in tokens
+        if start <= t.start - offset < end
+    ]
+    starts = [t for t in local if t.type is TokenType.QUESTION_NUMBER and accept(text, t)]
+    footers = [t for t in local if t.type is TokenType.PAGE_FOOTER]
+
+    spans = []
+    f = 0
+    for i, q in enumerate(starts):
+        qEnd = starts[i + 1].start if i + 1 < len(starts) else end
+        cursor = q.start if keepNumber else q.end
+        pieces = []
+        while f < len(footers) and footers[f].start < qEnd:
+            footer = footers[f]
+            if footer.start >= cursor:
+                pieces.append((cursor, footer.start))
+                cursor = footer.end
+            f += 1
+        pieces.append((cursor, qEnd))
+        spans.append(QuestionSpan(q.start, qEnd, tuple(_strip_pieces(text, pieces))))
+    return spans
+
+
+def split_questions(
+    text: str,
+    tokens: List[Token],
+    accept: Callable[[str, Token], bool] = accepts_plain_number,
+    start: int = 0,
+    end: Optional[int] = None,
+    offset: int = 0,
+    keepNumber: bool = True,
+) -> List[str]:
+    """The question strings of split_question_spans."""
+    return [span.text(text) for span in split_question_spans(text, tokens, accept, start, end, offset, keepNumber)]
+
+
+class SourceMap:
+    """
+    Offsets into a text -> 1-based (line, column), for error messages.
+
+    The line index is only built on the first lookup. Offsets given by the parse
+    model point into the text that was partitioned, i.e. after the html pre-pass.
+    """
+
+    def __init__(self, text: str, name: str = "", firstLine: int = 1):
+        self.text = text
+        self.name = name
+        self.firstLine = firstLine  # line of text[0] in the file, when text is one section of it
+        self._lineStarts: Optional[List[int]] = None
+
+    def locate(self, offset: int) -> Tuple[int, int]:
+        if self._lineStarts is None:
+            self._lineStarts = [0]
+            self._lineStarts.extend(m.end() for m in re.finditer('\n', self.text))
+        line = bisect_right(self._lineStarts, offset)
+        return line + self.firstLine - 1, offset - self._lineStarts[line - 1] + 1
+
+    def describe(self, offset: int) -> str:
+        line, column = self.locate(offset)
+        return f"{self.name}:{line}:{column}" if self.name else f"line {line}, column {column}"
@@ -1,16 +1,17 @@
-import re
 from utilityFunctions import escape_latex
 from classes.myClasses import Question
+from questionTypeHandler.examTokenizer import accepts_plain_number, split_questions, tokenize
 
 class fillInBlankQuestionHandler:
     def __init__(self, text):
         self.text = text
-    def fibHandler(self):
-        # Pattern to capture fill-in-the-blank questions
-         questionPattern = r'(?:^|\n)(\d+)[\.、]?\s*([\s\S]*?)(?=\n\d+[\.、]|$)'
-         questions = re.findall(questionPattern, self.text, flags=re.MULTILINE)
-         questionsList = [Question(Description=q[1].strip().replace('\n', ' ')) for q in questions]
-         return questionsList
+    def fibHandler(self, blocks=None):
+        # blocks: the questions already cut by FillInBlankSection.questionsSeperator;
+        # when used on its own the handler scans its text once itself
+        if blocks is None:
+            blocks = split_questions(self.text, tokenize(self.text), accepts_plain_number, keepNumber=False)
+        questionsList = [Question(Description=q.replace('\n', ' ')) for q in blocks]
+        return questionsList
 
     # i want to keep it uniform acroos the other handlers, so this wrapper function will take a question 
     def fibWrapper(self, question:Question):
@@ -1,5 +1,10 @@
-import re
+from itertools import product
+from typing import FrozenSet, List, NamedTuple, Optional, Tuple
+
 from classes.myClasses import MultipleChoiceQuestion
+from questionTypeHandler.optionExtractor import extract_options
+from questionTypeHandler.patternRegistry import PATTERNS
+from eventHooks import HANDLER_SELECTED, OPTIONS_FOUND, emit, has_listeners
 
 # Test examples
 testExample = r"""
@@ -84,268 +89,155 @@ A.$f(0)=0$ B.$g(-\frac{1}{2})=0$ C.$f(-1)=f(4)$ D.$g(-1)=g(2)$
 
 """
 
+class QuestionFingerprint(NamedTuple):
+    """What identify_handler needs to know about a question, gathered in one scan."""
+    numberSuffix: str               # first line: "none" (no number), "dot" (1.), "end" (just 1), "other" (4南…)
+    optionLetters: FrozenSet[str]   # letters used as markers (A. / B、) anywhere
+    markerLines: int                # lines that start with a marker
+    inlineOptions: bool             # some line holds more than one marker
+    letterInStem: bool              # a bare A-D before the options (△ABC, 点D …)
+
+    @property
+    def key(self) -> Tuple[str, bool, bool, bool, bool]:
+        return (self.numberSuffix, len(self.optionLetters) == 4, self.markerLines >= 4,
+                self.inlineOptions, self.letterInStem)
+
+
+def fingerprint_text(text: str) -> QuestionFingerprint:
+    """
+    Fingerprint a stripped, non-empty question: one scan for the option markers,
+    then only the stem is searched for stray A-D.
+    """
+    number = PATTERNS["mc.number.suffix"].match(text)
+    if not number.group(1):
+        numberSuffix = "none"
+    elif not number.group(2):
+        numberSuffix = "end"
+    else:
+        numberSuffix = "dot" if number.group(2) == "." else "other"
+
+    letters = set()
+    markerLines = 0
+    inline = False
+    firstOptionLine = None
+    previousLine = -1
+    for m in PATTERNS["mc.marker"].finditer(text):
+        start = m.start()
+        letters.add(text[start])
+        lineStart = text.rfind("\n", 0, start) + 1
+        if lineStart == previousLine:
+            inline = True
+        previousLine = lineStart
+        if start == lineStart or text[lineStart:start].isspace():
+            markerLines += 1
+            if firstOptionLine is None:
+                firstOptionLine = lineStart
+
+    # the stem is every line before the first one that starts with a marker (and at least the first line)
+    firstLineEnd = text.find("\n")
+    if firstLineEnd == -1:
+        stemEnd = len(text)
+    else:
+        stemEnd = max(firstOptionLine if firstOptionLine is not None else len(text), firstLineEnd)
+
+    return QuestionFingerprint(
+        numberSuffix,
+        frozenset(letters),
+        markerLines,
+        inline,
+        PATTERNS["mc.letter.bare"].search(text, 0, stemEnd) is not None,
+    )
+
+
+def _select(key) -> Tuple[str, str]:
+    numberSuffix, allLetters, separateLines, inline, letterInStem = key
+    # Fix: Only select mchandler4 if number is NOT followed by a dot or digit (like "4南水北调")
+    if numberSuffix == "other":
+        return "mchandler4", "no dot after number"
+    if numberSuffix == "none":
+        return "mchandler5", "no number prefix"
+    if not allLetters:
+        return "mchandler6", "less than 4 unique option markers"
+    if separateLines:
+        return "mchandler", "options on separate lines"
+    if inline:
+        if letterInStem:
+            return "mchandler3", "inline options + A-D in question"
+        return "mchandler2", "clean inline options"
+    return "mchandler", "fallback"
+
+
+# every fingerprint key -> (handler name, reason), worked out once at import
+HANDLER_TABLE = {key: _select(key) for key in product(("none", "dot", "end", "other"), *[(False, True)] * 4)}
+
+
 class multipleChoiceQuestionHandler:
     def __init__(self, text):
         self.text = text
+        self._fingerprint = None
 
     def mchandler(self):
         """Handles questions with options on separate lines"""
-        OptionsPattern = r'^[A-D][\.、]?\s*(.+)$'
-        questionPattern = r'(^\d+\.)(.*?)(?=^[A-D][\.、])'
-        options = re.findall(OptionsPattern, self.text, flags=re.MULTILINE)
-        question_match = re.search(questionPattern, self.text, flags=re.MULTILINE | re.DOTALL)
+        options = PATTERNS["mc.options.separateLines"].findall(self.text)
+        question_match = PATTERNS["mc.question.beforeLineOptions"].search(self.text)
         question = question_match.group(2).strip() if question_match else ""
-        print("Options found:", options)
-        print("Question found:", question)
+        emit(OPTIONS_FOUND, handler="mchandler", question=question, options=options)
         return MultipleChoiceQuestion(
             Description=self.text,
             options=options,
             mainQuestion=question
         )
 
-    def mchandler2(self):
-        """Handles inline options with proper extraction"""
-        OptionsPattern = r'([A-D])[\.、]?\s*([^A-D]+?)(?=[A-D][\.、]|$)'
-        questionPattern = r'^\d+\.(.+?)(?=[A-D][\.、])'
-        Options = re.findall(OptionsPattern, self.text, flags=re.DOTALL)
-        question_match = re.search(questionPattern, self.text, flags=re.DOTALL)
-        question = question_match.group(1).strip() if question_match else ""
-        Options = [opt[1].strip() for opt in Options]
-        
-        # Clean Options
-        cleaned_Options = []
-        for opt in Options:
-            opt = opt.strip()
-            if opt and opt[-1] == '$' and opt[0] != '$':
-                opt = '$' + opt
-            cleaned_Options.append(opt)
-        
-        print("Options found:", cleaned_Options)
-        print("Question found:", question)
+    def _extracted(self, handlerName):
+        # every layout but separate lines goes through the same math-aware option scan
+        extracted = extract_options(self.text)
+        emit(OPTIONS_FOUND, handler=handlerName, question=extracted.stem, options=extracted.options)
         return MultipleChoiceQuestion(
             Description=self.text,
-            options=cleaned_Options,
-            mainQuestion=question
+            options=extracted.options,
+            mainQuestion=extracted.stem
         )
 
-    def mchandler3(self):
-        """Handles inline options on a single line"""
-        OptionsPattern = r'(?:^|\s)([A-D])[\.、]?\s*(.*?)(?=\s+[A-D][\.、]|$)'
-        questionPattern = r'^\d+\.(.+?)(?=\s+[A-D][\.、])'
-        Options = re.findall(OptionsPattern, self.text, flags=re.DOTALL)
-        question_match = re.search(questionPattern, self.text, flags=re.DOTALL)
-        question = question_match.group(1).strip() if question_match else ""
-        Options = [opt[1].strip() for opt in Options]
-
-        cleaned_Options = []
-        for opt in Options:
-            opt = opt.strip()
-            if opt and opt[-1] == '$' and opt[0] != '$':
-                opt = '$' + opt
-            cleaned_Options.append(opt)
-
-        print("Options found:", cleaned_Options)
-        print("Question found:", question)
-        return MultipleChoiceQuestion(
-            Description=self.text,
-            options=cleaned_Options,
-            mainQuestion=question
-        )
+    def mchandler2(self):
+        """Handles inline options with proper extraction"""
+        return self._extracted("mchandler2")
 
+    def mchandler3(self):
+        """Handles inline options on a single line, with A-D in the question itself"""
+        return self._extracted("mchandler3")
 
     def mchandler4(self):
         """Handles questions without period after number"""
-        OptionsPattern = r'([A-D])[\.、]?\s*([^A-D]+?)(?=[A-D][\.、]|$)'
-        questionPattern = r'^\d+\s*(.+?)(?=[A-D][\.、])'
-        Options = re.findall(OptionsPattern, self.text, flags=re.DOTALL)
-        Options = [opt[1].strip() for opt in Options]
-        question_match = re.search(questionPattern, self.text, flags=re.DOTALL)
-        question = question_match.group(1).strip() if question_match else ""
-        
-        cleaned_Options = []
-        for opt in Options:
-            opt = opt.strip()
-            if opt and opt[-1] == '$' and opt[0] != '$':
-                opt = '$' + opt
-            cleaned_Options.append(opt)
-        
-        print("Options found:", cleaned_Options)
-        print("Question found:", question)
-        return MultipleChoiceQuestion(
-            Description=self.text,
-            options=cleaned_Options,
-            mainQuestion=question
-        )
+        return self._extracted("mchandler4")
 
     def mchandler5(self):
         """Handles questions without number prefix"""
-        OptionsPattern = r'([A-D])[\.、]?\s*([^A-D]+?)(?=[A-D][\.、]|$)'
-        Options = re.findall(OptionsPattern, self.text, flags=re.DOTALL)
-        Options = [opt[1].strip() for opt in Options]
-        
-        questionPattern = r'[A-D][\.、]?\s*[^A-D]+'
-        question = re.sub(questionPattern, '', self.text, flags=re.DOTALL).strip()
-        
-        cleaned_Options = []
-        for opt in Options:
-            opt = opt.strip()
-            if opt and opt[-1] == '$' and opt[0] != '$':
-                opt = '$' + opt
-            cleaned_Options.append(opt)
-        
-        print("Options found:", cleaned_Options)
-        print("Question found:", question)
-        return MultipleChoiceQuestion(
-            Description=self.text,
-            options=cleaned_Options,
-            mainQuestion=question
-        )
+        return self._extracted("mchandler5")
 
     def mchandler6(self):
-        """Extract options line by line - collect A, B, C, then remaining becomes D"""
-        questionPattern = r'(^\d+\.)(.*?)(?=^[A-D][\.、]|$)'
-        question_match = re.search(questionPattern, self.text, flags=re.MULTILINE | re.DOTALL)
-        question = question_match.group(2).strip() if question_match else ""
-        options = []
-        lines = [line.strip() for line in self.text.split('\n') if line.strip()]
-
-        print(f"DEBUG: All lines: {lines}")  # Debug line
-
-        # Find where options start
-        option_start_idx = -1
-        for i, line in enumerate(lines):
-            if re.match(r'^[A-D][\.、]', line):
-                option_start_idx = i
-                break
-
-        if option_start_idx == -1:
-            return []  # No options found
-
-        print(f"DEBUG: Options start at line {option_start_idx}: {lines[option_start_idx]}")  # Debug line
-
-        # Process the option lines
-        option_lines = lines[option_start_idx:]
-
-        # First, split lines that contain multiple options (like "A. text B. text")
-        split_option_lines = []
-        for line in option_lines:
-            # Split line by A., B., C., D. markers
-            parts = re.split(r'([A-D][\.、])', line)
-            if len(parts) > 1:
-                # Reconstruct the split options
-                for i in range(1, len(parts), 2):
-                    option_marker = parts[i]  # A., B., etc.
-                    option_content = parts[i+1].strip() if i+1 < len(parts) else ""
-                    split_option_lines.append(f"{option_marker} {option_content}")
-            else:
-                split_option_lines.append(line)
-
-        print(f"DEBUG: Split option lines: {split_option_lines}")
-
-        # Simple approach: find A, B, C explicitly, then everything else is D
-        a_content = None
-        b_content = None
-        c_content = None
-        d_content = []
-
-        for line in split_option_lines:
-            if line.startswith('A.') or line.startswith('A、'):
-                a_content = line
-            elif line.startswith('B.') or line.startswith('B、'):
-                b_content = line
-            elif line.startswith('C.') or line.startswith('C、'):
-                c_content = line
-            else:
-                # This line doesn't start with A, B, or C - it's part of D
-                d_content.append(line)
-
-        # Build options array
-        if a_content:
-            options.append(a_content)
-        if b_content:
-            options.append(b_content)
-        if c_content:
-            options.append(c_content)
-
-        # For D: combine all the remaining lines
-        if d_content:
-            d_option = "D. " + " ".join(d_content)
-            options.append(d_option)
-
-        print(f"DEBUG: Final options: {options}")  # Debug line
-        return MultipleChoiceQuestion(
-            Description=self.text,
-            mainQuestion=question,
-            options=options
-        )
+        """Handles questions with fewer than four markers; the lines after C become D"""
+        return self._extracted("mchandler6")
+
 
+    def fingerprint(self) -> Optional[QuestionFingerprint]:
+        if self._fingerprint is None:
+            text = self.text.strip()
+            if text:
+                self._fingerprint = fingerprint_text(text)
+        return self._fingerprint
 
     def identify_handler(self):
         """Identifies which handler to use based on question format"""
         self.text = self.text.strip()
-        lines = [line.strip() for line in self.text.split('\n') if line.strip()]
-
-        if not lines:
+        self._fingerprint = None
+        fingerprint = self.fingerprint()
+        if fingerprint is None:
             return None
 
-        question_line = lines[0]
-
-        # Fix: Only select mchandler4 if number is NOT followed by a dot or digit (like "4南水北调")
-        match = re.match(r'^(\d+)[^\.\d]', question_line)
-        if match:
-            print("DEBUG: Selected handler = mchandler4 (no dot after number)")
-            return self.mchandler4
-
-        # Check if question has no number prefix
-        if not re.match(r'^\d+', question_line):
-            print("DEBUG: Selected handler = mchandler5 (no number prefix)")
-            return self.mchandler5
-
-        # Count unique option letters (A-D)
-        option_letters = set(re.findall(r'[A-D](?=[\.、])', self.text))
-        if len(option_letters) < 4:
-            print("DEBUG: Selected handler = mchandler6 (less than 4 unique option markers)")
-            return self.mchandler6
-
-        # Find where options start
-        Options_start = None
-        for i, line in enumerate(lines):
-            if re.search(r'^[A-D][\.、]', line):
-                Options_start = i
-                break
-
-        if Options_start is None:
-            Options_start = len(lines)
-
-        # Check if options are on separate lines
-        option_lines = lines[Options_start:]
-        starts_with_options = [line for line in option_lines if re.match(r'^[A-D][\.、]', line)]
-        separate_lines = len(starts_with_options) >= 4 and all(
-            len(re.findall(r'^[A-D][\.、]', line)) == 1 for line in starts_with_options[:4]
-        )
-
-        if separate_lines:
-            print("DEBUG: Selected handler = mchandler (options on separate lines)")
-            return self.mchandler
-
-        # Check for inline options (multiple options on one line)
-        has_inline = any(len(re.findall(r'[A-D][\.、]', line)) > 1 for line in lines)
-
-        if has_inline:
-            question_text = ' '.join(lines[:max(1, Options_start)])
-            # Remove actual option patterns from question
-            question_cleaned = re.sub(r'[A-D][\.、]\s*[^A-D]*', '', question_text)
-            has_ad_in_question = bool(re.search(r'[A-D]', question_cleaned))
-
-            if has_ad_in_question:
-                print("DEBUG: Selected handler = mchandler3 (inline options + A-D in question)")
-                return self.mchandler3
-            else:
-                print("DEBUG: Selected handler = mchandler2 (clean inline options)")
-                return self.mchandler2
-
-        print("DEBUG: Defaulting to mchandler (fallback)")
-        return self.mchandler
+        name, reason = HANDLER_TABLE[fingerprint.key]
+        if has_listeners():
+            emit(HANDLER_SELECTED, handler=name, reason=reason, fingerprint=fingerprint)
+        return getattr(self, name)
 
 
 
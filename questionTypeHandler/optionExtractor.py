@@ -0,0 +1,118 @@
+import re
+from typing import List, NamedTuple, Tuple
+
+# One regex pass finds the markers; closed math is matched as a whole so the markers inside it
+# are skipped by the regex engine itself. Display math may span lines but not a blank line, inline
+# math stays on its line. Each match is "everything up to the next marker" taken possessively,
+# and every alternative in it is bounded by the next $ (or line), so no position is scanned more
+# than a constant number of times: extraction is linear in the question length, and Python only
+# sees one match per marker.
+_TOKENS = {}
+
+_QUESTION_NUMBER = re.compile(r'\d+\s*[\.、．]?')
+
+MC_PUNCTUATION = ".、．"
+
+
+# (letter, offset of the letter, offset just past the punctuation); plain tuples, there are a lot of them
+Marker = Tuple[str, int, int]
+
+
+class ExtractedOptions(NamedTuple):
+    stem: str
+    options: List[str]
+    letters: List[str]   # letter of each option, as written (a recovered trailing option gets the next letter)
+
+
+def _token_pattern(punctuation: str) -> "re.Pattern":
+    pattern = _TOKENS.get(punctuation)
+    if pattern is None:
+        punct = '[' + re.escape(punctuation) + ']'
+        pattern = _TOKENS[punctuation] = re.compile(
+            # everything up to the next marker, swallowed possessively so it is never re-scanned:
+            # closed math, ordinary text, A-D that isn't a marker, and a $ that doesn't close
+            r'(?:\$\$(?:[^$\n]|\n(?![^\S\n]*\n))*\$\$|\$[^$\n]+\$|[^$A-D]+'
+            r'|[A-D](?!' + punct + r')|(?<=[A-Za-z])[A-D]|\$)*+'
+            # then the marker itself, or the end of the text
+            r'(?:([A-D])' + punct + r'|\Z)'
+        )
+    return pattern
+
+
+def find_markers(text: str, punctuation: str = MC_PUNCTUATION) -> List[Marker]:
+    """
+    Option markers (A. / B、 / C．) outside $...$ and $$...$$, in source order.
+
+    A letter glued to another latin letter (ABCD., AB.) is never a marker. Math that
+    doesn't close — a $ left open on its line, a $$ left open across a blank line
+    or to the end — is plain text, so a stray OCR dollar can't hide the options.
+    """
+    return [(m[1], m.start(1), m.end()) for m in _token_pattern(punctuation).finditer(text) if m[1]]
+
+
+def _repair_dollar(option: str) -> str:
+    # "B.-1$" — the opening $ was lost to OCR; balanced math ("C的准线为$y=-1$") is left alone
+    if option and option[-1] == '$' and option[0] != '$' and option.count('$') % 2:
+        return '$' + option
+    return option
+
+
+def extract_options(
+    text: str,
+    punctuation: str = MC_PUNCTUATION,
+    stripNumber: bool = True,
+    recoverLast: bool = True,
+) -> ExtractedOptions:
+    """
+    Split a multiple choice question into its stem and options in one pass.
+
+    Covers every layout the handlers see: options on their own lines, inline
+    options (with or without A-D in the stem), a number without a dot, no number
+    at all, and a paper where the last option lost its marker. In the last case
+    (recoverLast) the lines after the last marked option's first line become the
+    next option, as mchandler6 did.
+
+    Args:
+        text: The question
+        punctuation: Characters that may follow a marker letter
+        stripNumber: Drop the leading question number from the stem
+        recoverLast: Recover an unmarked trailing option when fewer than four are marked
+    """
+    markers = find_markers(text, punctuation)
+    stemEnd = markers[0][1] if markers else len(text)
+    stemStart = 0
+    if stripNumber:
+        number = _QUESTION_NUMBER.match(text, 0, stemEnd)
+        stemStart = number.end() if number else 0
+    stem = text[stemStart:stemEnd].strip()
+
+    options = []
+    letters = []
+    ends = [start for _, start, _ in markers[1:]]
+    ends.append(len(text))
+    for (letter, _, start), end in zip(markers, ends):
+        options.append(text[start:end].strip())
+        letters.append(letter)
+
+    if recoverLast and options and len(options) < 4 and letters[-1] < 'D':
+        first, _, rest = options[-1].partition('\n')
+        rest = rest.strip()
+        if rest:
+            options[-1] = first.strip()
+            # the trailing lines are one option, whatever blank lines separate them
+            options.append(' '.join(line.strip() for line in rest.split('\n') if line.strip()))
+            letters.append(chr(ord(letters[-1]) + 1))
+
+    return ExtractedOptions(stem, [_repair_dollar(option) for option in options], letters)
+
+
+def options_by_letter(extracted: ExtractedOptions) -> Tuple[str, dict]:
+    """
+    (stem, {'A': ..., 'D': ...}) when at least four options were found, else (stem, None).
+    Options are lettered by position; any past the fourth stay in D with their markers.
+    """
+    options = extracted.options
+    if len(options) < 4:
+        return extracted.stem, None
+    last = " ".join([options[3]] + [f"{l}.{o}" for l, o in zip(extracted.letters[4:], options[4:])])
+    return extracted.stem, {'A': options[0], 'B': options[1], 'C': options[2], 'D': last}
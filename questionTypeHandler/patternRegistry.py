@@ -0,0 +1,43 @@
+"""
+Every regex the question handlers use, compiled once at import.
+
+The handlers look patterns up by name at call time (PATTERNS["mc.options.inline"])
+so nothing goes through the re module's internal cache, and a benchmark can swap
+entries out to compare against raw pattern strings.
+"""
+import re
+from typing import Dict, Pattern
+
+PATTERNS: Dict[str, Pattern] = {}
+
+
+def register(name: str, pattern: str, flags: int = 0) -> Pattern:
+    if name in PATTERNS:
+        raise ValueError(f"Pattern {name!r} is already registered")
+    compiled = re.compile(pattern, flags)
+    PATTERNS[name] = compiled
+    return compiled
+
+
+# -------------------------
+# Sections
+# -------------------------
+register("section.type", r'(选择题|填空题|解答题)')
+register("section.pointsEach", r'每小题\s*(\d+)\s*分')
+
+# -------------------------
+# Multiple choice
+# -------------------------
+# options on their own lines: "A.xxx"; every other layout goes through optionExtractor
+register("mc.options.separateLines", r'^[A-D][\.、]?\s*(.+)$', re.MULTILINE)
+register("mc.question.beforeLineOptions", r'(^\d+\.)(.*?)(?=^[A-D][\.、])', re.MULTILINE | re.DOTALL)
+# handler detection (fingerprint scan): markers, leading number and the character after it
+# (trailing blanks count as the end), A-D that isn't a marker
+register("mc.marker", r'[A-D][\.、]')
+register("mc.number.suffix", r'(\d*)(?:[^\S\n]*(?:\n|$)|(.))')
+register("mc.letter.bare", r'[A-D](?![\.、])')
+
+# -------------------------
+# Question index
+# -------------------------
+register("index.questionNumber", r'[#\s]*(\d+)')
@@ -1,56 +1,113 @@
-import re
+import mmap
+import os
+from bisect import bisect_left
 from utilityFunctions import escape_latex
-from classes.myClasses import Section
+from classes.myClasses import Section, SectionOrigin
+from documentLayoutHandler.displayHandler import HtmlTweaker
+from questionTypeHandler.examTokenizer import iter_section_byte_chunks, lstrip_pieces, split_sections, strip_span, tokenize
+from questionTypeHandler.patternRegistry import PATTERNS
+from eventHooks import SECTIONS_FAILED, SECTIONS_NOT_FOUND, emit
 
 class examPartitioning:
-    def __init__(self, file):
+    def __init__(self, file, text=None):
         self.file = file
+        self.text = text # content already in memory (e.g. after the html pre-pass); read from file when None
         self.sections=[] # list of tuples; each tuple is a header and body
 
 
 # in the handleSections; i want a function, that returns a list of section objects; each section object contains; section number; section header;
     def handleSections(self):
 
-        with open(self.file, "r", encoding="utf-8") as file:
-            content = file.read()
-        # Robust pattern for markdown headers with Chinese numerals and section name; not the whole section name but only the keyword !!! 
-        section_pattern = (
-            r'(^#+\s*[一二三四五六七八九十]+[、。]\s*.*?[题：].*?$)([\s\S]*?)(?=^#+\s*[一二三四五六七八九十]+[、。]|\Z)'
-        )
-        matches = re.findall(section_pattern, content, flags=re.MULTILINE | re.DOTALL)
-        if not matches:
-            print("No matching section found.")
+        if self.text is not None:
+            content = self.text
+        else:
+            with open(self.file, "r", encoding="utf-8") as file:
+                content = file.read()
+        Sections = self._sections(content)
+        if Sections is None:
+            emit(SECTIONS_NOT_FOUND, file=self.file)
+        return Sections
+
+    def iterSections(self, convertHtml=True, assets=None):
+        """
+        Yield the sections of a file one at a time, for bank files too big to read whole.
+
+        The file is memory-mapped and the section headers are found with one forward
+        scan over its bytes; each section is only decoded (and given the html pre-pass)
+        when it is reached, and partitioned on its own, so memory is bounded by the
+        largest section. Each Section's Source is its own text, with its Origin in the file.
+        With an ExamAssets, the images of each section are stored as it is reached.
+        """
+        if os.path.getsize(self.file) == 0:
+            emit(SECTIONS_NOT_FOUND, file=self.file)
             return
+        with open(self.file, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            found = False
+            line, counted, shift, lineShift = 1, 0, 0, 0
+            for start, end in iter_section_byte_chunks(mapped):
+                line += _count_newlines(mapped, counted, start)
+                counted = start
+                raw = mapped[start:end]
+                # what open(..., encoding="utf-8").read() would give for these bytes
+                content = raw.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+                if convertHtml:
+                    tweaker = HtmlTweaker()
+                    content = tweaker.convert_text(content)
+                    if assets is not None:
+                        assets.resolve(tweaker.image_sources())
+                encoded = content.encode("utf-8")
+                origin = SectionOrigin(start, end, line + lineShift, encoded == raw, start + shift)
+                shift += len(encoded) - len(raw)
+                lineShift += content.count("\n") - raw.count(b"\n")
+                del raw, encoded
+                for section in self._sections(content, origin) or []:
+                    found = True
+                    yield section
+            if not found:
+                emit(SECTIONS_NOT_FOUND, file=self.file)
+
+    def _sections(self, content, origin=None):
+        # one pass over the whole text; sections and their questions are cut from this token stream
+        tokens = tokenize(content)
+        matches = split_sections(content, tokens)
+        if not matches:
+            return None
         
-        def clean_header(header):
+        def headerSpan(token):
             # Remove leading # and whitespace
-            return re.sub(r'^#+\s*', '', header)
-        def extractNumber(header):
-            match = re.search(r'([一二三四五六七八九十]+)', header)
-            numberStr = match.group(1) if match else ""  # returns the captured numeral as a string, or empty string if no match
-            return numberStr
-        def extractType(header):
-            match = re.search(r'(选择题|填空题|解答题)', header)
+            return tuple(lstrip_pieces(content, lstrip_pieces(content, [(token.start, token.end)], '#'))[0])
+        def extractType(token):
+            match = PATTERNS["section.type"].search(content, token.start, token.end)
             typeStr = match.group(1) if match else ""
             return typeStr
 
+        tokenStarts = [t.start for t in tokens]
+
         try:
-            Sections = [
-                Section(
+            # sections are offsets into content; nothing is cut out of it here
+            Sections = []
+            for headerToken, bodyStart, bodyEnd in matches:
+                Sections.append(Section(
                     self.file,
-                    text=header + "\\" + body,
-                    header=clean_header(header),
-                    body=body.strip(),
-                    number=extractNumber(header),
-                    type=extractType(header)
-                )
-                for header, body in matches
-            ]
+                    content,
+                    number=headerToken.value,
+                    type=extractType(headerToken),
+                    span=(headerToken.start, bodyEnd),
+                    headerSpan=headerSpan(headerToken),
+                    bodySpan=strip_span(content, bodyStart, bodyEnd),
+                    tokens=tokens[bisect_left(tokenStarts, bodyStart):bisect_left(tokenStarts, bodyEnd)],
+                    origin=origin
+                ))
         except Exception as e:
-            print("Error creating Section objects:", e)
+            emit(SECTIONS_FAILED, file=self.file, error=e)
             Sections = []
 
         return Sections
 
 
-    
\ No newline at end of file
+def _count_newlines(buffer, start, end, block=1 << 20):
+    # a block at a time, so counting the lines of a mapped file never copies much of it
+    count = 0
+    for blockStart in range(start, end, block):
+        count += buffer[blockStart:min(blockStart + block, end)].count(b"\n")
+    return count
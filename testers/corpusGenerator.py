@@ -0,0 +1,189 @@
+"""
+Synthetic OCR'd exam papers for benchmarks and batch runs.
+
+Every question layout the handlers recognise has a template, so a generated
+paper exercises all of them in realistic proportions:
+
+    python -m testers.corpusGenerator out_dir --exams 100 --questions 40
+"""
+import argparse
+import os
+import random
+from typing import List
+
+NUMERALS = "一二三四五六七八九十"
+
+# stems and options stay free of bare A-D so only the inline_ad_stem template trips mchandler3
+MATH = [
+    r"$\frac{1}{2}$", r"$\frac{\sqrt{3}}{3}$", r"$x^{2}+y^{2}=1$", r"$\{x\mid0\leqslant x<2\}$",
+    r"$f(x)=x^{3}-x+1$", r"$\overline{M}$", r"$a<b<c$", r"$1.2\times10^{9}m^{3}$",
+    r"$\overrightarrow{OM}=m$", r"$\triangle PQR$", r"$g(-\frac{1}{2})=0$", r"$[\frac{27}{4},\frac{81}{4}]$",
+    r"$\vert O P\vert\cdot\vert O Q\vert$", r"$P(M\mid\overline{N})$", r"$y=(x+a)e^{x}$",
+]
+WORDS = [
+    "已知函数", "若集合", "则", "的取值范围是", "设", "从2至8的7个整数中随机取2个不同的数",
+    "已知正方体", "直线", "与平面", "所成的角为", "的展开式中", "的系数为", "已知椭圆", "离心率为",
+    "的图像关于点", "中心对称", "记该指标为R", "的最小值", "证明", "求",
+]
+FOOTER = "数学试题第{page}页（共{pages}页）"
+IMAGE = '<div style="text-align: center;"><img src="imgs/img_in_image_box_{a}_{b}_{c}_{d}.jpg" alt="Image" width="40%" /></div>'
+TABLE_ROW = "<tr>{cells}</tr>"
+
+
+class ExamGenerator:
+    """Builds exam markdown from templates; deterministic for a given seed."""
+
+    # share of each multiple choice layout, by handler it should trigger
+    MC_LAYOUTS = [
+        ("separate_lines", 4),   # mchandler
+        ("inline", 4),           # mchandler2
+        ("inline_ad_stem", 1),   # mchandler3
+        ("no_dot", 1),           # mchandler4
+        ("no_number", 1),        # mchandler5 (merges into the previous question, as real OCR does)
+        ("few_markers", 1),      # mchandler6
+    ]
+
+    def __init__(self, seed: int = 0, imageRate: float = 0.05, tableRate: float = 0.05):
+        self.random = random.Random(seed)
+        self.imageRate = imageRate
+        self.tableRate = tableRate
+
+    # -------------------------
+    # building blocks
+    # -------------------------
+    def sentence(self, parts: int = 4) -> str:
+        pieces = []
+        for _ in range(parts):
+            pieces.append(self.random.choice(WORDS))
+            if self.random.random() < 0.6:
+                pieces.append(self.random.choice(MATH) + " ")
+        return "".join(pieces)
+
+    def option(self) -> str:
+        return self.random.choice(MATH) if self.random.random() < 0.7 else self.sentence(1)
+
+    def image(self) -> str:
+        return IMAGE.format(**{k: self.random.randint(10, 999) for k in "abcd"})
+
+    def table(self) -> str:
+        cols = self.random.randint(2, 4)
+        rows = [TABLE_ROW.format(cells="".join(f"<td>{self.random.choice(['病例组', '对照组', '良好'])}</td>"
+                                               for _ in range(cols)))]
+        for _ in range(self.random.randint(1, 3)):
+            rows.append(TABLE_ROW.format(cells="".join(f"<td>{self.random.randint(0, 99)}</td>" for _ in range(cols))))
+        return ('<div style="text-align: center;"><html><body><table border="1">'
+                + "".join(rows) + "</table></body></html></div>")
+
+    def extras(self) -> str:
+        out = ""
+        if self.random.random() < self.imageRate:
+            out += "\n\n" + self.image()
+        if self.random.random() < self.tableRate:
+            out += "\n\n" + self.table()
+        return out
+
+    # -------------------------
+    # question templates
+    # -------------------------
+    def mc_question(self, number: int) -> str:
+        layout = self.random.choices([l for l, _ in self.MC_LAYOUTS], [w for _, w in self.MC_LAYOUTS])[0]
+        stem = self.sentence() + self.extras()
+        options = [self.option() for _ in range(4)]
+
+        if layout == "separate_lines":
+            body = "\n\n".join(f"{letter}.{opt} " for letter, opt in zip("ABCD", options))
+            return f"{number}.{stem}\n\n{body}\n"
+        if layout == "inline":
+            return f"{number}.{stem}\n\n" + "".join(f"{l}.{o} " for l, o in zip("ABCD", options)) + "\n"
+        if layout == "inline_ad_stem":
+            return f"{number}.在△ABC中，点D在边AB上{stem}\n\n" + "".join(f"{l}.{o} " for l, o in zip("ABCD", options)) + "\n"
+        if layout == "no_dot":
+            return f"{number}{stem}\n\n" + "".join(f"{l}.{o} " for l, o in zip("ABCD", options)) + "\n"
+        if layout == "no_number":
+            return f"{stem}\n\n" + "".join(f"{l}.{o} " for l, o in zip("ABCD", options)) + "\n"
+        # few_markers: the D option lost its marker and spilled into display math
+        return (f"{number}.{stem}\n\nA.{options[0]} B.{options[1]}\n\nC.{options[2]} \n\n"
+                f"$${options[3].strip('$')}$$\n")
+
+    def fib_question(self, number: int) -> str:
+        return f"{number}.{self.sentence()}（用数字作答）.{self.extras()}\n"
+
+    def essay_question(self, number: int) -> str:
+        points = self.random.choice([10, 12])
+        heading = "### " if self.random.random() < 0.5 else ""
+        out = [f"{heading}{number}. ({points}分)\n\n{self.sentence(5)}{self.extras()}\n"]
+        nested = self.random.random() < 0.3
+        for sub in range(1, self.random.randint(2, 3) + 1):
+            paren = ("(", ")") if self.random.random() < 0.7 else ("（", "）")
+            out.append(f"{paren[0]}{sub}{paren[1]}{self.sentence(2)};\n")
+            if nested and sub == 2:
+                for roman in ("i", "ii"):
+                    out.append(f"({roman}){self.sentence(2)}\n")
+        return "\n".join(out)
+
+    # -------------------------
+    # whole papers
+    # -------------------------
+    def exam(self, questions: int, mcShare: float = 0.5, fibShare: float = 0.2) -> str:
+        """A paper with about `questions` questions split over 选择题 / 填空题 / 解答题 sections."""
+        mcCount = max(1, int(questions * mcShare))
+        fibCount = max(1, int(questions * fibShare))
+        eqCount = max(1, questions - mcCount - fibCount)
+        # long banks are cut into several sections of each type, like a merged question bank
+        perSection = 40
+
+        lines: List[str] = ["# 2022年普通高等学校招生全国统一考试（合成卷）\n"]
+        number = 1
+        sectionIndex = 0
+        page = 1
+        pages = max(1, questions // 6)
+        for typeName, count, make in (
+            ("选择题", mcCount, self.mc_question),
+            ("填空题", fibCount, self.fib_question),
+            ("解答题", eqCount, self.essay_question),
+        ):
+            remaining = count
+            while remaining > 0:
+                chunk = min(perSection, remaining)
+                numeral = NUMERALS[sectionIndex % len(NUMERALS)]
+                lines.append(f"## {numeral}、 {typeName}：本题共{chunk}小题，每小题5分。\n")
+                for _ in range(chunk):
+                    lines.append(make(number))
+                    if number % 6 == 0:
+                        lines.append(FOOTER.format(page=page, pages=pages) + "\n\n---\n")
+                        page += 1
+                    number += 1
+                remaining -= chunk
+                sectionIndex += 1
+        return "\n".join(lines)
+
+
+def generate_exam(questions: int, seed: int = 0, **kwargs) -> str:
+    return ExamGenerator(seed).exam(questions, **kwargs)
+
+
+def write_corpus(directory: str, exams: int, questions: int, seed: int = 0) -> List[str]:
+    """Write `exams` papers of `questions` questions each; returns the file paths."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(exams):
+        path = os.path.join(directory, f"exam_{i:05d}.md")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(generate_exam(questions, seed=seed + i))
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic exam markdown papers.")
+    parser.add_argument("directory")
+    parser.add_argument("--exams", type=int, default=10)
+    parser.add_argument("--questions", type=int, default=22)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    paths = write_corpus(args.directory, args.exams, args.questions, args.seed)
+    print(f"Wrote {len(paths)} exams to {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Essay questions: the old findall + re.sub handlers vs the one-pass essayParser.
+
+    python -m testers.essayBenchmark --subquestions 2 8 32 128
+
+Each essay question gets `n` sub-questions, every other one with (i)/(ii)
+items under it ("n flat": none, the plain (1)/(2) layout), and is parsed both
+ways. The old handlers strip the points and
+every sub-question back out of the description with extra passes, run a
+findall and a re.sub per sub-question, and only see two levels (eqHandler2
+keeps the first line of a sub-question only, so its (i) items are lost);
+the parser walks the text once whatever the depth. "items" counts the nodes
+each one found.
+"""
+import argparse
+import re
+import time
+
+from classes.myClasses import EssayQuestion, Question
+from questionTypeHandler.eqHandler import example1, example2
+from questionTypeHandler.essayParser import parse_essay
+
+# -------------------------
+# The handlers as they were, kept here only to be measured against
+# -------------------------
+_POINTS = re.compile(r'^(?:#+\s*\d+\.\s*)?\((\d+分)\)', re.MULTILINE)
+_SUB = re.compile(r'(?:\(|（)(\d+)(?:\)|）)\s*(.*?)(?=(?:\(|（)\d+(?:\)|）)|$)', re.DOTALL)
+_SUB_LINE_START = re.compile(r'(?:^\((\d+)\)|^（(\d+）))(.*?)(?=^\(\d+\)|^（\d+）|$)', re.MULTILINE | re.DOTALL)
+_SUB_FIRST = re.compile(r'^\((\d+)\)|^（(\d+）)', re.MULTILINE)
+_SUB_SUB = re.compile(r'^[^\S\n]*[\(（]([ivxIVX]+)[\)）]\s*(.*?)(?=^[^\S\n]*[\(（][ivxIVX]+[\)）]|$)', re.MULTILINE | re.DOTALL)
+_SUB_SUB_INDEX = re.compile(r'^[^\S\n]*[\(（][ivxIVX]+[\)）]', re.MULTILINE)
+
+
+# they built the same question objects as the parser (their debug prints are left out)
+def legacy_handler1(text):
+    subQuestions = [Question(Description=sq[1].strip()) for sq in _SUB.findall(text)]
+    description = _SUB.sub('', _POINTS.sub('', text).strip()).strip()
+    return EssayQuestion(Description=description, subQuestions=subQuestions)
+
+
+def legacy_handler2(text):
+    first = _SUB_FIRST.search(text)
+    description = text[:first.start()].strip() if first else text.strip()
+    subQuestions = []
+    for match in _SUB_LINE_START.findall(text):
+        subText = match[2].strip()
+        subsubs = _SUB_SUB.findall(subText)
+        if subsubs:
+            subQuestion = EssayQuestion(Description=_SUB_SUB.sub('', subText).strip())
+            subQuestion.SubQuestions = [Question(Description=s[1].strip()) for s in subsubs]
+            subQuestions.append(subQuestion)
+        else:
+            subQuestions.append(Question(Description=subText))
+    return EssayQuestion(Description=description, subQuestions=subQuestions)
+
+
+def legacy(text):
+    return legacy_handler2(text) if _SUB_SUB_INDEX.search(text) else legacy_handler1(text)
+
+
+def items(question):
+    return sum(1 + items(q) for q in getattr(question, "SubQuestions", None) or ())
+
+
+# -------------------------
+# Measuring
+# -------------------------
+def essay(subquestions, nested=True):
+    stem = example1.strip().split("\n\n")[1]
+    lines = [f"18. (12分)\n\n{stem}\n"]
+    for n in range(1, subquestions + 1):
+        lines.append(f"({n})(4分)若$c=\\frac{{2\\pi}}{{{n}}}$ ，求$f({n})$;\n")
+        if nested and n % 2 == 0:
+            lines.append("(i)证明：$R=\\frac{P(A\\mid B)}{P(\\overline{A}\\mid B)}$\n")
+            lines.append("（ii）利用（i）的结果给出R的估计值.\n")
+    return "\n".join(lines)
+
+
+def timed(fn, texts, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best / len(texts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--subquestions", type=int, nargs="+", default=[2, 8, 32, 128])
+    parser.add_argument("--copies", type=int, default=200, help="Questions parsed per timing")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'subquestions':>12}{'legacy us':>11}{'parser us':>11}{'speedup':>9}{'legacy items':>14}{'parser items':>14}")
+    cases = [(f"example{i}", [text.strip()]) for i, text in enumerate((example1, example2), 1)]
+    cases += [(str(n), [essay(n)]) for n in args.subquestions]
+    cases += [(f"{n} flat", [essay(n, nested=False)]) for n in args.subquestions]
+    for name, texts in cases:
+        texts = texts * args.copies
+        before = timed(legacy, texts, args.repeat) * 1e6
+        after = timed(parse_essay, texts, args.repeat) * 1e6
+        print(f"{name:>12}{before:>11.1f}{after:>11.1f}{before / after:>8.1f}x"
+              f"{items(legacy(texts[0])):>14}{items(parse_essay(texts[0])):>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import re
 from typing import List, Tuple, Dict
 
+from testers.fixEngine import FIX_ENGINE
+
 
 class LatexMathFixer:
     """
@@ -13,7 +15,7 @@ class LatexMathFixer:
         self.fixed_text = latex_text
         self.fixes_applied = []
     
-    def fix_all(self) -> str:
+    def fix_all(self, profiler=None) -> str:
         """Apply all fixes in sequence"""
         """
         Calls all the fix methods in a specific order:
@@ -31,17 +33,10 @@ class LatexMathFixer:
             Returns the fully fixed LaTeX string.
         """
 
-        self.fix_escape_characters()
-        self.fix_unbalanced_math_delimiters()
-        self.fix_incomplete_braces()
-        self.fix_set_notation()
-        self.fix_chinese_symbols_in_math()
-        #self.fix_itemize_enumerate_structure()
-        self.fix_spacing_issues()
-        self.fix_common_command_typos()
-        self.fix_leftright_pairing()
-        self.fix_text_in_math_mode()
-        # self.fix_orphaned_items()
+        # the same rules as the fix_* methods below, in this order, as the stages of
+        # FIX_ENGINE (testers/fixEngine.py); fix_itemize_enumerate_structure and
+        # fix_orphaned_items stay off. A RuleProfiler, when given, times each rule
+        self.fixed_text = FIX_ENGINE.run(self.fixed_text, self.fixes_applied, profiler)
         return self.fixed_text
     
     def fix_escape_characters(self) -> None:
@@ -0,0 +1,167 @@
+"""
+LatexMathFixer: the fix_* methods one after the other vs the compiled FixEngine.
+
+    python -m testers.fixBenchmark --exams 1 10 --fuzz 20000
+
+The legacy path calls the fix_* methods in fix_all's order, with their
+per-command and per-rule re.search / findall / re.sub passes; fix_all now runs
+FIX_ENGINE. Both are timed on the test document of test.py and on converted
+generated papers, and the fixed text and the fixes_applied report must be
+identical. --fuzz then compares the two on random strings made of the pieces
+the rules react to ($, braces, |, full-width symbols, \\left, doubled
+backslashes, line starts...) and prints the first input they disagree on.
+
+The last table is what main.py --fix-math does instead: the fragments of each
+paper fixed one at a time by a FragmentFixer, directly ("direct", the default)
+and memoised across the papers ("memo", --fix-memo). The "xN" rows convert the
+same papers N times over, like a bank whose questions come back across exams,
+which is where the memo pays. Each fragment must come out as FIX_ENGINE leaves
+it when run on that fragment alone.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import main as converter
+from fragmentFixer import FragmentFixer
+from testers.corpusGenerator import generate_exam
+from testers.fix import LatexMathFixer
+from testers.fixEngine import FIX_ENGINE
+
+PIECES = [
+    "$", "$", "$$", "x", "abc", "and", "The", "for ", " ", "  ", "\t", "\n", "\n", ",", ".", " ,", "=", " = ",
+    "{", "}", "(", ")", "[", "]", "\\{", "\\}", "|", "x|", "\\mid", "，", "。", "90。", "（", "）", "：",
+    "１", "２", "12", "\\left(", "\\left[", "\\left|", "\\right)", "\\right|", "\\\\begin", "begin{", "\\\\item ",
+    "item{", "\\\\frac{", "\\begn{enumerate }", "\\ned{itemize}", "\\begin{enumerate}", "\\frat{", "\\dfrac{",
+    "\\timse", "\\pmb{", "\\boldsymbol{", "\\text{", "\\sin", "f(x)=", "x>0", "+", "-", "a_", "中文", "\\section*{",
+]
+
+
+def legacy(text):
+    fixer = LatexMathFixer(text)
+    fixer.fix_escape_characters()
+    fixer.fix_unbalanced_math_delimiters()
+    fixer.fix_incomplete_braces()
+    fixer.fix_set_notation()
+    fixer.fix_chinese_symbols_in_math()
+    fixer.fix_spacing_issues()
+    fixer.fix_common_command_typos()
+    fixer.fix_leftright_pairing()
+    fixer.fix_text_in_math_mode()
+    return fixer.fixed_text, fixer.fixes_applied
+
+
+def engine(text):
+    fixer = LatexMathFixer(text)
+    return fixer.fix_all(), fixer.fixes_applied
+
+
+def test_document():
+    # test.py runs a handler demo once its document is defined; only the document is wanted
+    with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test.py"),
+              encoding="utf-8") as f:
+        source = f.read()
+    namespace = {}
+    exec(source[:source.index("import re\nfrom classes.myClasses")], namespace)
+    return namespace["test1"]
+
+
+def converted_papers(count, questions):
+    # the fragments of each paper, as finish_fragment leaves them
+    with tempfile.TemporaryDirectory() as directory:
+        papers = []
+        for seed in range(count):
+            path = os.path.join(directory, f"{seed}.md")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(generate_exam(questions, seed=seed))
+            papers.append(list(converter.iter_exam_latex(path))[1:-1])
+        return papers
+
+
+def alone(fragment):
+    fixes = []
+    return FIX_ENGINE.run(fragment, fixes), fixes
+
+
+def by_fragment(papers, memoise):
+    fixer = FragmentFixer(memoise=memoise)
+    for fragments in papers:
+        for fragment in fragments:
+            fixer.fix(fragment)
+    return fixer
+
+
+def timed(fn, texts, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def fuzz(trials, seed):
+    rng = random.Random(seed)
+    for trial in range(trials):
+        text = "".join(rng.choice(PIECES) for _ in range(rng.randint(1, 40)))
+        if legacy(text) != engine(text):
+            return text
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--exams", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--questions", type=int, default=22, help="Questions per generated paper")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--bank", type=int, default=3, help="Times the papers come back in the xN rows")
+    parser.add_argument("--fuzz", type=int, default=5000, help="Random strings compared (0 = skip)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'input':>12}{'KB':>8}{'legacy ms':>11}{'engine ms':>11}{'speedup':>9}{'same':>6}")
+    cases = [("test.py", [test_document()])]
+    corpora = [(f"{n} papers", converted_papers(n, args.questions)) for n in args.exams]
+    cases += [(name, ["".join(fragments) for fragments in papers]) for name, papers in corpora]
+    for name, texts in cases:
+        size = sum(len(text.encode("utf-8")) for text in texts) / 1024
+        before = timed(legacy, texts, args.repeat) * 1e3
+        after = timed(engine, texts, args.repeat) * 1e3
+        same = all(legacy(text) == engine(text) for text in texts)
+        print(f"{name:>12}{size:>8.0f}{before:>11.2f}{after:>11.2f}{before / after:>8.1f}x{'yes' if same else 'NO':>6}")
+
+    print()
+    print(f"{'input':>12}{'fragments':>11}{'whole ms':>10}{'direct ms':>11}{'memo ms':>10}{'memo':>7}"
+          f"{'hits':>7}{'formula hits':>14}{'same':>6}")
+    if args.bank > 1:
+        corpora += [(f"{name} x{args.bank}", papers * args.bank) for name, papers in corpora]
+    for name, papers in corpora:
+        fragments = [fragment for paper in papers for fragment in paper]
+        whole = timed(engine, ["".join(paper) for paper in papers], args.repeat) * 1e3
+        direct = timed(lambda _: by_fragment(papers, False), [None], args.repeat) * 1e3
+        memo = timed(lambda _: by_fragment(papers, True), [None], args.repeat) * 1e3
+        same = True
+        for memoise in (False, True):
+            fixer = FragmentFixer(memoise=memoise)
+            for fragment in fragments:
+                fixes = []
+                same &= (fixer.fix(fragment, fixes), fixes) == alone(fragment)
+        formulas = fixer.formulaHits + fixer.formulaMisses
+        print(f"{name:>12}{len(fragments):>11}{whole:>10.2f}{direct:>11.2f}{memo:>10.2f}{direct / memo:>6.1f}x"
+              f"{fixer.hits:>7}{fixer.formulaHits:>7}/{formulas:<6}{'yes' if same else 'NO':>6}")
+
+    if args.fuzz:
+        witness = fuzz(args.fuzz, args.seed)
+        if witness is None:
+            print(f"fuzz: {args.fuzz} random strings, no difference")
+        else:
+            print(f"fuzz: first difference on {witness!r}")
+            print(f"  legacy: {legacy(witness)!r}")
+            print(f"  engine: {engine(witness)!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+"""
+The LatexMathFixer rules as the stages of a FixEngine, run by fix_all.
+
+Each fix_* method is one stage here, run in the same order and reporting the
+same fixes_applied lines, so the output is unchanged; run() still goes over
+the text once per stage, nine times in all (more where a stage has several
+patterns). What differs is the cost of a stage: its patterns are compiled at import, a rule table is one alternation
+scanned once (the 19 commands x 2 of fix_escape_characters, the 13
+typos, the Chinese symbols, the spacing rules) with a count per branch instead
+of a search-then-sub or findall-then-sub per rule, and a stage whose trigger
+character isn't in the text at all (no "|", no "，", no \\left/\\right...) is
+skipped without scanning. Along with the text, a stage returns how many
+matches its subn calls made and how many of those rewrote something (a rule
+often matches text it leaves as it is); RuleProfiler adds those up when passed
+to run().
+
+The stages cannot be folded into one walk that tracks math mode: each rule
+pairs the $ signs its own way (the Chinese comma rule, for one, also pairs the
+closing $ of a formula with the opening $ of the next one) and sees what the
+rules before it wrote, and the existing outputs depend on both. Rules are only
+fused where their matches cannot overlap or feed each other.
+"""
+import json
+import re
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+Fixes = List[str]
+# a stage returns the fixed text, how many matches its patterns had (the subn counts) and how
+# many of those replacements changed the text
+Stage = Callable[[str, Fixes], Tuple[str, int, int]]
+
+# an inline formula, as every $-scoped rule that needs a non-empty body pairs them
+MATH = re.compile(r'\$([^$]+)\$')
+
+
+# -------------------------
+# fix_escape_characters
+# -------------------------
+ESCAPE_COMMANDS = ['begin', 'end', 'item', 'section', 'subsection',
+                   'frac', 'sqrt', 'sum', 'int', 'lim', 'sin', 'cos', 'tan',
+                   'alpha', 'beta', 'gamma', 'theta', 'pi', 'infty']
+_COMMANDS = '|'.join(ESCAPE_COMMANDS)
+# "cmd{" at the start of a line, or "\\cmd" before a space or a brace; never overlapping
+ESCAPES = re.compile(rf'^(?P<missing>{_COMMANDS})\{{|\\\\(?P<doubled>{_COMMANDS})(?=\s|\{{)', re.MULTILINE)
+
+
+def fix_escape_characters(text: str, fixes: Fixes) -> Tuple[str, int, int]:
+    missing, doubled = set(), set()
+
+    def replace(m):
+        if m.group('missing') is not None:
+            missing.add(m.group('missing'))
+            return '\\' + m.group('missing') + '{'
+        doubled.add(m.group('doubled'))
+        return '\\' + m.group('doubled')
+
+    text, count = ESCAPES.subn(replace, text)
+    for cmd in ESCAPE_COMMANDS:
+        if cmd in missing:
+            fixes.append(f"Added backslash to {cmd}")
+        if cmd in doubled:
+            fixes.append(f"Fixed doubled backslash in {cmd}")
+    # every match adds or drops a backslash
+    return text, count, count
+
+
+# -------------------------
+# fix_unbalanced_math_delimiters
+# -------------------------
+PURE_COMMAND_LINE = re.compile(r'^\s*\\[a-zA-Z]+(\{[^}]*\}|\[[^\]]*\])*\s*$')
+FORMULA_ENDS = re.compile(r'\$[^$]+[=><\+\-\*/\)\]\}](?:\s|$)')
+FORMULA_STARTS = re.compile(r'(?:^|\s)[a-zA-Z_]\w*\s*[=><].*\$$')
+TWO_FORMULAS = re.compile(r'\$[^$]+\$\s+[^$]+\$[^$]+')
+SECOND_FORMULA = re.compile(r'(\$[^$]+\$\s+)([^$\s])')
+
+
+def fix_unbalanced_math_delimiters(text: str, fixes: Fixes) -> Tuple[str, int, int]:
+    if '$' not in text:
+        return text, 0, 0
+    count = 0
+    lines = text.split('\n')
+    for line_num, line in enumerate(lines, 1):
+        # only a line with an odd number of $ can change
+        if line.count('$') % 2 == 0 or PURE_COMMAND_LINE.match(line):
+            continue
+        if FORMULA_ENDS.search(line) and not line.strip().endswith('$'):
+            lines[line_num - 1] = line.rstrip() + '$'
+            fixes.append(f"Line {line_num}: Added missing closing $")
+        elif FORMULA_STARTS.search(line) and not line.lstrip().startswith('$'):
+            lines[line_num - 1] = '$' + line.lstrip()
+            fixes.append(f"Line {line_num}: Added missing opening $")
+        elif line.count('$') == 3 and TWO_FORMULAS.search(line):
+            lines[line_num - 1] = SECOND_FORMULA.sub(r'\1$\2', line)
+            fixes.append(f"Line {line_num}: Added missing $ between formulas")
+        else:
+            continue
+        count += 1
+    return '\n'.join(lines), count, count
+
+
+# -------------------------
+# fix_incomplete_braces
+# -------------------------
+BRACKET_PAIRS = (('{', '}'), ('(', ')'), ('[', ']'))
+
+
+def fix_incomplete_braces(text: str, fixes: Fixes) -> Tuple[str, int, int]:
+    changed = 0
+
+    def replace(m):
+        nonlocal changed
+        fixed = m.group(1)
+        for o, c in BRACKET_PAIRS:
+            open_count = fixed.count(o)
+            close_count = fixed.count(c)
+            if open_count > close_count:
+                fixed += c * (open_count - close_count)
+                fixes.append(f"Added {open_count - close_count} missing '{c}' in math mode")
+            elif close_count > open_count:
+                for _ in range(close_count - open_count):
+                    if fixed.endswith(c):
+                        fixed = fixed[:-1]
+                fixes.append(f"Removed {close_count - open_count} extra '{c}' in math mode")
+        changed += fixed != m.group(1)
+        return '$' + fixed + '$'
+
+    text, count = MATH.subn(replace, text)
+    return text, count, changed
+
+
+# -------------------------
+# fix_set_notation
+# -------------------------
+SET_PIPE = re.compile(r'(\{[^}]*)\|([^}]*\})')
+ENDS_IN_LETTER = re.compile(r'[a-zA-Z]$')
+SET_BRACES = re.compile(r'\$\{([^}]+\\mid[^}]+)\}\$')
+
+
+def fix_set_notation(text: str, fixes: Fixes) -> Tuple[str, int, int]:
+    count = changed = 0
+    if '|' in text:
+        def pipe(m):
+            nonlocal changed
+            if ENDS_IN_LETTER.search(m.group(1).strip()):
+                changed += 1
+                fixes.append("Fixed set notation: | → \\mid")
+                return m.group(1) + r'\mid' + m.group(2)
+            return m.group(0)
+
+        text, count = SET_PIPE.subn(pipe, text)
+
+    if '\\mid' in text:
+        def braces(m):
+            nonlocal changed
+            if not m.group(1).startswith(r'\{'):
+                changed += 1
+                fixes.append("Fixed set braces: { → \\{")
+                return r'$\{' + m.group(1) + r'\}$'
+            return m.group(0)
+
+        text, n = SET_BRACES.subn(braces, text)
+        count += n
+    return text, count, changed
+
+
+# -------------------------
+# fix_chinese_symbols_in_math
+# -------------------------
+CHINESE_COMMA_IN_MATH = re.compile(r'\$([^$]*?)，([^$]*?)\$')
+# the degree sign and the full-width brackets and colon, one count each, in this order
+CHINESE_SYMBOLS = re.compile(r'(?P<degree>\d+)\s*。|(?P<open>（)|(?P<close>）)|(?P<colon>：)')
+CHINESE_SYMBOL_KINDS = ('degree', 'open', 'close', 'colon')
+FULLWIDTH_DIGIT = re.compile(r'[０-９]')
+FULLWIDTH_IN_MATH = re.compile(r'\$([^$]*)[０-９]([^$]*)\$')
+FULLWIDTH_TABLE = str.maketrans('０１２３４５６７８９', '0123456789')
+
+
+def fix_chinese_symbols_in_math(text: str, fixes: Fixes) -> Tuple[str, int, int]:
+    count = 0
+    if '，' in text:
+        text, count = CHINESE_COMMA_IN_MATH.subn(r'$\1, \2$', text)
+        if count:
+            fixes.append(f"Replaced Chinese symbols ({count} instances)")
+
+    counts = dict.fromkeys(CHINESE_SYMBOL_KINDS, 0)
+
+    def symbol(m):
+        kind = m.lastgroup
+        counts[kind] += 1
+        if kind == 'degree':
+            return m.group('degree') + '^{\\circ}'
+        return {'open': '(', 'close': ')', 'colon': ':'}[kind]
+
+    text, n = CHINESE_SYMBOLS.subn(symbol, text)
+    count += n
+    for kind in CHINESE_SYMBOL_KINDS:
+        if counts[kind]:
+            fixes.append(f"Replaced Chinese symbols ({counts[kind]} instances)")
+
+    if FULLWIDTH_DIGIT.search(text):
+        text, n = FULLWIDTH_IN_MATH.subn(lambda m: '$' + m.group(0).translate(FULLWIDTH_TABLE) + '$', text)
+        count += n
+    # each of these replaces a symbol or adds $ signs
+    return text, count, count
+
+
+# -------------------------
+# fix_spacing_issues
+# -------------------------
+# whitespace before , or . goes entirely; any other run of spaces becomes one
+SPACING = re.compile(r'\s+([,.])|  +')
+EQUALS_IN_MATH = re.compile(r'\$([^$]*)\s*=\s*([^$]*)\$')
+
+
+def fix_spacing_issues(text: str, fixes: Fixes) -> Tuple[str, int, int]:
+    # a spacing match always drops a space; a formula's "=" often had none around it
+    text, count = SPACING.subn(lambda m: m.group(1) or ' ', text)
+    changed = count
+    if '=' in text:
+        def equals(m):
+            nonlocal changed
+            fixed = '$' + m.group(1) + '=' + m.group(2) + '$'
+            changed += fixed != m.group(0)
+            return fixed
+
+        text, n = EQUALS_IN_MATH.subn(equals, text)
+        count += n
+    return text, count, changed
+
+
+# -------------------------
+# fix_common_command_typos
+# -------------------------
+# (pattern, replacement) in the order they are reported
+TYPOS = [
+    (r'\\frat\{', r'\\frac{'),
+    (r'\\dfrac\{', r'\\frac{'),  # \dfrac is valid but normalize to \frac
+    (r'\\begn\{', r'\\begin{'),
+    (r'\\ned\{', r'\\end{'),
+    (r'\\timse', r'\\times'),
+    (r'\\cdtos', r'\\cdots'),
+    (r'\\lDots', r'\\ldots'),
+    (r'\\begin\{enumerate\s*\}', r'\\begin{enumerate}'),
+    (r'\\end\{enumerate\s*\}', r'\\end{enumerate}'),
+    (r'\\begin\{itemize\s*\}', r'\\begin{itemize}'),
+    (r'\\end\{itemize\s*\}', r'\\end{itemize}'),
+    (r'\\pmb\{', r'\\mathbf{'),
+    (r'\\boldsymbol\{', r'\\mathbf{'),
+]
+# a misspelt \begin/\end of a list is both typos at once
+_CHAINED = [
+    (r'\\begn\{enumerate\s*\}', (2, 7), r'\begin{enumerate}'),
+    (r'\\begn\{itemize\s*\}', (2, 9), r'\begin{itemize}'),
+    (r'\\ned\{enumerate\s*\}', (3, 8), r'\end{enumerate}'),
+    (r'\\ned\{itemize\s*\}', (3, 10), r'\end{itemize}'),
+]
+TYPO_BRANCHES = {f'c{i}': (rules, out) for i, (_, rules, out) in enumerate(_CHAINED)}
+TYPO_BRANCHES.update({f't{i}': ((i,), re.sub(r'\\(.)', r'\1', correct)) for i, (_, correct) in enumerate(TYPOS)})
+COMMAND_TYPOS = re.compile('|'.join(
+    [f'(?P<c{i}>{pattern})' for i, (pattern, _, _) in enumerate(_CHAINED)]
+    + [f'(?P<t{i}>{wrong})' for i, (wrong, _) in enumerate(TYPOS)]
+))
+
+
+def fix_common_command_typos(text: str, fixes: Fixes) -> Tuple[str, int, int]:
+    if '\\' not in text:
+        return text, 0, 0
+    found = set()
+    changed = 0
+
+    def replace(m):
+        nonlocal changed
+        rules, out = TYPO_BRANCHES[m.lastgroup]
+        found.update(rules)
+        # a list environment that is spelt right is matched and written back as it was
+        changed += out != m.group(0)
+        return out
+
+    text, count = COMMAND_TYPOS.subn(replace, text)
+    for i, (wrong, correct) in enumerate(TYPOS):
+        if i in found:
+            fixes.append(f"Fixed typo: {wrong} → {correct}")
+    return text, count, changed
+
+
+# -------------------------
+# fix_leftright_pairing
+# -------------------------
+LEFT = re.compile(r'\\left([(\[\{|])')
+RIGHT = re.compile(r'\\right([)\]\}|])')
+RIGHT_FOR = {'(': ')', '[': ']', '{': r'\}', '|': '|'}
+
+
+def fix_leftright_pairing(text: str, fixes: Fixes) -> Tuple[str, int, int]:
+    if '\\left' not in text and '\\right' not in text:
+        return text, 0, 0
+    changed = 0
+
+    def replace(m):
+        nonlocal changed
+        content = m.group(1)
+        lefts = LEFT.findall(content)
+        rights = len(RIGHT.findall(content))
+        if len(lefts) > rights:
+            content += ''.join(r'\right' + RIGHT_FOR.get(bracket, bracket) for bracket in lefts[rights:])
+            fixes.append(f"Added {len(lefts) - rights} missing \\right")
+        elif rights > len(lefts):
+            content = RIGHT.sub(r'\1', content)
+            fixes.append(f"Removed {rights - len(lefts)} unpaired \\right")
+        changed += content != m.group(1)
+        return '$' + content + '$'
+
+    text, count = MATH.subn(replace, text)
+    return text, count, changed
+
+
+# -------------------------
+# fix_text_in_math_mode
+# -------------------------
+WORDY_MATH = re.compile(r'\$([^$]*[a-zA-Z]{3,}[^$]*)\$')
+ALREADY_TEXT = re.compile(r'\\(text|mathrm|mathbf|sin|cos|tan|log|ln|exp|lim|max|min)')
+TEXT_WORDS = ['and', 'or', 'if', 'then', 'where', 'for', 'when', 'the']
+TEXT_WORD = re.compile(rf'\b({"|".join(TEXT_WORDS)})\b', re.IGNORECASE)
+
+
+def fix_text_in_math_mode(text: str, fixes: Fixes) -> Tuple[str, int, int]:
+    if '$' not in text:
+        return text, 0, 0
+    changed = 0
+
+    def replace(m):
+        nonlocal changed
+        content = m.group(1)
+        if ALREADY_TEXT.search(content):
+            return m.group(0)
+        found = set()
+
+        def wrap(w):
+            found.add(w.group(1).lower())
+            return '\\text{' + w.group(1) + '}'
+
+        content = TEXT_WORD.sub(wrap, content)
+        changed += bool(found)
+        for word in TEXT_WORDS:
+            if word in found:
+                fixes.append(f"Wrapped '{word}' in \\text{{}}")
+        return '$' + content + '$'
+
+    text, count = WORDY_MATH.subn(replace, text)
+    return text, count, changed
+
+
+# -------------------------
+# the engine
+# -------------------------
+class FixEngine:
+    """An ordered list of (name, stage); run() applies them all and collects their reports."""
+
+    def __init__(self, stages: List[Tuple[str, Stage]]):
+        self.stages = stages
+
+    def run(self, text: str, fixes: Fixes, profiler: Optional["RuleProfiler"] = None) -> str:
+        if profiler is None:
+            for _, stage in self.stages:
+                text, _, _ = stage(text, fixes)
+            return text
+        for name, stage in self.stages:
+            start = time.perf_counter()
+            fixed, matches, changed = stage(text, fixes)
+            profiler.record(name, time.perf_counter() - start, matches, changed, text, fixed)
+            text = fixed
+        return text
+
+
+# -------------------------
+# profiling
+# -------------------------
+PROFILE_FIELDS = ("calls", "seconds", "matches", "changed", "bytes_changed")
+
+
+def changed_bytes(before: str, after: str) -> int:
+    """
+    UTF-8 size of the stretch a rule rewrote: what lies between the common prefix
+    and suffix. Close to the bytes touched when a stage runs on one question; on a
+    whole document it spans from the first change to the last.
+    """
+    if before == after:
+        return 0
+    # longest common prefix and suffix by bisection, each probe one slice comparison
+    low, high = 0, min(len(before), len(after))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if before[:mid] == after[:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    prefix = low
+    low, high = 0, min(len(before), len(after)) - prefix
+    while low < high:
+        mid = (low + high + 1) // 2
+        if before[len(before) - mid:] == after[len(after) - mid:]:
+            low = mid
+        else:
+            high = mid - 1
+    removed = before[prefix:len(before) - low]
+    added = after[prefix:len(after) - low]
+    return max(len(removed.encode('utf-8')), len(added.encode('utf-8')))
+
+
+class RuleProfiler:
+    """
+    Per-rule totals for the stages a FixEngine runs: calls, wall time, matches
+    (the subn counts the stages return), changed (the matches whose replacement
+    differs from what was matched) and bytes changed (changed_bytes).
+    Profilers from several workers are combined with merge().
+    """
+
+    def __init__(self):
+        self.rules: Dict[str, Dict[str, float]] = {}
+
+    def record(self, name: str, seconds: float, matches: int, changed: int, before: str, after: str) -> None:
+        rule = self.rules.get(name)
+        if rule is None:
+            rule = self.rules[name] = dict.fromkeys(PROFILE_FIELDS, 0)
+        rule["calls"] += 1
+        rule["seconds"] += seconds
+        rule["matches"] += matches
+        rule["changed"] += changed
+        rule["bytes_changed"] += changed_bytes(before, after)
+
+    def merge(self, rules: Dict[str, Dict[str, float]]) -> "RuleProfiler":
+        """Add the totals of another profiler (its as_dict(), e.g. from a worker's result)."""
+        for name, totals in rules.items():
+            rule = self.rules.setdefault(name, dict.fromkeys(PROFILE_FIELDS, 0))
+            for field in PROFILE_FIELDS:
+                rule[field] += totals.get(field, 0)
+        return self
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        """The totals, slowest rule first."""
+        ordered = sorted(self.rules.items(), key=lambda item: item[1]["seconds"], reverse=True)
+        return {name: dict(totals, seconds=round(totals["seconds"], 6)) for name, totals in ordered}
+
+    def table(self) -> str:
+        total = sum(rule["seconds"] for rule in self.rules.values()) or 1.0
+        lines = [f"{'rule':<32}{'calls':>8}{'ms':>10}{'%':>7}{'matches':>10}{'changed':>10}{'bytes':>10}"]
+        for name, rule in self.as_dict().items():
+            lines.append(f"{name:<32}{rule['calls']:>8}{rule['seconds'] * 1e3:>10.2f}"
+                         f"{100 * rule['seconds'] / total:>7.1f}{rule['matches']:>10}{rule['changed']:>10}"
+                         f"{rule['bytes_changed']:>10}")
+        return "\n".join(lines)
+
+    def write_json(self, path: str) -> str:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.as_dict(), f, indent=2)
+        return path
+
+
+# the order of LatexMathFixer.fix_all (structure and orphaned-item fixes are off there too)
+DEFAULT_STAGES = [
+    ("fix_escape_characters", fix_escape_characters),
+    ("fix_unbalanced_math_delimiters", fix_unbalanced_math_delimiters),
+    ("fix_incomplete_braces", fix_incomplete_braces),
+    ("fix_set_notation", fix_set_notation),
+    ("fix_chinese_symbols_in_math", fix_chinese_symbols_in_math),
+    ("fix_spacing_issues", fix_spacing_issues),
+    ("fix_common_command_typos", fix_common_command_typos),
+    ("fix_leftright_pairing", fix_leftright_pairing),
+    ("fix_text_in_math_mode", fix_text_in_math_mode),
+]
+
+FIX_ENGINE = FixEngine(DEFAULT_STAGES)
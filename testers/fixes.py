@@ -57,9 +57,10 @@ text = r"""\end{enumerate}
 \item 已知正方体$ABCD-A_{1}B_{1}C_{1}D_{1}$ ，则
 """
 
-# Using the simple version is actually better for this case
-fixed_text = replace_simple(text)
-print(fixed_text)
+if __name__ == "__main__":
+    # Using the simple version is actually better for this case
+    fixed_text = replace_simple(text)
+    print(fixed_text)
 
 """
 The key issues in your original code were:
@@ -0,0 +1,83 @@
+"""
+Check HtmlTweaker.convert_text on divs that never close.
+
+    python -m testers.htmlCheck --sizes 500 2000 8000
+
+An unclosed div is left as text, but the image and table divs inside it that do
+close are still converted, and a < in a cell's math ("$a<b$") stays in its cell;
+the cases below pin that down. Then `n` unclosed
+divs, followed by a single late </div> or by none, are converted at each size: every div is
+followed to the end of the text once at most, so the time has to grow linearly
+(the growth exponent between the smallest and the largest size is printed, and
+must stay under 1.5). What went wrong is printed and the exit status is 1.
+"""
+import argparse
+import math
+import sys
+import time
+
+from documentLayoutHandler.displayHandler import HtmlTweaker
+
+IMAGE = '<div><img src="a.png"></div>'
+TABLE = '<div><table><tr><td>1</td><td>2</td></tr></table></div>'
+TABLE_LATEX = '\\begin{tabular}{c | c}\n\\hline\n1 & 2 \\\\ \n\\hline\n\\end{tabular}'
+
+# (input, expected output); a div that closes is converted whole, with the divs it wraps
+CASES = [
+    ('<div class="wrap">\n' + IMAGE + '\ntext',
+     '<div class="wrap">\n\\includegraphics[width=0.6\\textwidth]{a.png}\ntext'),
+    ('<div>\n<div>\n' + TABLE + '\n</div>',
+     '<div>\n' + TABLE_LATEX),
+    ('<div>' * 3 + IMAGE + '</div>' + TABLE,
+     '<div>' * 2 + '\\includegraphics[width=0.6\\textwidth]{a.png}' + TABLE_LATEX),
+    ('<div>' * 3, '<div>' * 3),
+    # a < in a cell's math is not a tag
+    ('<div><table><tr><td>$a<b$</td><td>x</td></tr></table></div>',
+     '\\begin{tabular}{c | c}\n\\hline\n$a<b$ & x \\\\ \n\\hline\n\\end{tabular}'),
+    ('<div><table><tr><td>$0<x<1$</td><td>x</td></tr></table></div>',
+     '\\begin{tabular}{c | c}\n\\hline\n$0<x<1$ & x \\\\ \n\\hline\n\\end{tabular}'),
+]
+
+
+def unclosed(n, close='</div>'):
+    return '<div><p>x</p>\n' * n + close
+
+
+def seconds(text):
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        HtmlTweaker().convert_text(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 8000])
+    args = parser.parse_args()
+
+    failures = 0
+    for text, expected in CASES:
+        got = HtmlTweaker().convert_text(text)
+        if got != expected:
+            failures += 1
+            print(f"{text!r}\n  expected {expected!r}\n  got      {got!r}")
+
+    for close in ('</div>', ''):
+        timings = [(n, seconds(unclosed(n, close))) for n in args.sizes]
+        for n, t in timings:
+            print(f"{n:>7} unclosed divs{' + </div>' if close else ''}"
+                  f" {len(unclosed(n, close)) / 1024:>8.0f} KB {t * 1e3:>9.2f} ms")
+        (small, tSmall), (large, tLarge) = timings[0], timings[-1]
+        slope = math.log(max(tLarge, 1e-6) / max(tSmall, 1e-6)) / math.log(large / small)
+        print(f"growth exponent {slope:.2f}")
+        if slope >= 1.5:
+            failures += 1
+            print("unclosed divs: super-linear")
+    print(f"{failures} failures" if failures else f"{len(CASES)} cases and the unclosed divs ok")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
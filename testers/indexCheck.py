@@ -0,0 +1,98 @@
+"""
+Check the question index against papers whose question numbers are known.
+
+    python -m testers.indexCheck --exams 20
+
+A hand-written paper whose 填空题 blanks start with digits ("14.3名同学...",
+where the number has to come from "14." and not from the "3" of the blank)
+and `n` generated papers are converted with an index, whole and --stream. Every
+question must be indexed under a number, whatever its section, no number twice,
+and QuestionIndex.question(exam, number) must find it again; the hand-written
+paper must give exactly the numbers it prints. What went wrong is printed and
+the exit status is 1.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import main as converter
+from questionIndex import QuestionIndex
+from testers.corpusGenerator import generate_exam
+
+BLANKS_PAPER = """# 数学试题
+
+## 一、 选择题：本题共2小题，每小题5分。
+
+1.已知集合$A=\\{1,2\\}$ ，则
+
+A.1 B.2 C.3 D.4
+
+2.函数$f(x)=x^{2}$ 的最小值为
+
+A.0 B.1 C.2 D.3
+
+## 二、 填空题：本题共3小题，每小题5分。
+
+13.已知$a=2$ ，则$a^{2}=$ ______.
+
+14.3名同学站成一排，共有______种排法.
+
+15. 12个球中任取2个，共有______种取法.
+
+## 三、 解答题：本题共1小题，共10分。
+
+16.（10分）已知数列$\\{a_{n}\\}$ 满足$a_{1}=1$ ，求$a_{n}$ .
+"""
+
+BLANKS_NUMBERS = [1, 2, 13, 14, 15, 16]
+
+
+def check(path, stream, expected=None):
+    """None when every question is indexed under its number, else what went wrong."""
+    indexPath = path + (".stream" if stream else "") + ".index.db"
+    index = QuestionIndex(indexPath)
+    try:
+        converter.convert_exam(path, os.path.splitext(indexPath)[0] + ".tex", index=index, stream=stream)
+        rows = index._db.execute("SELECT sectionType, number FROM questions ORDER BY position").fetchall()
+        unnumbered = [sectionType for sectionType, number in rows if number is None]
+        if unnumbered:
+            return f"{len(unnumbered)} questions without a number, in {sorted(set(unnumbered))}"
+        numbers = sorted(number for _, number in rows)
+        if len(set(numbers)) != len(numbers):
+            return f"numbers indexed twice: {numbers}"
+        lost = [n for n in numbers if index.question(path, n) is None]
+        if lost:
+            return f"numbers not found again: {lost}"
+        if expected is not None and numbers != expected:
+            return f"indexed {numbers}, printed {expected}"
+        return None
+    finally:
+        index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--exams", type=int, default=10, help="Generated papers checked")
+    parser.add_argument("--questions", type=int, default=22, help="Questions per generated paper")
+    args = parser.parse_args()
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        papers = [("blanks", BLANKS_PAPER, BLANKS_NUMBERS)]
+        papers += [(f"generated {seed}", generate_exam(args.questions, seed=seed), None) for seed in range(args.exams)]
+        for i, (name, text, expected) in enumerate(papers):
+            path = os.path.join(directory, f"{i}.md")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            for stream in (False, True):
+                problem = check(path, stream, expected)
+                if problem is not None:
+                    failures += 1
+                    print(f"{name}{' (stream)' if stream else ''}: {problem}")
+    print(f"{len(papers) * 2 - failures}/{len(papers) * 2} conversions indexed every question by its number")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
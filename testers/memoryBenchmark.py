@@ -0,0 +1,128 @@
+"""
+Memory per converted question: plain __dict__ objects vs the slotted, interned model.
+
+    python -m testers.memoryBenchmark --questions 1000 100000
+
+A paper is generated with testers.corpusGenerator, cut into questions, and every
+question is converted and kept in memory, as when a whole bank is loaded for
+analysis. The input text is allocated before measuring, so the figures are what the
+question objects add on top of it: once with the classes as they were (a __dict__
+per object, no interning) and once with classes.myClasses. The size of the pickled
+(question, latex) pair is reported too; that is what the cache stores and the
+process executor ships back.
+"""
+import argparse
+import gc
+import pickle
+import time
+import tracemalloc
+
+import classes.myClasses as model
+import main as converter
+from conversionCache import normalize_question
+from questionTypeHandler.sectionsHandler import examPartitioning
+from testers.corpusGenerator import generate_exam
+
+
+# -------------------------
+# The classes as they were, kept here only to be measured against
+# -------------------------
+class LegacyQuestion:
+    def __init__(self, Description, points=0):
+        self.Description = Description
+        self.Points = points
+
+
+class LegacyMultipleChoiceQuestion(LegacyQuestion):
+    def __init__(self, Description, mainQuestion, options, points=0):
+        super().__init__(Description, points)
+        self.MainQuestion = mainQuestion
+        self.Options = options
+
+
+class LegacyEssayQuestion(LegacyQuestion):
+    def __init__(self, Description, subQuestions=None, points=0):
+        super().__init__(Description, points)
+        self.SubQuestions = subQuestions
+
+
+def legacy(question):
+    if isinstance(question, model.MultipleChoiceQuestion):
+        return LegacyMultipleChoiceQuestion(question.Description, question.MainQuestion, question.Options, question.Points)
+    if isinstance(question, model.EssayQuestion):
+        subQuestions = [legacy(q) for q in question.SubQuestions] if question.SubQuestions else question.SubQuestions
+        return LegacyEssayQuestion(question.Description, subQuestions, question.Points)
+    return LegacyQuestion(question.Description, question.Points)
+
+
+# -------------------------
+# Measuring
+# -------------------------
+def question_texts(questions):
+    text = generate_exam(questions)
+    tasks = []
+    for section in examPartitioning("bench.md", text=text).handleSections() or []:
+        sectionObject = converter.SECTION_CLASSES.get(section.Type, model.EssaySection)(section)
+        tasks.extend((section.Type, normalize_question(q)) for q in sectionObject.questionsSeperator())
+    return tasks
+
+
+def load_bank(tasks, asLegacy):
+    bank = []
+    for task in tasks:
+        question = converter._render_task(task)[0]
+        bank.append(legacy(question) if asLegacy else question)
+    return bank
+
+
+def measure(tasks, asLegacy):
+    """Bytes retained per question, and the time to build the bank."""
+    limit = model.INTERN_LIMIT
+    if asLegacy:
+        model.INTERN_LIMIT = -1
+    try:
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        bank = load_bank(tasks, asLegacy)
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        start = time.perf_counter()
+        load_bank(tasks, asLegacy)
+        seconds = time.perf_counter() - start
+    finally:
+        model.INTERN_LIMIT = limit
+    return retained / len(bank), seconds
+
+
+def pickled(tasks, asLegacy):
+    """Average pickled size of (question, latex), and the time for a dumps/loads round trip."""
+    pairs = []
+    for task in tasks:
+        question, latex = converter._render_task(task)
+        pairs.append((legacy(question) if asLegacy else question, latex))
+    start = time.perf_counter()
+    blobs = [pickle.dumps(pair, pickle.HIGHEST_PROTOCOL) for pair in pairs]
+    for blob in blobs:
+        pickle.loads(blob)
+    seconds = time.perf_counter() - start
+    return sum(len(b) for b in blobs) / len(blobs), seconds / len(blobs) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory per question of the old and the slotted object model.")
+    parser.add_argument("--questions", type=int, nargs="+", default=[1000, 10000])
+    args = parser.parse_args()
+
+    print(f"{'questions':>10}{'model':>9}{'bytes/q':>10}{'load s':>9}{'pickle B':>10}{'rt us':>8}")
+    for questions in args.questions:
+        tasks = question_texts(questions)
+        for name, asLegacy in (("dict", True), ("slots", False)):
+            perQuestion, seconds = measure(tasks, asLegacy)
+            size, roundTrip = pickled(tasks, asLegacy)
+            print(f"{len(tasks):>10}{name:>9}{perQuestion:>10.0f}{seconds:>9.2f}{size:>10.0f}{roundTrip:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Option extraction: the old lazy-regex handlers vs the linear optionExtractor.
+
+    python -m testers.optionBenchmark --scales 1 4 16 64
+
+Every multiple choice question in testExample is grown by repeating its stem
+`scale` times (long stems full of $...$ math, as in merged question banks) and
+run through the handler the fingerprint picks, once with the regexes the
+handlers used before and once with extract_options. Two adversarial families
+are timed as well: stems with capital letters inside math and no option line,
+and blocks with only three markers (the worst case of the old four-group
+extract_options_from_block pattern).
+"""
+import argparse
+import re
+import time
+
+from classes.myClasses import Section, SectionType
+from questionTypeHandler.mcHandler import fingerprint_text, HANDLER_TABLE, testExample
+from questionTypeHandler.optionExtractor import extract_options, options_by_letter
+
+# -------------------------
+# The handlers as they were, kept here only to be measured against
+# -------------------------
+_INLINE = re.compile(r'([A-D])[\.、]?\s*([^A-D]+?)(?=[A-D][\.、]|$)', re.DOTALL)
+_INLINE_SPACED = re.compile(r'(?:^|\s)([A-D])[\.、]?\s*(.*?)(?=\s+[A-D][\.、]|$)', re.DOTALL)
+_BEFORE_INLINE = re.compile(r'^\d+\.(.+?)(?=[A-D][\.、])', re.DOTALL)
+_BEFORE_SPACED = re.compile(r'^\d+\.(.+?)(?=\s+[A-D][\.、])', re.DOTALL)
+_NO_DOT = re.compile(r'^\d+\s*(.+?)(?=[A-D][\.、])', re.DOTALL)
+_STRIP = re.compile(r'[A-D][\.、]?\s*[^A-D]+', re.DOTALL)
+_BEFORE_LINES_OR_END = re.compile(r'(^\d+\.)(.*?)(?=^[A-D][\.、]|$)', re.MULTILINE | re.DOTALL)
+_LINE_START = re.compile(r'^[A-D][\.、]')
+_SPLIT = re.compile(r'([A-D][\.、])')
+_LABEL = r'([A-D])[\.．。、:：]\s*'
+_BLOCK = re.compile(
+    r'^(?P<stem>.*?)(?:' + _LABEL + r')(?P<A>.*?)(?:' + _LABEL + r')(?P<B>.*?)(?:'
+    + _LABEL + r')(?P<C>.*?)(?:' + _LABEL + r')(?P<D>.*)$',
+    re.S,
+)
+
+
+def legacy_inline(text, question):
+    options = [o[1].strip() for o in _INLINE.findall(text)]
+    match = question.search(text)
+    return (match.group(1).strip() if match else ""), options
+
+
+def legacy_spaced(text):
+    options = [o[1].strip() for o in _INLINE_SPACED.findall(text)]
+    match = _BEFORE_SPACED.search(text)
+    return (match.group(1).strip() if match else ""), options
+
+
+def legacy_no_number(text):
+    return _STRIP.sub('', text).strip(), [o[1].strip() for o in _INLINE.findall(text)]
+
+
+def legacy_few_markers(text):
+    match = _BEFORE_LINES_OR_END.search(text)
+    lines = [line.strip() for line in text.split('\n') if line.strip()]
+    start = next((i for i, line in enumerate(lines) if _LINE_START.match(line)), None)
+    if start is None:
+        return "", []
+    options = []
+    for line in lines[start:]:
+        parts = _SPLIT.split(line)
+        options.extend(parts[i] + parts[i + 1] for i in range(1, len(parts) - 1, 2)) if len(parts) > 1 else options.append(line)
+    return (match.group(2).strip() if match else ""), options
+
+
+LEGACY = {
+    "mchandler2": lambda t: legacy_inline(t, _BEFORE_INLINE),
+    "mchandler3": legacy_spaced,
+    "mchandler4": lambda t: legacy_inline(t, _NO_DOT),
+    "mchandler5": legacy_no_number,
+    "mchandler6": legacy_few_markers,
+}
+
+
+def legacy_block(text):
+    m = _BLOCK.match(text)
+    return (m.group('stem'), m.group('A', 'B', 'C', 'D')) if m else (text, None)
+
+
+# -------------------------
+# Corpora
+# -------------------------
+def example_questions():
+    section = Section("bench", testExample, 1, SectionType.MCQ)
+    return section.questionsSeperator()
+
+
+def scaled(question, scale):
+    """Repeat the stem (the text before the first option line) `scale` times."""
+    head, sep, rest = question.partition("\n\n")
+    number = re.match(r'\d*\.?', head).group()
+    return number + head[len(number):] * scale + sep + rest
+
+
+def math_stem(scale):
+    # capital letters inside math and no real options: "$A B C D$ 则"
+    return "1." + "已知$\\triangle ABC$ 中$A B\\cdot C D=1$ ，" * scale + "则"
+
+
+def three_markers(scale):
+    return "1." + "设$x^{2}+y^{2}=1$ " * scale + "A.1 B.2 C." + "$\\frac{1}{2}$ " * scale
+
+
+def time_it(fn, items, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - start)
+    return best / len(items) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Old option regexes vs the linear option extractor.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    questions = example_questions()
+    print(f"{'corpus':<22}{'scale':>6}{'chars':>8}{'old us':>12}{'new us':>10}{'speedup':>9}")
+    for scale in args.scales:
+        bank = []
+        for q in questions:
+            text = scaled(q, scale).strip()
+            name = HANDLER_TABLE[fingerprint_text(text).key][0]
+            if name in LEGACY:
+                bank.append((LEGACY[name], text))
+        families = [
+            ("testExample handlers", bank,
+             lambda item: item[0](item[1]), lambda item: extract_options(item[1])),
+            ("capitals in math", [math_stem(scale)] * 5,
+             LEGACY["mchandler3"], extract_options),
+            ("three markers (block)", [three_markers(scale)] * 5,
+             legacy_block, lambda t: options_by_letter(extract_options(t, ".．。、:：", False, False))),
+        ]
+        for name, items, old, new in families:
+            chars = sum(len(i[1] if isinstance(i, tuple) else i) for i in items) // len(items)
+            oldUs = time_it(old, items, args.repeat)
+            newUs = time_it(new, items, args.repeat)
+            print(f"{name:<22}{scale:>6}{chars:>8}{oldUs:>12.1f}{newUs:>10.1f}{oldUs / newUs:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Per-question handler time with the precompiled pattern registry vs raw pattern strings.
+
+    python -m testers.patternBenchmark --questions 10000
+
+"before (warm)" passes the pattern strings to re.findall/re.search/... like the
+handlers used to, with the re module's cache holding them. "before (thrashed)"
+empties that cache before every question, which is what happens once a batch
+touches more patterns than the cache keeps. "after" uses the registry.
+"""
+import argparse
+import contextlib
+import io
+import re
+import time
+from itertools import cycle, islice
+
+from classes.myClasses import Section, SectionType
+from questionTypeHandler.eqHandler import EssayQuestionHandler, example1, example2
+from questionTypeHandler.mcHandler import multipleChoiceQuestionHandler, testExample
+from questionTypeHandler.patternRegistry import PATTERNS
+
+
+class _RawPattern:
+    """Stands in for a compiled pattern but goes through the module-level re functions."""
+
+    def __init__(self, compiled):
+        self.pattern = compiled.pattern
+        self.flags = compiled.flags
+
+    def _compiled(self):
+        # re.compile goes through the same module cache as re.findall/re.search
+        return re.compile(self.pattern, self.flags)
+
+    def findall(self, text, *bounds):
+        return self._compiled().findall(text, *bounds)
+
+    def finditer(self, text, *bounds):
+        return self._compiled().finditer(text, *bounds)
+
+    def search(self, text, *bounds):
+        return self._compiled().search(text, *bounds)
+
+    def match(self, text, *bounds):
+        return self._compiled().match(text, *bounds)
+
+    def sub(self, repl, text):
+        return re.sub(self.pattern, repl, text, flags=self.flags)
+
+    def split(self, text):
+        return re.split(self.pattern, text, flags=self.flags)
+
+
+def build_bank(size):
+    """A question bank of `size` questions cycled from the handler examples."""
+    section = Section("bench", testExample, 1, SectionType.MCQ)
+    mc = [("mc", q) for q in section.questionsSeperator()]
+    eq = [("eq", example1.strip()), ("eq", example2.strip())]
+    return list(islice(cycle(mc + eq), size))
+
+
+def convert(kind, text):
+    if kind == "mc":
+        handler = multipleChoiceQuestionHandler(text)
+        question = handler.identify_handler()()
+        if question:
+            handler.mcWrapper(question)
+    else:
+        handler = EssayQuestionHandler(text)
+        handler.eqWrapper(handler.identify_handler()())
+
+
+def run(bank, purge=False):
+    sink = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sink):
+        for kind, text in bank:
+            if purge:
+                re.purge()
+            convert(kind, text)
+            sink.seek(0)
+            sink.truncate()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--questions", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    bank = build_bank(args.questions)
+    compiled = dict(PATTERNS)
+    results = {}
+
+    try:
+        PATTERNS.update({name: _RawPattern(p) for name, p in compiled.items()})
+        results["before (warm re cache)"] = min(run(bank) for _ in range(args.repeat))
+        results["before (thrashed re cache)"] = min(run(bank, purge=True) for _ in range(args.repeat))
+    finally:
+        PATTERNS.update(compiled)
+    results["after (pattern registry)"] = min(run(bank) for _ in range(args.repeat))
+
+    print(f"{len(bank)} questions, {len(PATTERNS)} registered patterns, best of {args.repeat}")
+    print(f"{'mode':<30}{'total s':>10}{'us/question':>14}")
+    for mode, seconds in results.items():
+        print(f"{mode:<30}{seconds:>10.3f}{seconds / len(bank) * 1e6:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Fuzz the converter's regexes (and the scanners built on them) for super-linear inputs.
+
+    python -m testers.regexFuzz --trials 300 --json regex_fuzz.json
+
+Every target is fed strings of the form prefix + pump * n + suffix, built from
+the pieces OCR'd papers are made of (numbers, dots, option letters, dollars,
+headings, footers, newlines). Each candidate is timed at two sizes; the slope of
+log(time) against log(size) says how the target scales (1 = linear, 2 =
+quadratic). The worst candidate per target is then timed on a ladder of sizes
+and reported, with the witness, so a regression shows up as a number.
+
+The patterns the splitters, the essay handlers and extract_options_from_block used to rely on are
+fuzzed as well ("legacy.*"), as a reference for what super-linear looks like.
+Every run is capped by a TimeBudget, so a catastrophic candidate costs at most
+--limit seconds.
+"""
+import argparse
+import json
+import math
+import random
+import re
+import time
+
+from documentLayoutHandler.displayHandler import HtmlTweaker
+from questionTypeHandler import examTokenizer
+from questionTypeHandler.essayParser import _TOKENS as _ESSAY_TOKENS, parse_essay
+from questionTypeHandler.examTokenizer import tokenize
+from questionTypeHandler.mcHandler import fingerprint_text
+from questionTypeHandler.optionExtractor import MC_PUNCTUATION, _token_pattern, extract_options
+from questionTypeHandler.patternRegistry import PATTERNS
+from timeBudget import BudgetExceeded, TimeBudget
+
+PIECES = [
+    "1", "12", ".", "、", "．", " ", "\n", "\n\n", "A", "B", "D", "A.", "C、", "x", "题", "：",
+    "$", "$$", "$x$", "(", ")", "(1)", "（2）", "(i)", "#", "## ", "一、", "## 一、选择题",
+    "第2页（共4页）", "---", "<div>", "</div>", "\\begin{tabular}", "\\end{tabular}", "分", "(12分)",
+    "(ii)", "①", "②", "\n(1)", "\n(i)",
+]
+
+# the patterns the splitters, the essay handlers and the block option extractor used before
+LEGACY = {
+    "legacy.questionsSeperator": re.compile(r'(?ms)^\s*(\d+\.?.*?)(?=^\s*\d+\.?|\Z)'),
+    "legacy.essaySeperator": re.compile(r'(?ms)^\s*(?:#+\s*)?((?:\d+|2V)\..*?)(?=^\s*(?:#+\s*)?(?:\d+|2V)\.|\Z)'),
+    "legacy.sections": re.compile(
+        r'(^#+\s*[一二三四五六七八九十]+[、。]\s*.*?[题：].*?$)([\s\S]*?)(?=^#+\s*[一二三四五六七八九十]+[、。]|\Z)',
+        re.MULTILINE | re.DOTALL),
+    "legacy.optionBlock": re.compile(
+        r'^(?P<stem>.*?)(?:([A-D])[\.．。、:：]\s*)(?P<A>.*?)(?:([A-D])[\.．。、:：]\s*)(?P<B>.*?)'
+        r'(?:([A-D])[\.．。、:：]\s*)(?P<C>.*?)(?:([A-D])[\.．。、:：]\s*)(?P<D>.*)$', re.S),
+    "legacy.eq.subQuestion": re.compile(r'(?:\(|（)(\d+)(?:\)|）)\s*(.*?)(?=(?:\(|（)\d+(?:\)|）)|$)', re.DOTALL),
+    "legacy.eq.subQuestion.lineStart": re.compile(
+        r'(?:^\((\d+)\)|^（(\d+）))(.*?)(?=^\(\d+\)|^（\d+）|$)', re.MULTILINE | re.DOTALL),
+    "legacy.eq.subSubQuestion": re.compile(
+        r'^[^\S\n]*[\(（]([ivxIVX]+)[\)）]\s*(.*?)(?=^[^\S\n]*[\(（][ivxIVX]+[\)）]|$)', re.MULTILINE | re.DOTALL),
+}
+
+
+# registered patterns only ever applied with .match where a piece of text starts (by whom), so
+# they are fuzzed that way: a search would retry them at every offset, which the converter never
+# does, and report a live pattern as quadratic
+ANCHORED = {
+    "mc.number.suffix": "mcHandler, at the start of a question",
+    "index.questionNumber": "QuestionIndex, at the start of a question's span",
+}
+
+
+def _scan(pattern):
+    return lambda text: sum(1 for _ in pattern.finditer(text))
+
+
+def _lines(pattern):
+    # the tokenizer applies its line patterns at every line start
+    def run(text):
+        pos = 0
+        for line in text.split("\n"):
+            pattern.match(text, pos, pos + len(line))
+            pos += len(line) + 1
+    return run
+
+
+def targets():
+    found = {f"pattern.{name}": (p.match if name in ANCHORED else _scan(p)) for name, p in PATTERNS.items()}
+    found.update({
+        "tokenizer.lineStart": _lines(examTokenizer._LINE_START),
+        "tokenizer.footer": _lines(examTokenizer._FOOTER),
+        "tokenizer.inline": _scan(examTokenizer._INLINE),
+        "tokenizer.sectionLine": _scan(examTokenizer._SECTION_LINE),
+        "options.markers": _scan(_token_pattern(MC_PUNCTUATION)),
+        "options.blockMarkers": _scan(_token_pattern(".．。、:：")),
+        "essay.tokens": _scan(_ESSAY_TOKENS),
+        "parse_essay": parse_essay,
+        "tokenize": tokenize,
+        "extract_options": extract_options,
+        "fingerprint_text": lambda text: fingerprint_text(text.strip() or "1"),
+        "html.convert_text": lambda text: HtmlTweaker().convert_text(text),
+    })
+    found.update({name: (lambda p: lambda text: p.search(text))(p) for name, p in LEGACY.items()})
+    return found
+
+
+def candidate(rng):
+    def pick(most):
+        return "".join(rng.choice(PIECES) for _ in range(rng.randint(0, most)))
+    return pick(2), pick(4) or rng.choice(PIECES), pick(2)
+
+
+def build(witness, size):
+    prefix, pump, suffix = witness
+    return prefix + pump * max(1, size // len(pump)) + suffix
+
+
+def timed(fn, text, limit):
+    """Best of three, in seconds; None when the run blew the limit."""
+    best = float("inf")
+    for _ in range(3):
+        budget = TimeBudget(limit).start()
+        try:
+            with budget.guard():
+                start = time.perf_counter()
+                fn(text)
+                best = min(best, time.perf_counter() - start)
+        except BudgetExceeded:
+            return None
+        finally:
+            budget.stop()
+    return best
+
+
+def slope(fn, witness, small, large, limit):
+    """Growth exponent between two sizes; inf when the large one times out."""
+    tSmall = timed(fn, build(witness, small), limit)
+    tLarge = timed(fn, build(witness, large), limit)
+    if tSmall is None or tLarge is None:
+        return math.inf
+    # below timer resolution there is nothing to say
+    return math.log(max(tLarge, 1e-6) / max(tSmall, 1e-6)) / math.log(large / small)
+
+
+def fuzz(name, fn, trials, rng, small, large, limit):
+    worst, worstSlope = None, -math.inf
+    for _ in range(trials):
+        witness = candidate(rng)
+        s = slope(fn, witness, small, large, limit)
+        if s > worstSlope:
+            worst, worstSlope = witness, s
+            if s == math.inf:
+                break
+    ladder = {}
+    for size in (small, large, large * 4):
+        t = timed(fn, build(worst, size), limit)
+        ladder[size] = None if t is None else round(t * 1e3, 3)
+        if t is None:
+            break
+    return {"target": name, "slope": round(worstSlope, 2), "witness": worst, "ms_by_size": ladder}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find super-linear inputs for the converter's regexes.")
+    parser.add_argument("--trials", type=int, default=200, help="Candidates tried per target")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--small", type=int, default=500, help="Characters in the small input")
+    parser.add_argument("--large", type=int, default=4000, help="Characters in the large input")
+    parser.add_argument("--limit", type=float, default=1.0, help="Seconds before a single run counts as a timeout")
+    parser.add_argument("--only", default=None, help="Only fuzz targets whose name contains this")
+    parser.add_argument("--json", default=None, help="Write the worst cases found to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    records = []
+    print(f"{'target':<40}{'slope':>7}  ms at {args.small} / {args.large} / {args.large * 4} chars")
+    for name, fn in targets().items():
+        if args.only and args.only not in name:
+            continue
+        record = fuzz(name, fn, args.trials, rng, args.small, args.large, args.limit)
+        records.append(record)
+        times = " / ".join("timeout" if ms is None else f"{ms:g}" for ms in record["ms_by_size"].values())
+        print(f"{name:<40}{record['slope']:>7}  {times}   {record['witness']!r}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
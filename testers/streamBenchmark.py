@@ -0,0 +1,65 @@
+"""
+Peak memory of converting a bank file whole vs a section at a time (--stream).
+
+    python -m testers.streamBenchmark --exams 10 100 1000
+
+A bank file is generated by putting `n` papers from testers.corpusGenerator
+one after the other, and converted to a .tex both ways under tracemalloc. Read
+whole, the text, its pre-pass copy, the token stream and every Section are
+alive at once, so the peak grows with the file; streamed, the file is a memory
+map (not traced: the OS pages it in and out) and only one section is decoded at
+a time, so the peak should stay near the largest section. The two .tex files
+are compared as well.
+"""
+import argparse
+import filecmp
+import os
+import tempfile
+import time
+import tracemalloc
+
+import main as converter
+from testers.corpusGenerator import generate_exam
+
+
+def write_bank(path, exams, questions):
+    with open(path, "w", encoding="utf-8") as f:
+        for seed in range(exams):
+            f.write(generate_exam(questions, seed=seed))
+            f.write("\n")
+
+
+def measure(path, outputPath, stream):
+    """(seconds, peak traced bytes) for one conversion."""
+    start = time.perf_counter()
+    converter.convert_exam(path, outputPath, stream=stream)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    try:
+        converter.convert_exam(path, outputPath, stream=stream)
+        return seconds, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak memory of whole-file vs streamed conversion.")
+    parser.add_argument("--exams", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--questions", type=int, default=22, help="Questions per generated paper")
+    args = parser.parse_args()
+
+    print(f"{'exams':>7}{'file MB':>9}{'whole s':>9}{'whole MB':>10}{'stream s':>10}{'stream MB':>11}{'same':>6}")
+    with tempfile.TemporaryDirectory() as directory:
+        for exams in args.exams:
+            path = os.path.join(directory, f"bank_{exams}.md")
+            write_bank(path, exams, args.questions)
+            wholeTex, streamTex = path + ".whole.tex", path + ".stream.tex"
+            wholeSeconds, wholePeak = measure(path, wholeTex, stream=False)
+            streamSeconds, streamPeak = measure(path, streamTex, stream=True)
+            same = filecmp.cmp(wholeTex, streamTex, shallow=False)
+            print(f"{exams:>7}{os.path.getsize(path) / 2**20:>9.1f}{wholeSeconds:>9.2f}{wholePeak / 2**20:>10.1f}"
+                  f"{streamSeconds:>10.2f}{streamPeak / 2**20:>11.1f}{'yes' if same else 'NO':>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+End-to-end throughput of each pipeline stage on synthetic papers.
+
+    python -m testers.throughputBenchmark --sizes 10 1000 100000
+
+For every size a paper is generated with testers.corpusGenerator and pushed
+through each stage on its own, then through the whole pipeline. Reported per
+stage: questions/sec, MB/sec of input markdown, and peak traced memory (taken
+in a second run under tracemalloc, so the timings aren't skewed by tracing).
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import main as converter
+from documentLayoutHandler.displayHandler import HtmlTweaker
+from questionTypeHandler.examTokenizer import tokenize
+from questionTypeHandler.sectionsHandler import examPartitioning
+from testers.corpusGenerator import generate_exam
+
+
+def _stages(path, text):
+    """(name, callable) for each stage; each callable runs the stage on prepared input."""
+    converted = HtmlTweaker().convert_text(text)
+    sections = examPartitioning(path, text=converted).handleSections() or []
+    fragments = [f for section in sections for f in converter.iter_section_latex(section)]
+
+    return [
+        ("html pre-pass", lambda: HtmlTweaker().convert_text(text)),
+        ("tokenize", lambda: tokenize(converted)),
+        ("partition", lambda: examPartitioning(path, text=converted).handleSections()),
+        ("convert questions", lambda: [list(converter.iter_section_latex(s)) for s in sections]),
+        ("finish fragments", lambda: [converter.finish_fragment(f) for f in fragments]),
+        ("end to end", lambda: converter.write_latex(converter.iter_exam_latex(path), io.StringIO())),
+    ]
+
+
+def _time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _peak(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_size(questions, repeat=3, seed=0):
+    text = generate_exam(questions, seed=seed)
+    megabytes = len(text.encode("utf-8")) / 1e6
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "exam.md")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        # handlers may still print in places; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            for name, fn in _stages(path, text):
+                seconds = _time(fn, repeat)
+                rows.append({
+                    "questions": questions,
+                    "stage": name,
+                    "seconds": seconds,
+                    "questions_per_sec": questions / seconds if seconds else float("inf"),
+                    "mb_per_sec": megabytes / seconds if seconds else float("inf"),
+                    "peak_mb": _peak(fn) / 1e6,
+                    "input_mb": megabytes,
+                })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage throughput on synthetic exams.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", default=None, help="Also write the rows to this JSON file")
+    args = parser.parse_args()
+
+    allRows = []
+    print(f"{'questions':>10} {'stage':<18}{'seconds':>10}{'q/s':>12}{'MB/s':>9}{'peak MB':>9}")
+    for size in args.sizes:
+        # fewer repeats on the big bank; it's slow enough to be stable
+        rows = bench_size(size, repeat=args.repeat if size < 10000 else 1)
+        for r in rows:
+            print(f"{r['questions']:>10} {r['stage']:<18}{r['seconds']:>10.4f}"
+                  f"{r['questions_per_sec']:>12.0f}{r['mb_per_sec']:>9.2f}{r['peak_mb']:>9.2f}")
+        allRows.extend(rows)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(allRows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Per-document time budget.
+
+A paper of malformed OCR must not stall a batch worker. The converter runs
+each parse step inside TimeBudget.guard(); when the document's budget runs out
+the step is interrupted with BudgetExceeded and whatever is left of the paper
+is rendered verbatim instead.
+
+start() arms a single SIGALRM for the whole document, so the budget also stops
+a regex stuck inside the re engine. The alarm only raises while a guard is
+open; going off anywhere else (say, while the caller writes a fragment out) it
+just marks the budget spent and the next guard raises on entry. Signals only
+reach the main thread (and don't exist on Windows); anywhere else the deadline
+is checked as each guard opens, which still bounds a paper made of many slow
+questions.
+"""
+import signal
+import threading
+import time
+from typing import Optional
+
+
+class BudgetExceeded(BaseException):
+    """
+    The document ran out of time; the rest of it is rendered verbatim.
+    Not an Exception, so the handlers' broad except clauses let it through.
+    """
+
+
+def can_interrupt() -> bool:
+    return hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+
+
+class TimeBudget:
+    """
+    Wall-clock budget for converting one document.
+
+    Args:
+        seconds: Time allowed from start(); None means no limit
+    """
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.seconds = seconds
+        self.deadline: Optional[float] = None
+        self.exceeded = False
+        self._armed = False
+        self._inside = False
+        self._previous = None
+
+    def start(self) -> "TimeBudget":
+        self.exceeded = False
+        if self.seconds is None:
+            return self
+        self.deadline = time.monotonic() + self.seconds
+        if can_interrupt():
+            self._previous = signal.signal(signal.SIGALRM, self._alarm)
+            self._armed = True
+            # a zero interval would disarm the timer instead of firing it
+            signal.setitimer(signal.ITIMER_REAL, max(self.seconds, 1e-6))
+        return self
+
+    def stop(self) -> None:
+        if self._armed:
+            self._armed = False
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, self._previous)
+
+    def remaining(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def guard(self) -> "TimeBudget":
+        """`with budget.guard():` runs a block that BudgetExceeded may interrupt."""
+        return self
+
+    def __enter__(self):
+        if not self.exceeded and not self._armed and self.deadline is not None:
+            self.exceeded = time.monotonic() >= self.deadline
+        if self.exceeded:
+            raise BudgetExceeded()
+        self._inside = True
+        return self
+
+    def __exit__(self, *exc):
+        self._inside = False
+        return False
+
+    def _alarm(self, signum, frame):
+        self.exceeded = True
+        if self._inside:
+            self._inside = False
+            raise BudgetExceeded()